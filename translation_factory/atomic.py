@@ -0,0 +1,124 @@
+__author__ = 'clobo'
+
+import os
+import time
+import errno
+import logging
+import binascii
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def makedirs(path):
+    """
+    Create a directory and its parents, unless it exists (possibly created by another build at the same time).
+    """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def remove(path):
+    """
+    Remove a file, unless it does not exist.
+    """
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def temporary_file(path):
+    """
+    Create a temporary file in the directory of a file, to be written and then replace it (see replace). The
+    temporary file gets the permissions that open() would give a new file.
+    :param path: path of the file
+    :return: (file descriptor, path of the temporary file)
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    while True:
+        tmp_path = os.path.join(directory, '.%s.%s.tmp' % (name, binascii.hexlify(os.urandom(6))))
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0666)
+            return fd, tmp_path
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+
+def replace(tmp_path, path):
+    """
+    Replace a file with a temporary file of temporary_file, keeping the permissions of the file it replaces.
+    """
+    try:
+        os.chmod(tmp_path, os.stat(path).st_mode & 0777)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    os.rename(tmp_path, path)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+    """
+    Write a file through a temporary file of the same directory that replaces it once it has been written
+    completely. Readers and concurrent builds see either the previous or the new file, never part of one, and a
+    write that fails (or a build that is killed) leaves the previous file as it was.
+
+        with atomic_write(csv_path) as _csv:
+            ...
+
+    :param path: path of the file
+    :param mode: 'w' or 'wb'
+    :return: context manager of the temporary file
+    """
+    fd, tmp_path = temporary_file(path)
+    try:
+        with os.fdopen(fd, mode) as _f:
+            yield _f
+        replace(tmp_path, path)
+    except BaseException:
+        remove(tmp_path)
+        raise
+
+
+class FileLock(object):
+    """
+    Exclusive lock on a lock file, held between processes (or threads with their own FileLock) while it is entered.
+    Builds sharing a build directory lock each locale while they build it. Without fcntl (Windows) nothing is locked.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the lock file, created if it does not exist
+        """
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                logging.info('Waiting for the lock on %s' % self.path)
+                start = time.time()
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+                logging.info('Locked %s after %.2f seconds' % (self.path, time.time() - start))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+        self._f.close()
+        self._f = None
+        return False
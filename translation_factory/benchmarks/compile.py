@@ -0,0 +1,76 @@
+"""
+Timing comparison of compiling .mo files with msgfmt and with the built-in compiler.
+
+    python -m translation_factory.benchmarks.compile [--entries 50000]
+"""
+import os
+import csv
+import time
+import shutil
+import gettext
+import tempfile
+import argparse
+import subprocess
+
+from translation_factory.csv_to_po import csv_to_po
+
+
+def write_translated_csv(csv_path, entries):
+    """
+    Write a translated table of synthetic phrases.
+    :param csv_path: path to the csv file
+    :param entries: number of phrases
+    """
+    with open(csv_path, 'w') as _csv:
+        writer = csv.writer(_csv)
+        writer.writerow(('Original Text', 'Translation', 'Additional Comments'))
+        for ii in xrange(entries):
+            writer.writerow(('Phrase number %d with a {placeholder}' % ii, 'Frase numero %d con {placeholder}' % ii, ''))
+
+
+def time_compilers(entries):
+    """
+    Time the msgfmt and built-in .mo compilers on a synthetic catalog and check both can be loaded by gettext.
+    :param entries: number of phrases in the catalog
+    :return: dictionary of {compiler: seconds}
+    """
+    tmp_dir = tempfile.mkdtemp()
+    timings = {}
+    try:
+        csv_path = os.path.join(tmp_dir, 'Benchmark - Spanish.csv')
+        write_translated_csv(csv_path, entries)
+
+        po_path = os.path.join(tmp_dir, 'msgfmt.po')
+        mo_path = os.path.join(tmp_dir, 'msgfmt.mo')
+        start = time.time()
+        csv_to_po(csv_path, po_path)
+        try:
+            subprocess.check_call(('msgfmt', '-o', mo_path, po_path))
+            timings['msgfmt'] = time.time() - start
+        except OSError:
+            print 'msgfmt is not installed, skipping.'
+
+        mo_path = os.path.join(tmp_dir, 'builtin.mo')
+        start = time.time()
+        csv_to_po(csv_path, os.path.join(tmp_dir, 'builtin.po'), mo_path=mo_path)
+        timings['builtin'] = time.time() - start
+
+        for compiler in timings:
+            with open(os.path.join(tmp_dir, compiler + '.mo'), 'rb') as _mo:
+                translations = gettext.GNUTranslations(_mo)
+            phrase = 'Phrase number %d with a {placeholder}' % (entries - 1)
+            if translations.gettext(phrase) == phrase:
+                raise AssertionError('%s .mo file is missing translations' % compiler)
+    finally:
+        shutil.rmtree(tmp_dir)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=50000, help="number of phrases in the catalog")
+    args = parser.parse_args()
+
+    timings = time_compilers(args.entries)
+    for compiler in sorted(timings):
+        print '{:>10}: {:.2f}s'.format(compiler, timings[compiler])
@@ -0,0 +1,162 @@
+"""
+Stress test of builds sharing a build directory: many builds of two applications run at once (some of them killed
+part way through) and the build directory is checked afterwards. Every translation of the translator's tables must
+still be there, every table, po and mo file must be complete and the build manifest must be readable.
+
+    python -m translation_factory.benchmarks.concurrency [--builds 8] [--rounds 3] [--kill 2] [--files 100]
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import signal
+import struct
+import shutil
+import gettext
+import tempfile
+import argparse
+import multiprocessing
+
+from translation_factory.factory import build
+from translation_factory.benchmarks.synthetic import write_source_tree, write_translated_tables, locale_codes
+
+APPLICATIONS = ('Alpha', 'Bravo')
+
+
+def _build(source_dir, application_name, build_dir, locales, workers):
+    sys.stdout = open(os.devnull, 'w')
+    result = build(source_dir, application_name, locales, build_dir, extract_backend='python', workers=workers,
+                   suggestion_threshold=None)
+    sys.exit(0 if result else 1)
+
+
+def read_table(path):
+    """
+    :return: dictionary of {msgid: msgstr} of a translation table, raises ValueError if it is incomplete
+    """
+    with open(path, 'r') as _csv:
+        rows = list(csv.reader(_csv))
+    if not rows or rows[0][0] != 'Original Text' or any(len(row) != 3 for row in rows):
+        raise ValueError('%s is incomplete' % path)
+    return dict((row[0], row[1]) for row in rows[1:])
+
+
+def temporary_files(build_dir):
+    """
+    :return: set of the paths of the temporary files of atomic writes in the build directory
+    """
+    return set(os.path.join(root, f) for root, dirs, files in os.walk(build_dir) for f in files if f.endswith('.tmp'))
+
+
+def check(build_dir, locales, translations, killed_files=()):
+    """
+    Check the build directory after the builds.
+    :param translations: {table path: {msgid: msgstr}} of the translator's tables before the builds
+    :param killed_files: temporary files left by the builds that were killed, which are not problems
+    :return: list of the problems found
+    """
+    problems = []
+    for path, expected in translations.iteritems():
+        try:
+            table = read_table(path)
+        except (IOError, ValueError) as e:
+            problems.append(str(e))
+            continue
+        lost = [msgid for msgid, msgstr in expected.iteritems() if msgstr and table.get(msgid) != msgstr]
+        if lost:
+            problems.append('%d translations lost from %s' % (len(lost), path))
+    for application_name in APPLICATIONS:
+        for language, code in locales:
+            mo_path = os.path.join(build_dir, code, 'LC_MESSAGES', application_name + '.mo')
+            try:
+                with open(mo_path, 'rb') as _f:
+                    gettext.GNUTranslations(_f)
+            except (IOError, struct.error) as e:
+                problems.append('%s: %s' % (mo_path, e))
+    try:
+        with open(os.path.join(build_dir, 'build_manifest.json')) as _f:
+            targets = json.load(_f)['targets']
+        missing = ['%s %s' % (application_name, code) for application_name in APPLICATIONS
+                   for language, code in locales if '%s:locale:%s' % (application_name, code) not in targets]
+        if missing:
+            problems.append('Locales missing from the build manifest: %s' % ', '.join(missing))
+    except (IOError, ValueError, KeyError) as e:
+        problems.append('Build manifest: %s' % e)
+    problems.extend('Temporary file left: %s' % path for path in sorted(temporary_files(build_dir) - set(killed_files)))
+    return problems
+
+
+def stress(builds, rounds, kill, files, locales, workers=2, seed=0):
+    """
+    :param builds: number of builds running at once
+    :param rounds: number of times the builds are started
+    :param kill: number of the builds of each round that are killed part way through
+    :param files: number of source files of each application
+    :param locales: number of locales
+    :param workers: processes of each build
+    :return: (seconds, number of failed builds that were not killed, list of problems)
+    """
+    rng = random.Random(seed)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        build_dir = os.path.join(tmp_dir, 'build')
+        codes = locale_codes(locales)
+        translations = {}
+        sources = {}
+        for ii, application_name in enumerate(APPLICATIONS):
+            sources[application_name] = os.path.join(tmp_dir, application_name)
+            msgids = write_source_tree(sources[application_name], files, 20, seed=ii)
+            for path in write_translated_tables(build_dir, application_name, codes, msgids, translated=0.5, seed=ii):
+                translations[path] = read_table(path)
+
+        failed = 0
+        start = time.time()
+        for _ in xrange(rounds):
+            processes = []
+            for jj in xrange(builds):
+                application_name = APPLICATIONS[jj % len(APPLICATIONS)]
+                p = multiprocessing.Process(target=_build, args=(sources[application_name], application_name,
+                                                                 build_dir, codes, workers))
+                p.start()
+                processes.append(p)
+            killed = rng.sample(processes, min(kill, len(processes)))
+            for p in killed:
+                time.sleep(rng.uniform(0, 0.5))
+                os.kill(p.pid, signal.SIGKILL)
+            for p in processes:
+                p.join()
+                if p not in killed and p.exitcode != 0:
+                    failed += 1
+        # A killed build leaves the temporary file it was writing, the builds that complete must not leave any
+        killed_files = temporary_files(build_dir)
+        # A last build of each application completes the locales of the killed builds
+        for application_name in APPLICATIONS:
+            p = multiprocessing.Process(target=_build, args=(sources[application_name], application_name,
+                                                             build_dir, codes, workers))
+            p.start()
+            p.join()
+            failed += p.exitcode != 0
+        elapsed = time.time() - start
+        return elapsed, failed, check(build_dir, codes, translations, killed_files)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--builds", type=int, default=8, help="number of builds running at once")
+    parser.add_argument("--rounds", type=int, default=3, help="number of rounds of builds")
+    parser.add_argument("--kill", type=int, default=2, help="number of builds killed in each round")
+    parser.add_argument("--files", type=int, default=100, help="number of source files of each application")
+    parser.add_argument("--locales", type=int, default=4, help="number of locales")
+    parser.add_argument("--workers", type=int, default=2, help="processes of each build")
+    args = parser.parse_args()
+
+    elapsed, failed, problems = stress(args.builds, args.rounds, args.kill, args.files, args.locales, args.workers)
+    print '{} rounds of {} builds in {:.2f}s, {} failed builds'.format(args.rounds, args.builds, elapsed, failed)
+    for problem in problems:
+        print problem
+    print 'OK' if not (failed or problems) else 'FAILED'
+    sys.exit(1 if failed or problems else 0)
@@ -0,0 +1,63 @@
+"""
+Timing comparison of the per-file, batched and sharded (one xgettext process per CPU) extraction modes and the
+in-process python backend.
+
+    python -m translation_factory.benchmarks.extraction <directory> [--include_patterns ...]
+"""
+import os
+import time
+import shutil
+import tempfile
+import argparse
+
+from translation_factory.tags import extract_tags
+from translation_factory.po_to_csv import iter_po
+
+MODES = (('per-file', {'batch_size': None}),
+         ('batched', {'batch_size': 500, 'workers': 1}),
+         ('sharded', {'batch_size': 500}),
+         ('python', {'backend': 'python'}))
+
+
+def time_extraction(directory, include_patterns=None, exclude_patterns=None, batch_size=500):
+    """
+    Time tag extraction of a directory with every extraction mode and check that they all find the same msgids.
+    :param directory: directory to extract tags from
+    :param include_patterns: regex patterns of files to include
+    :param exclude_patterns: regex patterns of files to exclude
+    :param batch_size: number of files per xgettext call in the batched mode
+    :return: dictionary of {mode: seconds}
+    """
+    tmp_dir = tempfile.mkdtemp()
+    timings = {}
+    msgids = {}
+    try:
+        for mode, options in MODES:
+            options = dict(options, batch_size=batch_size) if options.get('batch_size') else options
+            po_path = os.path.join(tmp_dir, mode + '.po')
+            start = time.time()
+            extract_tags(directory, po_path, include_patterns=include_patterns,
+                         exclude_patterns=exclude_patterns, **options)
+            timings[mode] = time.time() - start
+            msgids[mode] = set(msgid for msgid, msgstr in iter_po(po_path)) if os.path.isfile(po_path) else set()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    for mode, options in MODES[1:]:
+        if msgids[mode] != msgids['per-file']:
+            raise AssertionError('%s extraction found %d msgids, per-file extraction found %d'
+                                 % (mode, len(msgids[mode]), len(msgids['per-file'])))
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help="Directory in which to search for _() tagged files")
+    parser.add_argument("--include_patterns", action='append', help="list of regex expressions for files to include")
+    parser.add_argument("--exclude_patterns", action='append', help="list of regex expressions for files to exclude")
+    parser.add_argument("--batch_size", type=int, default=500, help="number of files passed to each xgettext call")
+    args = parser.parse_args()
+
+    timings = time_extraction(args.directory, args.include_patterns, args.exclude_patterns, args.batch_size)
+    for mode, options in MODES:
+        print '{:>10}: {:.2f}s ({:.1f}x)'.format(mode, timings[mode], timings['per-file'] / max(timings[mode], 1e-9))
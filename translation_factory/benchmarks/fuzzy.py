@@ -0,0 +1,84 @@
+"""
+Latency of fuzzy translation suggestions against a large translation memory.
+
+    python -m translation_factory.benchmarks.fuzzy [--stored 100000] [--queries 2000]
+"""
+import time
+import random
+import argparse
+
+from translation_factory.fuzzy import FuzzyIndex
+
+
+
+def vocabulary(rng, size=5000):
+    """ Pseudo words with a realistic spread of lengths """
+    letters = 'etaoinshrdlcumwfgypbvkjxqz'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters[:rng.randint(8, 26)]) for _ in xrange(rng.randint(1, 10))))
+    return sorted(words)
+
+
+def random_phrase(rng, words):
+    return ' '.join(rng.choice(words) for _ in xrange(rng.randint(2, 9))).capitalize()
+
+
+def variation(rng, phrase, words):
+    """ Alter a phrase the way tags typically drift between applications """
+    kind = rng.randint(0, 3)
+    if kind == 0:
+        return phrase + ':'
+    elif kind == 1:
+        return phrase + '\\n'
+    elif kind == 2:
+        return phrase + ' ' + rng.choice(words)
+    return ' '.join(phrase.split()[:-1]) or phrase
+
+
+def time_suggestions(stored, queries, threshold=0.8, seed=0):
+    """
+    :param stored: number of translated phrases in the memory
+    :param queries: number of untranslated phrases to find suggestions for
+    :param threshold: minimum similarity of a suggestion
+    :return: dictionary of timings and hit counts
+    """
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    translations = {}
+    while len(translations) < stored:
+        phrase = random_phrase(rng, words)
+        translations[phrase] = phrase.upper()
+
+    start = time.time()
+    index = FuzzyIndex(translations.iteritems(), threshold=threshold)
+    build_time = time.time() - start
+
+    phrases = translations.keys()
+    lookups = [variation(rng, rng.choice(phrases), words) for _ in xrange(queries)]
+    latencies = []
+    hits = 0
+    for phrase in lookups:
+        start = time.time()
+        hits += bool(index.suggest(phrase))
+        latencies.append(time.time() - start)
+    latencies.sort()
+    return {'build': build_time,
+            'mean': sum(latencies) / len(latencies),
+            'p50': latencies[len(latencies) // 2],
+            'p99': latencies[int(len(latencies) * 0.99)],
+            'hits': hits}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stored", type=int, default=100000, help="number of phrases in the translation memory")
+    parser.add_argument("--queries", type=int, default=2000, help="number of phrases to find suggestions for")
+    parser.add_argument("--threshold", type=float, default=0.8, help="minimum similarity of a suggestion")
+    args = parser.parse_args()
+
+    r = time_suggestions(args.stored, args.queries, args.threshold)
+    print 'Index of {} phrases built in {:.2f}s'.format(args.stored, r['build'])
+    print 'Lookup latency: mean {:.2f}ms, p50 {:.2f}ms, p99 {:.2f}ms'.format(r['mean'] * 1e3, r['p50'] * 1e3,
+                                                                            r['p99'] * 1e3)
+    print '{} of {} phrases received a suggestion'.format(r['hits'], args.queries)
@@ -0,0 +1,87 @@
+"""
+Timing of create_master_table for many locales and phrases: created from scratch, refreshed after the table of one
+locale changed and after none did, and of the queries of the master table store.
+
+    python -m translation_factory.benchmarks.master_table [--locales 30] [--entries 100000]
+"""
+import os
+import sys
+import csv
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import collections
+
+from translation_factory.combine_tables import create_master_table, MasterTable
+
+
+def write_locale_tables(build_dir, application_name, locale_codes, entries, translated=0.9, seed=0):
+    """
+    Write sorted translation tables with a fraction of the phrases translated and a few rows missing per table.
+    """
+    rng = random.Random(seed)
+    phrases = sorted('Phrase number %d' % ii for ii in xrange(entries))
+    for lang, code in locale_codes:
+        os.makedirs(os.path.join(build_dir, code))
+        with open(os.path.join(build_dir, code, '{} - {}.csv'.format(application_name, lang)), 'w') as _csv:
+            writer = csv.writer(_csv)
+            writer.writerow(('Original Text', 'Translation', 'Additional Comments'))
+            for phrase in phrases:
+                r = rng.random()
+                if r < 0.001:
+                    continue
+                writer.writerow((phrase, '%s in %s' % (phrase, code) if r < translated else '', ''))
+
+
+def _timed(f, *args):
+    start = time.time()
+    result = f(*args)
+    return time.time() - start, result
+
+
+def time_master_table(locales, entries):
+    """
+    :param locales: number of locales
+    :param entries: number of phrases per locale
+    :return: OrderedDict of {step: seconds}
+    """
+    build_dir = tempfile.mkdtemp()
+    stdout = sys.stdout
+    try:
+        locale_codes = [('Language %d' % ii, 'l%d_XX' % ii) for ii in xrange(locales)]
+        write_locale_tables(build_dir, 'Benchmark', locale_codes, entries)
+        timings = collections.OrderedDict()
+        sys.stdout = open(os.devnull, 'w')
+        timings['create'], store = _timed(create_master_table, build_dir, 'Benchmark', locale_codes)
+        # Translate a few phrases of one locale
+        lang, code = locale_codes[0]
+        table = os.path.join(build_dir, code, '{} - {}.csv'.format('Benchmark', lang))
+        with open(table, 'r') as _csv:
+            rows = list(csv.reader(_csv))
+        for row in rows[1:100]:
+            row[1] = row[1] or 'New translation of %s' % row[0]
+        with open(table, 'w') as _csv:
+            csv.writer(_csv).writerows(rows)
+        timings['refresh one locale'], store = _timed(create_master_table, build_dir, 'Benchmark', locale_codes)
+        timings['refresh unchanged'], store = _timed(create_master_table, build_dir, 'Benchmark', locale_codes)
+        timings['load store'], store = _timed(MasterTable, store.path)
+        timings['missing'], missing = _timed(store.missing, code)
+        timings['missing (cached)'], missing = _timed(store.missing, code)
+        timings['coverage'], coverage = _timed(store.coverage)
+        return timings
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(build_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--locales", type=int, default=30, help="number of locales")
+    parser.add_argument("--entries", type=int, default=100000, help="number of phrases per locale")
+    args = parser.parse_args()
+
+    print 'Master table of {} locales x {} phrases'.format(args.locales, args.entries)
+    for step, elapsed in time_master_table(args.locales, args.entries).iteritems():
+        print '{:<20} {:.4f}s'.format(step, elapsed)
@@ -0,0 +1,104 @@
+"""
+Timing comparison of the line-based .po reader that po_to_csv used to have and the shared pofile parser.
+
+    python -m translation_factory.benchmarks.po_parser [--entries 200000] [--repeat 5]
+
+The readers are run in turns and the best time of each is reported along with its ratio to the old reader.
+"""
+import os
+import time
+import shutil
+import tempfile
+import argparse
+
+from itertools import chain
+
+from translation_factory.pofile import iter_entries
+
+
+def legacy_iter_po(filepath):
+    """
+    The .po reader po_to_csv had before the pofile module, kept for comparison.
+    """
+    msgid, msgstr = [], []
+    append_to = None
+    with open(filepath, 'r') as poFile:
+        for line in chain(poFile, '\n'):
+            if line.startswith('msgstr'):
+                append_to = msgstr
+            elif line.startswith('msgid'):
+                append_to = msgid
+
+            if append_to is not None:
+                append_to.append(line)
+
+            if line == '\n':
+                append_to = None
+
+                _msgid = ''.join([m.strip('"') for m in msgid])
+                _msgid = _msgid.replace('msgid "', '')
+                _msgid = _msgid.replace('"\n', '')
+
+                _msgstr = ''.join([m.strip('"') for m in msgstr])
+                _msgstr = _msgstr.replace('msgstr "', '')
+                _msgstr = _msgstr.replace('"\n', '')
+
+                del msgid[:]
+                del msgstr[:]
+                yield _msgid, _msgstr
+
+
+def write_po(po_path, entries):
+    """
+    Write a translated .po file of synthetic entries with references, flags and multi-line strings.
+    :param po_path: path to the po file
+    :param entries: number of entries
+    """
+    with open(po_path, 'w') as _po:
+        _po.write('msgid ""\nmsgstr ""\n"Content-Type: text/plain; charset=UTF-8\\n"\n')
+        for ii in xrange(entries):
+            _po.write('\n#: src/module_%d.py:%d\n' % (ii % 500, ii))
+            if ii % 10 == 0:
+                _po.write('#, python-format\nmsgid ""\n"Phrase number %d\\n"\n"with a second line"\n'
+                          'msgstr ""\n"Frase numero %d\\n"\n"con una segunda linea"\n' % (ii, ii))
+            else:
+                _po.write('msgid "Phrase number %d with a {placeholder}"\n'
+                          'msgstr "Frase numero %d con {placeholder}"\n' % (ii, ii))
+
+
+def time_parsers(entries, repeat=5):
+    """
+    Time reading every (msgid, msgstr) of a synthetic .po file with both readers.
+    :param entries: number of entries in the po file
+    :param repeat: number of times each reader is run
+    :return: dictionary of {reader: best time in seconds}
+    """
+    tmp_dir = tempfile.mkdtemp()
+    readers = (('legacy', lambda path: legacy_iter_po(path)),
+               ('pofile', lambda path: iter_entries(path)),
+               ('pofile (decoded)', lambda path: iter_entries(path, decode=True)))
+    timings = {}
+    try:
+        po_path = os.path.join(tmp_dir, 'messages.po')
+        write_po(po_path, entries)
+        for _ in xrange(repeat):
+            for name, reader in readers:
+                start = time.time()
+                parsed = sum(1 for _ in reader(po_path))
+                timings[name] = min(timings.get(name, float('inf')), time.time() - start)
+                if parsed != entries + 1:
+                    raise AssertionError('%s parsed %d entries, expected %d' % (name, parsed, entries + 1))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=200000, help="number of entries in the po file")
+    parser.add_argument("--repeat", type=int, default=5, help="number of times each reader is run")
+    args = parser.parse_args()
+
+    timings = time_parsers(args.entries, args.repeat)
+    for reader in sorted(timings):
+        print '{:>16}: {:.2f}s ({:.2f}x legacy)'.format(reader, timings[reader], timings[reader] / timings['legacy'])
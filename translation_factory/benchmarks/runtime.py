@@ -0,0 +1,128 @@
+"""
+Load time, memory and lookup time of the .mo files of many locales opened with gettext.GNUTranslations and with
+runtime.MMapTranslations. Each reader is measured in its own process.
+
+    python -m translation_factory.benchmarks.runtime [--locales 20] [--entries 50000] [--lookups 100000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import gettext
+import tempfile
+import argparse
+import subprocess
+
+from translation_factory.mofile import write_mo
+from translation_factory.runtime import MMapTranslations
+from translation_factory.benchmarks.synthetic import phrase_pool, locale_codes
+
+DOMAIN = 'Benchmark'
+READERS = ('gnu', 'mmap')
+HEADER = 'Content-Type: text/plain; charset=UTF-8\n'
+
+
+def write_locale_mo_files(localedir, locales, entries):
+    """
+    Write <locale code>/LC_MESSAGES/<DOMAIN>.mo for each locale.
+    :return: list of the msgids
+    """
+    msgids = phrase_pool(entries)
+    for lang, code in locale_codes(locales):
+        mo_dir = os.path.join(localedir, code, 'LC_MESSAGES')
+        os.makedirs(mo_dir)
+        write_mo(((msgid, '%s [%s]' % (msgid, code)) for msgid in msgids), os.path.join(mo_dir, DOMAIN + '.mo'),
+                 header=HEADER)
+    return msgids
+
+
+def memory():
+    """
+    :return: dictionary of the resident memory (kB) of this process, in total and anonymous (not backed by a file)
+    """
+    usage = {}
+    with open('/proc/self/status') as _f:
+        for line in _f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon'):
+                usage[key] = int(value.split()[0])
+    return usage
+
+
+def measure(reader, localedir, locales, lookups, entries):
+    """
+    Open every locale with the reader and look up random messages. Run in a child process.
+    :return: dictionary of the measurements
+    """
+    msgids = phrase_pool(entries)
+    rng = random.Random(0)
+    queries = [rng.choice(msgids) for _ in xrange(lookups)]
+    paths = [os.path.join(localedir, code, 'LC_MESSAGES', DOMAIN + '.mo') for lang, code in locale_codes(locales)]
+    before = memory()
+
+    start = time.time()
+    if reader == 'gnu':
+        translations = []
+        for path in paths:
+            with open(path, 'rb') as _f:
+                translations.append(gettext.GNUTranslations(_f))
+    else:
+        translations = [MMapTranslations(path) for path in paths]
+    load = time.time() - start
+    loaded = memory()
+
+    start = time.time()
+    for t in translations:
+        for msgid in queries:
+            t.gettext(msgid)
+    lookup = time.time() - start
+    after = memory()
+
+    return {'load': load, 'lookup': lookup / (len(paths) * lookups),
+            'rss_loaded': loaded['VmRSS'] - before['VmRSS'], 'rss_after': after['VmRSS'] - before['VmRSS'],
+            'anon_after': after.get('RssAnon', 0) - before.get('RssAnon', 0)}
+
+
+def time_runtime(locales, entries, lookups):
+    """
+    :return: dictionary of {reader: measurements}
+    """
+    localedir = tempfile.mkdtemp()
+    results = {}
+    try:
+        write_locale_mo_files(localedir, locales, entries)
+        for reader in READERS:
+            output = subprocess.check_output([sys.executable, '-m', 'translation_factory.benchmarks.runtime',
+                                              '--child', reader, '--localedir', localedir, '--locales', str(locales),
+                                              '--entries', str(entries), '--lookups', str(lookups)])
+            results[reader] = json.loads(output)
+    finally:
+        shutil.rmtree(localedir)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--locales", type=int, default=20, help="number of locales")
+    parser.add_argument("--entries", type=int, default=50000, help="number of messages per locale")
+    parser.add_argument("--lookups", type=int, default=100000, help="number of lookups per locale")
+    parser.add_argument("--child", choices=READERS, help=argparse.SUPPRESS)
+    parser.add_argument("--localedir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print json.dumps(measure(args.child, args.localedir, args.locales, args.lookups, args.entries))
+    else:
+        results = time_runtime(args.locales, args.entries, args.lookups)
+        print '{} locales x {} messages, {} lookups per locale'.format(args.locales, args.entries, args.lookups)
+        # The RSS of mapped files is made of clean pages shared with every process reading them, anonymous memory is
+        # private to the process
+        print '{:>6} {:>8} {:>10} {:>10} {:>15} {:>10}'.format('reader', 'load', 'lookup', 'RSS load', 'RSS lookups',
+                                                              'anonymous')
+        for reader in READERS:
+            r = results[reader]
+            print '{:>6} {:>7.2f}s {:>8.2f}us {:>8.1f}MB {:>13.1f}MB {:>8.1f}MB'.format(
+                reader, r['load'], r['lookup'] * 1e6, r['rss_loaded'] / 1024., r['rss_after'] / 1024.,
+                r['anon_after'] / 1024.)
@@ -0,0 +1,190 @@
+"""
+Times every stage of a build on synthetic source trees and tables of several sizes and writes the results as JSON
+so that they can be compared between commits.
+
+    python -m translation_factory.benchmarks.suite [--sizes small medium large] [--output results.json]
+                                                   [--compare previous.json]
+
+Stages that need xgettext or msgfmt are skipped when the tools are not installed.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+
+from datetime import datetime
+from distutils.spawn import find_executable
+
+from translation_factory.tags import extract_tags
+from translation_factory.po_to_csv import po_to_csv
+from translation_factory.csv_to_po import csv_to_po
+from translation_factory.factory import build, merge_csv
+from translation_factory.combine_tables import create_master_table
+from translation_factory.benchmarks.synthetic import write_source_tree, write_translated_tables, locale_codes
+
+# name: (source files, tags per file, locales)
+SIZES = {'small': (50, 20, 3),
+         'medium': (500, 20, 5),
+         'large': (2000, 30, 10)}
+
+
+class _Silenced(object):
+    """ Hide the progress printed by the stages while they are timed """
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def _timed(timings, stage, func, *args, **kwargs):
+    with _Silenced():
+        start = time.time()
+        result = func(*args, **kwargs)
+        timings[stage] = time.time() - start
+    return result
+
+
+def run_size(files, tags_per_file, locales, overlap=0.5):
+    """
+    Time each stage on a synthetic source tree.
+
+    :param files: number of source files
+    :param tags_per_file: number of tags per source file
+    :param locales: number of locales
+    :param overlap: fraction of the tags shared between files
+    :return: (number of unique msgids, {stage: seconds}, {stage: reason skipped})
+    """
+    xgettext = find_executable('xgettext')
+    msgfmt = find_executable('msgfmt')
+    tmp_dir = tempfile.mkdtemp()
+    timings, skipped = {}, {}
+    try:
+        src_dir = os.path.join(tmp_dir, 'src')
+        msgids = write_source_tree(src_dir, files, tags_per_file, overlap=overlap)
+        codes = locale_codes(locales)
+
+        if xgettext:
+            _timed(timings, 'extract_tags (xgettext)', extract_tags, src_dir, os.path.join(tmp_dir, 'xgettext.po'),
+                   include_patterns=['.*py$'])
+        else:
+            skipped['extract_tags (xgettext)'] = 'xgettext is not installed'
+        po_path = _timed(timings, 'extract_tags (python)', extract_tags, src_dir, os.path.join(tmp_dir, 'messages.po'),
+                         include_patterns=['.*py$'], backend='python')
+        csv_template = _timed(timings, 'po_to_csv', po_to_csv, po_path, os.path.join(tmp_dir, 'messages.csv'))
+
+        # Tables of a previously translated application are merged into the tables of this one
+        build_dir = os.path.join(tmp_dir, 'build')
+        old_tables = write_translated_tables(build_dir, 'Previous', codes, msgids)
+        tables = []
+        for (language, code), old_table in zip(codes, old_tables):
+            tables.append(os.path.join(build_dir, code, 'App - %s.csv' % language))
+            shutil.copy(csv_template, tables[-1])
+        _timed(timings, 'merge_csv', lambda: [merge_csv(old, new) for old, new in zip(old_tables, tables)])
+
+        po_files = [os.path.splitext(t)[0] + '.po' for t in tables]
+        _timed(timings, 'csv_to_po (builtin .mo)',
+               lambda: [csv_to_po(t, p, mo_path=p[:-3] + '.mo') for t, p in zip(tables, po_files)])
+        if msgfmt:
+            _timed(timings, 'msgfmt', lambda: [subprocess.check_call((msgfmt, '-o', p[:-3] + '.msgfmt.mo', p))
+                                               for p in po_files])
+        else:
+            skipped['msgfmt'] = 'msgfmt is not installed'
+
+        _timed(timings, 'create_master_table', create_master_table, build_dir, 'App', codes)
+
+        backends = ['python'] + (['xgettext'] if xgettext else [])
+        if not xgettext:
+            skipped['build (xgettext)'] = 'xgettext is not installed'
+        for backend in backends:
+            build_dir = os.path.join(tmp_dir, 'build_' + backend)
+            write_translated_tables(build_dir, 'Previous', codes, msgids)
+            options = dict(include_patterns=['.*py$'], extract_backend=backend,
+                           mo_compiler='msgfmt' if backend == 'xgettext' and msgfmt else 'builtin')
+            _timed(timings, 'build (%s)' % backend, build, src_dir, 'App', codes, build_dir, **options)
+            # Second build of an unchanged tree, the extraction cache and translation memory are warm
+            _timed(timings, 'build (%s, rebuild)' % backend, build, src_dir, 'App', codes, build_dir, **options)
+    finally:
+        shutil.rmtree(tmp_dir)
+    return len(msgids), timings, skipped
+
+
+def run(sizes, repeat=1, overlap=0.5):
+    """
+    :param sizes: names of the SIZES to run
+    :param repeat: number of runs of each size, the fastest time of each stage is kept
+    :param overlap: fraction of the tags shared between files
+    :return: JSON serializable results
+    """
+    results = []
+    for name in sizes:
+        files, tags_per_file, locales = SIZES[name]
+        stages = {}
+        for _ in xrange(repeat):
+            msgids, timings, skipped = run_size(files, tags_per_file, locales, overlap=overlap)
+            for stage, seconds in timings.iteritems():
+                stages[stage] = min(seconds, stages.get(stage, seconds))
+        results.append({'size': name, 'files': files, 'tags_per_file': tags_per_file, 'locales': locales,
+                        'overlap': overlap, 'msgids': msgids, 'seconds': stages, 'skipped': skipped})
+    return {'created': datetime.now().isoformat(),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'results': results}
+
+
+def _commit():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(('git', 'rev-parse', 'HEAD'), stderr=devnull,
+                                           cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    """
+    Print the time of each stage next to the time of the same stage in previous results.
+    """
+    before = dict((r['size'], r['seconds']) for r in previous['results'])
+    print 'Compared with {} ({})'.format(previous.get('commit'), previous.get('created'))
+    for result in results['results']:
+        for stage, seconds in sorted(result['seconds'].iteritems()):
+            old = before.get(result['size'], {}).get(stage)
+            change = '{:+.0%}'.format(seconds / old - 1) if old else 'new'
+            print '{:>8} {:<32} {:8.3f}s {:>8}'.format(result['size'], stage, seconds, change)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs='+', default=['small', 'medium'], choices=sorted(SIZES),
+                        help="sizes of the synthetic trees")
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each size, the fastest is kept")
+    parser.add_argument("--overlap", type=float, default=0.5, help="fraction of the tags shared between files")
+    parser.add_argument("--output", default='benchmark_results.json', help="path of the JSON results")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = run(args.sizes, repeat=args.repeat, overlap=args.overlap)
+    with open(args.output, 'w') as _f:
+        json.dump(results, _f, indent=2, sort_keys=True)
+    for result in results['results']:
+        for stage, reason in sorted(result['skipped'].iteritems()):
+            print '{:>8} {:<32} skipped: {}'.format(result['size'], stage, reason)
+    if args.compare:
+        with open(args.compare) as _f:
+            compare(results, json.load(_f))
+    else:
+        for result in results['results']:
+            for stage, seconds in sorted(result['seconds'].iteritems()):
+                print '{:>8} {:<32} {:8.3f}s'.format(result['size'], stage, seconds)
+    print 'Results written to %s' % args.output
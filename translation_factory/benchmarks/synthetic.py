@@ -0,0 +1,99 @@
+"""
+Generators of synthetic source trees and translation tables for the benchmarks.
+"""
+import os
+import csv
+import random
+
+TEMPLATES = ('Phrase {word} number {n}',
+             'Unable to open {{path}} for {word} {n}',
+             'Saved %d {word} files ({n})',
+             'Processing {word} {n}, please wait...',
+             '{word} {n}:')
+
+
+def phrase_pool(count, seed=0):
+    """
+    Unique phrases shaped like typical tags (placeholders, trailing colons, punctuation).
+    :param count: number of phrases
+    :param seed: random seed
+    :return: list of phrases
+    """
+    rng = random.Random(seed)
+    words = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet']
+    return [rng.choice(TEMPLATES).format(word=rng.choice(words), n=n) for n in xrange(count)]
+
+
+def write_source_tree(directory, files, tags_per_file, overlap=0.5, files_per_package=50, seed=0):
+    """
+    Write a tree of python modules calling _() and ngettext().
+
+    :param directory: root of the tree, created if it does not exist
+    :param files: number of source files
+    :param tags_per_file: number of tags in each file
+    :param overlap: fraction (0 - 1) of the tags that are shared with other files. 0 makes every tag unique,
+                    1 draws every tag from a pool the size of a single file.
+    :param files_per_package: number of modules per sub-package
+    :param seed: random seed
+    :return: sorted list of the unique msgids in the tree
+    """
+    rng = random.Random(seed)
+    total = files * tags_per_file
+    shared = max(1, int(tags_per_file * (1 - overlap) * files + tags_per_file * overlap))
+    pool = phrase_pool(min(total, shared), seed=seed)
+    used = set()
+    unique = iter(pool)
+    for ii in xrange(files):
+        package = os.path.join(directory, 'package_%d' % (ii // files_per_package))
+        if not os.path.isdir(package):
+            os.makedirs(package)
+            open(os.path.join(package, '__init__.py'), 'w').close()
+        lines = ['from gettext import gettext as _, ngettext\n', '\n', '\n', 'def function_%d(count):\n' % ii,
+                 '    messages = []\n']
+        for jj in xrange(tags_per_file):
+            phrase = rng.choice(pool) if rng.random() < overlap else next(unique, None) or rng.choice(pool)
+            used.add(phrase)
+            if jj % 10 == 9:
+                lines.append('    messages.append(ngettext(%r, %r, count))\n' % (phrase, phrase + 's'))
+            else:
+                lines.append('    messages.append(_(%r))\n' % phrase)
+        lines.append('    return messages\n')
+        with open(os.path.join(package, 'module_%d.py' % ii), 'w') as _f:
+            _f.writelines(lines)
+    return sorted(used)
+
+
+def write_translated_tables(build_dir, application_name, locale_codes, msgids, translated=0.9, seed=0):
+    """
+    Write a translation table per locale with a fraction of the phrases translated.
+
+    :param build_dir: build directory the locale directories are created in
+    :param application_name: name of the application the tables belong to
+    :param locale_codes: list of (language, locale code)
+    :param msgids: phrases of the tables
+    :param translated: fraction (0 - 1) of the phrases that are translated
+    :param seed: random seed
+    :return: list of the paths of the tables
+    """
+    rng = random.Random(seed)
+    paths = []
+    for language, code in locale_codes:
+        locale_dir = os.path.join(build_dir, code)
+        if not os.path.isdir(locale_dir):
+            os.makedirs(locale_dir)
+        path = os.path.join(locale_dir, '{} - {}.csv'.format(application_name, language))
+        with open(path, 'w') as _csv:
+            writer = csv.writer(_csv)
+            writer.writerow(('Original Text', 'Translation', 'Additional Comments'))
+            for msgid in msgids:
+                # Translations keep the placeholders of the phrase
+                writer.writerow((msgid, '%s [%s]' % (msgid, code) if rng.random() < translated else '', ''))
+        paths.append(path)
+    return paths
+
+
+def locale_codes(count):
+    """
+    :return: list of count synthetic (language, locale code)
+    """
+    return [('Language %d' % ii, 'l%d_XX' % ii) for ii in xrange(count)]
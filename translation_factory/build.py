@@ -1,7 +1,7 @@
 import sys
 import logging
 import json
-from factory import build
+from factory import build, build_applications
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -16,8 +16,24 @@ config_file = args[0]
 try:
     with open(config_file) as _f:
         config = json.load(_f)
-    build(**config)
+    # A list of configurations, or {"applications": [...], ...} with settings shared by the applications, is built
+    # as a batch
+    if isinstance(config, list):
+        results = build_applications(config)
+    elif 'applications' in config:
+        results = build_applications(config.pop('applications'), **config)
+    else:
+        results = [build(**config)]
 except Exception as e:
     logging.error(e)
+    sys.exit(1)
+
+for result in results:
+    if not result and result is not False:
+        for locale_result in result.failed:
+            logging.error('{} {} - {} failed: {}'.format(result.application_name, locale_result.locale,
+                                                         locale_result.code, locale_result.error))
+if not all(results):
+    sys.exit(1)
 
 
@@ -0,0 +1,194 @@
+__author__ = 'clobo'
+
+import csv
+import itertools
+
+from pofile import iter_entries, escape
+from atomic import atomic_write
+
+CSV_HEADER = ('Original Text', 'Translation', 'Additional Comments')
+
+
+class Catalog(object):
+    """
+    In-memory translation table that is passed between the stages of a build.
+
+    Phrases, translations and comments are held in parallel lists in table order along with an index of
+    {msgid: position}. Strings are kept in their PO-escaped form, the same form as in the csv tables.
+    """
+    __slots__ = ('header', 'msgids', 'msgstrs', 'comments', 'index')
+
+    def __init__(self, header=CSV_HEADER):
+        self.header = tuple(header)
+        self.msgids = []
+        self.msgstrs = []
+        self.comments = []
+        self.index = {}
+
+    def __getstate__(self):
+        return self.header, self.msgids, self.msgstrs, self.comments
+
+    def __setstate__(self, state):
+        self.header, self.msgids, self.msgstrs, self.comments = state
+        self.index = dict((msgid, ii) for ii, msgid in enumerate(self.msgids))
+
+    def __len__(self):
+        return len(self.msgids)
+
+    def __contains__(self, msgid):
+        return msgid in self.index
+
+    def __iter__(self):
+        """
+        :return: generator of (msgid, msgstr, comment) in table order
+        """
+        return iter(zip(self.msgids, self.msgstrs, self.comments))
+
+    def add(self, msgid, msgstr='', comment=''):
+        """
+        Add a phrase to the end of the table. Phrases already in the table are left as they are.
+        :return: True if the phrase was added
+        """
+        if msgid in self.index:
+            return False
+        self.index[msgid] = len(self.msgids)
+        self.msgids.append(msgid)
+        self.msgstrs.append(msgstr)
+        self.comments.append(comment)
+        return True
+
+    def get(self, msgid, default=None):
+        """
+        Translation of a phrase, default if the phrase is not in the table.
+        """
+        ii = self.index.get(msgid)
+        return default if ii is None else self.msgstrs[ii]
+
+    def set(self, msgid, msgstr, comment=None):
+        """
+        Set the translation (and optionally the comment) of a phrase that is in the table.
+        """
+        ii = self.index[msgid]
+        self.msgstrs[ii] = msgstr
+        if comment is not None:
+            self.comments[ii] = comment
+
+    def translations(self):
+        """
+        :return: dictionary of {msgid: msgstr} of the translated phrases
+        """
+        return dict((msgid, msgstr) for msgid, msgstr in zip(self.msgids, self.msgstrs) if msgstr)
+
+    def copy(self):
+        """
+        :return: Catalog with the same contents
+        """
+        catalog = Catalog(self.header)
+        catalog.msgids = list(self.msgids)
+        catalog.msgstrs = list(self.msgstrs)
+        catalog.comments = list(self.comments)
+        catalog.index = self.index.copy()
+        return catalog
+
+    def sort(self):
+        """
+        Sort the table alphabetically by phrase.
+        """
+        rows = sorted(zip(self.msgids, self.msgstrs, self.comments), key=lambda r: r[0])
+        self.msgids = [r[0] for r in rows]
+        self.msgstrs = [r[1] for r in rows]
+        self.comments = [r[2] for r in rows]
+        self.index = dict((msgid, ii) for ii, msgid in enumerate(self.msgids))
+
+    @classmethod
+    def from_messages(cls, messages, checker=None):
+        """
+        Create an untranslated table from extracted messages.
+        :param messages: dictionary of {(msgctxt, msgid): Message} as returned by pyextract.collect_messages.
+                         Messages that share a msgid (in different contexts) get a single row, as in read_po.
+        :param checker: TagChecker the phrases are checked with as they are added
+        :return: Catalog
+        """
+        catalog = cls()
+        for message in messages.itervalues():
+            msgid = intern(escape(message.msgid))
+            if catalog.add(msgid) and checker is not None:
+                checker.check(msgid, message.references)
+        return catalog
+
+    @classmethod
+    def read_po(cls, po_path, translations=True, checker=None):
+        """
+        Create a table from a po file. Entries that share a msgid (in different contexts) get a single row and
+        plural entries are keyed by their singular msgid.
+        :param po_path: path to the po file
+        :param translations: keep the msgstr of the entries, otherwise the table is left untranslated
+        :param checker: TagChecker the phrases are checked with as they are added
+        :return: Catalog
+        """
+        catalog = cls()
+        for entry in iter_entries(po_path):
+            if entry.is_header or entry.obsolete:
+                continue
+            if catalog.add(entry.msgid, entry.msgstr if translations else '') and checker is not None:
+                checker.check(entry.msgid, entry.references)
+        return catalog
+
+    @classmethod
+    def read_csv(cls, csv_path):
+        """
+        Read a translation table.
+        :param csv_path: path to the csv file
+        :return: Catalog
+        """
+        with open(csv_path, 'r') as _csv:
+            csv_reader = csv.reader(_csv)
+            catalog = cls(next(csv_reader, CSV_HEADER))
+            for msgid, msgstr, comment in _csv_rows(csv_reader):
+                catalog.add(intern(msgid), msgstr, comment)
+        return catalog
+
+    def write_csv(self, csv_path):
+        """
+        Write the translation table. The file is replaced only once it has been written completely.
+        :param csv_path: path to the csv file
+        :return: csv_path
+        """
+        return write_csv(csv_path, itertools.izip(self.msgids, self.msgstrs, self.comments), self.header)
+
+
+def _csv_rows(csv_reader):
+    for row in csv_reader:
+        if not row:
+            continue
+        yield row[0], row[1] if len(row) > 1 else '', row[2] if len(row) > 2 else ''
+
+
+def iter_csv(csv_path):
+    """
+    Iterate through the rows of a translation table without reading the whole table.
+    :param csv_path: path to the csv file
+    :return: generator of (msgid, msgstr, comment), the header is skipped
+    """
+    with open(csv_path, 'r') as _csv:
+        csv_reader = csv.reader(_csv)
+        next(csv_reader, None)
+        for row in _csv_rows(csv_reader):
+            yield row
+
+
+def write_csv(csv_path, rows, header=CSV_HEADER):
+    """
+    Write a translation table from rows. The file is replaced only once it has been written completely.
+    :param csv_path: path to the csv file
+    :param rows: iterable of (msgid, msgstr, comment)
+    :param header: header row
+    :return: csv_path
+    """
+    with atomic_write(csv_path) as _csv:
+        csv_writer = csv.writer(_csv)
+        csv_writer.writerow(header)
+        row = [''] * max(3, len(header))
+        for row[0], row[1], row[2] in rows:
+            csv_writer.writerow(row)
+    return csv_path
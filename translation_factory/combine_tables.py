@@ -1,83 +1,381 @@
 import os
 import csv
+import array
+import marshal
+import argparse
 import itertools
-from collections import defaultdict
+import collections
 
+from atomic import atomic_write
 
-def create_master_table(build_dir, application_name, locale_codes, outfile=None):
+STORE_VERSION = 2
+# State of a phrase in the table of a locale
+ABSENT, UNTRANSLATED, TRANSLATED = 0, 1, 2
 
-    fmt = 'csv'
-    if outfile is None:
-        outfile = os.path.join(build_dir, 'all_translations.' + fmt)
 
-    open_files = {}
-    csv_readers = {}
-    # Find all the language CSV files and open them
-    print 'Searching for CSV tables.'
-    for lang, locale_code in locale_codes:
-        csv_path = os.path.join(build_dir, locale_code, "{} - {}.csv".format(application_name, lang))
-        if os.path.isfile(csv_path):
-            lang_header = "%s (%s)" % (lang, locale_code)
-            open_files[lang_header] = open(csv_path, 'r')
-            csv_readers[lang_header] = csv.reader(open_files[lang_header])
-            header = csv_readers[lang_header].next()
-            print '%s CSV found.' % lang_header
-
-    missing = defaultdict(dict)
-    print 'Combining tables for %s into a master table' % ', '.join(open_files.iterkeys())
-    with open(outfile, 'w') as _csv:
-        csvFile = csv.writer(_csv)
-        outfile_headers = ['Original Text'] + open_files.keys() + ['Additional Comments']
-        csvFile.writerow(outfile_headers)
-        row = {'Additional Comments': ''}
-        filecount = 0
-        # Iterate through all the csv's one row at a time and combine them into one row in the master table
-        for lang, csv_reader in itertools.cycle(csv_readers.iteritems()):
-            filecount += 1
+class _Column(object):
+    """
+    Translations of a locale, aligned with the phrases of the master table. The translations are concatenated in a
+    single string with an array of their offsets, the state of each phrase is kept in a bytearray and the (few)
+    comments in a dictionary of {row: comment}.
+    """
+    __slots__ = ('language', 'table', 'stamp', 'state', 'offsets', 'blob', 'comments', 'translated')
+
+    def __init__(self, language, table, stamp, rows):
+        self.language = language
+        self.table = table
+        self.stamp = stamp
+        self.state = bytearray(rows)
+        self.offsets = array.array('I', [0]) * (rows + 1)
+        self.blob = ''
+        self.comments = {}
+        self.translated = 0
+
+    def __getstate__(self):
+        return (self.language, self.table, self.stamp, str(self.state), self.offsets.tostring(), self.blob,
+                self.comments, self.translated)
+
+    def __setstate__(self, state):
+        self.language, self.table, self.stamp, state_, offsets, self.blob, self.comments, self.translated = state
+        self.state = bytearray(state_)
+        self.offsets = array.array('I')
+        self.offsets.fromstring(offsets)
+
+    def get(self, row):
+        """
+        :return: translation of a row, '' if untranslated
+        """
+        return self.blob[self.offsets[row]:self.offsets[row + 1]]
+
+    def set_translations(self, translations):
+        """
+        Replace the translations of every row.
+        :param translations: list of the translation of each row
+        """
+        offset = 0
+        offsets = self.offsets
+        for ii, msgstr in enumerate(translations):
+            offset += len(msgstr)
+            offsets[ii + 1] = offset
+        self.blob = ''.join(translations)
+
+    def extend(self, rows):
+        """
+        Add untranslated rows for phrases that are not in the table of the locale.
+        """
+        self.state.extend(bytearray(rows))
+        self.offsets.extend(array.array('I', [self.offsets[-1]]) * rows)
+
+
+class MasterTable(object):
+    """
+    Columnar store of the translations of every locale of an application, kept in
+    build_dir/<application name> - master_table.store (see store_path).
+
+    The phrases of all the tables are held once (interned) in a single column, and each locale has a column of its
+    translations aligned with it. Only the locales whose table changed are read again, and the phrases missing a
+    translation and the coverage of each locale are answered from the columns. all_translations.csv and
+    missing_translations.csv are exported from the store.
+    """
+
+    # Number of rows exported at a time
+    EXPORT_CHUNK = 4096
+
+    def __init__(self, path):
+        self.path = path
+        self.msgids = []
+        self.index = {}
+        # Number of locale tables each phrase is in. Phrases that are in none of them are dropped by compact().
+        self.refs = array.array('H')
+        self.live = 0
+        self.columns = collections.OrderedDict()
+        self.modified = False
+        # {path: (mtime, size)} of the files exported from the store
+        self.exports = {}
+        self._missing = {}
+        if os.path.isfile(path):
             try:
-                original, translated, comment = csv_reader.next()
-            except StopIteration as e:
-                break
-            if translated == '':
-                missing[original].update({lang: original})
-            if row.get('Original Text', None) is None:
-                # If this was the first language in the iteration for this row, set it's original text column
-                row['Original Text'] = original
-                row[lang] = translated
-            elif row['Original Text'] == original:
-                # Add this csv's translation to the row
-                row[lang] = translated
+                with open(path, 'rb') as _f:
+                    data = marshal.load(_f)
+                if data[0] == STORE_VERSION:
+                    self._load(data)
+            except (EOFError, ValueError, TypeError, IndexError) as e:
+                print 'Unable to load the master table store %s: %s' % (path, e)
+
+    def _load(self, data):
+        version, msgids, refs, columns, self.exports = data
+        self.msgids = [intern(msgid) for msgid in msgids]
+        self.index = dict((msgid, ii) for ii, msgid in enumerate(self.msgids))
+        self.refs.fromstring(refs)
+        self.live = sum(1 for r in self.refs if r)
+        for code, state in columns:
+            column = self.columns[code] = _Column.__new__(_Column)
+            column.__setstate__(state)
+
+    def __len__(self):
+        return self.live
+
+    def _add_rows(self, msgids):
+        for msgid in msgids:
+            msgid = intern(msgid)
+            self.index[msgid] = len(self.msgids)
+            self.msgids.append(msgid)
+        self.refs.extend(array.array('H', [0]) * len(msgids))
+        for column in self.columns.itervalues():
+            column.extend(len(msgids))
+
+    def _release(self, column):
+        """
+        Remove the phrases of a column from the reference counts.
+        """
+        refs = self.refs
+        for ii, state in enumerate(column.state):
+            if state:
+                refs[ii] -= 1
+                if not refs[ii]:
+                    self.live -= 1
+
+    def update(self, code, language, table, stamp=None):
+        """
+        Read the table of a locale into its column.
+        :param code: locale code
+        :param language: language name of the locale
+        :param table: path of the csv table
+        :param stamp: (mtime, size) of the table when it is read
+        """
+        with open(table, 'r') as _csv:
+            csv_reader = csv.reader(_csv)
+            header = next(csv_reader, None)
+            rows = [(row + ['', ''])[:3] for row in csv_reader if row]
+        index = self.index
+        new = set()
+        self._add_rows([row[0] for row in rows if row[0] not in index and not (row[0] in new or new.add(row[0]))])
+
+        if code in self.columns:
+            self._release(self.columns[code])
+        column = self.columns[code] = _Column(language, table, stamp, len(self.msgids))
+        translations = [''] * len(self.msgids)
+        refs, state, comments = self.refs, column.state, column.comments
+        for msgid, msgstr, comment in rows:
+            ii = index[msgid]
+            if state[ii]:
+                # Duplicate phrase within a table, keep the first translation
+                if state[ii] == TRANSLATED:
+                    continue
+                comments.pop(ii, None)
             else:
-                print "Translation table's row for:\n" \
-                      "'%s'\n" \
-                      "does not correctly align with other CSVs. Skipping this row" % original
-                continue
-            # If there is a comment, add it to the other comments
+                if not refs[ii]:
+                    self.live += 1
+                refs[ii] += 1
+            translations[ii] = msgstr
+            state[ii] = TRANSLATED if msgstr else UNTRANSLATED
             if comment:
-                if row['Additional Comments']:
-                    row['Additional Comments'] += '\n%s: %s' % (lang, comment)
-                else:
-                    row['Additional Comments'] = '%s: %s' % (lang, comment)
+                comments[ii] = comment
+        column.set_translations(translations)
+        column.translated = state.count(chr(TRANSLATED))
+        self._missing.clear()
+        self.modified = True
+
+    def remove(self, code):
+        """
+        Drop the column of a locale.
+        """
+        self._release(self.columns.pop(code))
+        self._missing.clear()
+        self.modified = True
+
+    def refresh(self, build_dir, application_name, locale_codes):
+        """
+        Bring the store up to date with the tables of an application. The tables that are new or changed since they
+        were last read are read again and the locales that have no table anymore are dropped.
+        :param build_dir: build directory of the application
+        :param application_name: name of the application
+        :param locale_codes: list of (language, locale code)
+        :return: list of the codes of the locales that were read
+        """
+        tables = collections.OrderedDict()
+        for lang, locale_code in locale_codes:
+            csv_path = os.path.join(build_dir, locale_code, "{} - {}.csv".format(application_name, lang))
+            if os.path.isfile(csv_path):
+                tables[locale_code] = lang, csv_path
+        for code in [c for c in self.columns if c not in tables]:
+            self.remove(code)
+
+        updated = []
+        for code, (lang, csv_path) in tables.iteritems():
+            st = os.stat(csv_path)
+            stamp = st.st_mtime, st.st_size
+            column = self.columns.get(code)
+            if column is None or (column.language, column.table, column.stamp) != (lang, csv_path, stamp):
+                self.update(code, lang, csv_path, stamp)
+                updated.append(code)
+        # Columns in the order of the locales
+        if self.columns.keys() != tables.keys():
+            self.columns = collections.OrderedDict((code, self.columns[code]) for code in tables)
+            self.modified = True
+        return updated
+
+    def rows(self):
+        """
+        :return: list of the rows of the phrases of the master table, in alphabetical order of the phrases
+        """
+        msgids = self.msgids
+        return sorted((ii for ii, r in enumerate(self.refs) if r), key=msgids.__getitem__)
+
+    def missing(self, code):
+        """
+        Phrases of the master table that a locale has no translation for.
+        :param code: locale code, raises KeyError if the master table has no table of the locale
+        :return: sorted list of phrases
+        """
+        rows = self._missing.get(code)
+        if rows is None:
+            msgids, state = self.msgids, self.columns[code].state
+            rows = self._missing[code] = array.array('I', sorted(
+                (ii for ii, (r, s) in enumerate(itertools.izip(self.refs, state)) if r and s != TRANSLATED),
+                key=msgids.__getitem__))
+        return [self.msgids[ii] for ii in rows]
+
+    def coverage(self):
+        """
+        :return: OrderedDict of {locale code: (translated phrases, phrases of the master table)}
+        """
+        return collections.OrderedDict((code, (column.translated, self.live))
+                                       for code, column in self.columns.iteritems())
 
-            if filecount == len(open_files):
-                # We reached the end of the row, write the row and restart
-                csvFile.writerow([row[c] for c in outfile_headers])
-                filecount = 0
-                row = {'Additional Comments': ''}
+    def compact(self):
+        """
+        Drop the phrases that are in no table anymore and put the others in alphabetical order.
+        """
+        rows = self.rows()
+        for column in self.columns.itervalues():
+            translations = [column.get(ii) for ii in rows]
+            column.comments = dict((new, column.comments[ii]) for new, ii in enumerate(rows) if ii in column.comments)
+            column.state = bytearray(column.state[ii] for ii in rows)
+            column.offsets = array.array('I', [0]) * (len(rows) + 1)
+            column.set_translations(translations)
+        self.msgids = [self.msgids[ii] for ii in rows]
+        self.index = dict((msgid, ii) for ii, msgid in enumerate(self.msgids))
+        self.refs = array.array('H', (self.refs[ii] for ii in rows))
+        self._missing.clear()
+        self.modified = True
 
-        for f in open_files.itervalues():
-            f.close()
+    def save(self):
+        """
+        Write the store if it was modified. The phrases that are in no table anymore are dropped first once they
+        are more than a quarter of the rows.
+        """
+        if not self.modified:
+            return
+        if len(self.msgids) - self.live > len(self.msgids) // 4:
+            self.compact()
+        with atomic_write(self.path, 'wb') as _f:
+            marshal.dump((STORE_VERSION, self.msgids, self.refs.tostring(),
+                          [(code, column.__getstate__()) for code, column in self.columns.iteritems()],
+                          self.exports), _f)
+        self.modified = False
+
+    def exported(self, *paths):
+        """
+        :return: True if the files were exported from the store as it is and have not been replaced since (ie. by
+                 the export of another application sharing the build directory)
+        """
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            if self.modified or self.exports.get(path) != (st.st_mtime, st.st_size):
+                return False
+        return True
+
+    def export_csv(self, outfile, missing_path):
+        """
+        Write the master table (every phrase with the translation of each locale and their comments) and the
+        table of the phrases missing a translation in any locale.
+        :param outfile: path of the master table
+        :param missing_path: path of the table of missing translations
+        """
+        langs = ['%s (%s)' % (column.language, code) for code, column in self.columns.iteritems()]
+        columns = self.columns.values()
+        rows = self.rows()
+        with atomic_write(outfile) as _csv, atomic_write(missing_path) as _missing:
+            csvFile = csv.writer(_csv)
+            csvFile.writerow(['Original Text'] + langs + ['Additional Comments'])
+            missingFile = csv.writer(_missing)
+            missingFile.writerow(['Original Text'] + langs)
+            # The translations are sliced out of the columns one chunk of rows at a time
+            for start in xrange(0, len(rows), self.EXPORT_CHUNK):
+                chunk = rows[start:start + self.EXPORT_CHUNK]
+                sliced = [[column.blob[column.offsets[ii]:column.offsets[ii + 1]] for ii in chunk]
+                          for column in columns]
+                for ii, translations in itertools.izip(chunk, itertools.izip(*sliced)):
+                    original = self.msgids[ii]
+                    comments = ['%s: %s' % (langs[jj], column.comments[ii])
+                                for jj, column in enumerate(columns) if ii in column.comments]
+                    csvFile.writerow((original, ) + translations + ('\n'.join(comments), ))
+                    if not all(translations):
+                        missingFile.writerow([original] + [original if not t else '' for t in translations])
+        for path in outfile, missing_path:
+            st = os.stat(path)
+            self.exports[path] = st.st_mtime, st.st_size
+        self.modified = True
 
-        with open(os.path.join(build_dir, 'missing_translations.' + fmt), 'w') as f:
-            csvFile = csv.writer(f)
-            csvFile.writerow(['Original Text'] + open_files.keys())
-            for phrase, miss in sorted(missing.iteritems()):
-                csvFile.writerow([phrase] + [miss.get(l, '') for l in open_files.iterkeys()])
 
-        print 'Master table is ready at %s' % outfile
+def store_path(build_dir, application_name):
+    """
+    :return: path of the master table store of an application
+    """
+    return os.path.join(build_dir, "{} - master_table.store".format(application_name))
 
 
+def create_master_table(build_dir, application_name, locale_codes, outfile=None):
+    """
+    Update the master table store of the build directory with the tables of the locales that changed, and export
+    all_translations.csv and missing_translations.csv from it.
+    :return: MasterTable
+    """
+    fmt = 'csv'
+    if outfile is None:
+        outfile = os.path.join(build_dir, 'all_translations.' + fmt)
+
+    store = MasterTable(store_path(build_dir, application_name))
+    # Find all the language CSV files
+    print 'Searching for CSV tables.'
+    updated = store.refresh(build_dir, application_name, locale_codes)
+    langs = []
+    for code, column in store.columns.iteritems():
+        lang_header = "%s (%s)" % (column.language, code)
+        langs.append(lang_header)
+        print '%s CSV found%s.' % (lang_header, ' (updated)' if code in updated else '')
 
+    missing_path = os.path.join(build_dir, 'missing_translations.' + fmt)
+    if not store.exported(outfile, missing_path):
+        print 'Combining tables for %s into a master table' % ', '.join(langs)
+        store.export_csv(outfile, missing_path)
+    store.save()
+    print 'Master table is ready at %s' % outfile
+    return store
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the master table of a build directory: the coverage of '
+                                                 'each locale, or the phrases missing a translation in a locale.')
+    parser.add_argument('build_dir', help='build directory of the application')
+    parser.add_argument('application_name', help='name of the application')
+    parser.add_argument('--missing', metavar='LOCALE_CODE', help='list the phrases missing a translation in a locale')
+    args = parser.parse_args()
 
+    path = store_path(args.build_dir, args.application_name)
+    if not os.path.isfile(path):
+        parser.exit(1, 'No master table of %s in %s\n' % (args.application_name, args.build_dir))
+    store = MasterTable(path)
+    if args.missing:
+        if args.missing not in store.columns:
+            parser.exit(1, 'No table of locale %s in the master table, its locales are: %s\n'
+                        % (args.missing, ', '.join(store.columns) or 'none'))
+        for phrase in store.missing(args.missing):
+            print phrase
+    else:
+        for code, (translated, total) in store.coverage().iteritems():
+            print '{}: {}/{} ({:.1%})'.format(code, translated, total, float(translated) / total if total else 1)
@@ -3,14 +3,20 @@ __author__ = 'clobo'
 from datetime import datetime
 import re
 import os
-import csv
 import sys
 import argparse
+import itertools
+
+from atomic import atomic_write
+from mofile import write_mo
+from pofile import unescape
+from catalog import Catalog, iter_csv
+from extsort import external_sort, unique
+from placeholders import PlaceholderValidator
 
-_re_python_str_placeholder = re.compile('%\d?\.?\d?[sbcdoxXneEfFgG]|{[A-z,0-9]*:?\d*[sbcdoxXneEfFgG]?}')
 _re_unescaped_quotes = re.compile(r'(?<!\\)\"')
 
-def csv_to_po(csv_path, po_path, sort=True, src_lang='python', transform=None):
+def csv_to_po(csv_path, po_path, sort=True, src_lang='python', transform=None, mo_path=None, memory_budget=None):
     """
     Convert a csv file into a po file.
 
@@ -20,75 +26,137 @@ def csv_to_po(csv_path, po_path, sort=True, src_lang='python', transform=None):
     :param src_lang: source language (used to check format strings are not altered for python)
     :param transform: function applied to csv translation before writing to po file
                       (used for right to left / reshaped languages such as Arabic, Farsi)
+    :param mo_path: if given, also compile the translations into a .mo file at this path
+    :param memory_budget: if given, the rows are sorted as they are read, holding about this many bytes in memory
+                          and spilling the rest to temporary files, instead of reading the whole table first
     :return:
     """
 
     if not csv_path.endswith('.csv'):
         raise ValueError('csv_path must be have extension .csv')
-    place_holder_errors = 0
-    po_path = os.path.splitext(po_path)[0] + '.po'
 
     try:
         language = re.match(".* - (.+)\.(csv)", csv_path).group(1)
-    except IndexError:
+    except (IndexError, AttributeError):
         language = 'LANGUAGE'
-    with open(po_path, 'w') as poFile:
+    if sort and memory_budget is not None:
+        rows = ((msgid, msgstr) for msgid, msgstr, comment in iter_csv(csv_path))
+        # Rows that share a msgid are next to each other once sorted, the first one is kept like Catalog.add does
+        rows = unique(external_sort(rows, memory_budget=memory_budget))
+        errors = []
+        if src_lang == 'python':
+            rows = _checked(rows, PlaceholderValidator(), language, errors)
+        write_po(rows, po_path, language=language, transform=transform, mo_path=mo_path)
+        _print_placeholder_errors(errors, language)
+        return True
+    catalog_to_po(Catalog.read_csv(csv_path), po_path, language=language, sort=sort, src_lang=src_lang,
+                  transform=transform, mo_path=mo_path)
+    return True
+
+
+def catalog_to_po(catalog, po_path, language='LANGUAGE', sort=True, src_lang='python', transform=None,
+                  mo_path=None, validator=None, locale=None):
+    """
+    Write a translation table held in memory to a po file.
+
+    :param catalog: Catalog of the translations
+    :param po_path: path to output po file
+    :param language: language written in the po header
+    :param sort: sort the strings alphabetically
+    :param src_lang: source language (used to check format strings are not altered for python)
+    :param transform: function applied to the translations before writing to po file
+                      (used for right to left / reshaped languages such as Arabic, Farsi)
+    :param mo_path: if given, also compile the translations into a .mo file at this path
+    :param validator: PlaceholderValidator used to check the placeholders of python translations. Sharing one
+                      between locales finds the placeholders of each phrase only once.
+    :param locale: locale the placeholder errors are reported under (defaults to language)
+    :return: list of PlaceholderError
+    """
+    po_items = itertools.izip(catalog.msgids, catalog.msgstrs)
+    if sort:
+        po_items = sorted(po_items, key=lambda x: x[0])
+    write_po(po_items, po_path, language=language, transform=transform, mo_path=mo_path)
+
+    errors = []
+    if src_lang == 'python':
+        # The translations are checked as written by the translator, before any transform
+        if validator is None:
+            validator = PlaceholderValidator()
+        errors = validator.check(locale or language, itertools.izip(catalog.msgids, catalog.msgstrs))
+        _print_placeholder_errors(errors, language)
+    return errors
+
+
+def write_po(po_items, po_path, language='LANGUAGE', transform=None, mo_path=None):
+    """
+    Write translations to a po file in the order they are given.
+
+    :param po_items: iterable of (msgid, msgstr) in their PO-escaped form
+    :param po_path: path to output po file
+    :param language: language written in the po header
+    :param transform: function applied to the translations before writing to po file
+    :param mo_path: if given, also compile the translations into a .mo file at this path
+    :return: path to the po file
+    """
+    po_path = os.path.splitext(po_path)[0] + '.po'
+
+    header = ('Project-Id-Version: PACKAGE VERSION\n'
+              'POT-Creation-Date: {dt}\n'
+              'PO-Revision-Date: YEAR-MO-DA HO:MI+ZONE\n'
+              'Last-Translator: FULL NAME <EMAIL@ADDRESS>\n'
+              'Language-Team: \n'
+              'Language: {lang}\n'
+              'MIME-Version: 1.0\n'
+              'Content-Type: text/plain; charset=UTF-8\n'
+              'Content-Transfer-Encoding: ENCODING\n'
+              'Generated-By: pygettext.py 1.5\n'.format(lang=language,
+                                                        dt=datetime.now().strftime('%d %B %Y, %I:%M %p')))
+    mo_messages = [] if mo_path else None
+    with atomic_write(po_path) as poFile:
         # Add header information.
-        poFile.write(''
-                     '# GENERATED .po FILE FROM translation_factory\n'
+        poFile.write('# GENERATED .po FILE FROM translation_factory\n'
                      '# https://github.com/lobocv/translation_factory\n'
                      '# Copyright (C) 2015 Calvin Lobo. All rights reserved\n'
                      '#\n'
                      'msgid ""\n'
-                     'msgstr ""\n'
-                     '"Project-Id-Version: PACKAGE VERSION\\n"\n'
-                     '"POT-Creation-Date: {dt}\\n"\n'
-                     '"PO-Revision-Date: YEAR-MO-DA HO:MI+ZONE\\n"\n'
-                     '"Last-Translator: FULL NAME <EMAIL@ADDRESS>\\n"\n'
-                     '"Language-Team: \\n"\n'
-                     '"Language: {lang}\\n"\n'
-                     '"MIME-Version: 1.0\\n"\n'
-                     '"Content-Type: text/plain; charset=UTF-8\\n"\n'
-                     '"Content-Transfer-Encoding: ENCODING\\n"\n'
-                     '"Generated-By: pygettext.py 1.5\\n"\n\n\n'.format(lang=language,
-                                                                        dt=datetime.now().strftime('%d %B %Y, %I:%M %p'))
-                     )
-
-        if csv_path.endswith('.csv'):
-            # Open the file writer and file reader
-            with open(csv_path, 'r') as csvFile:
-                csv_reader = csv.reader(csvFile)
-                headers = csv_reader.next()
-                if sort:
-                    po_items = sorted((row[:2] for row in csv_reader), key=lambda x: x[0])
-                else:
-                    po_items = csv_reader
-                # Write the information to the file.
-                for row in po_items:
-                    message, translation = row[:2]
-                    if src_lang == 'python':
-                        if translation:
-                            if transform:
-                                translation = transform(translation)
-                            mph = set(_re_python_str_placeholder.findall(message))
-                            tph = set(_re_python_str_placeholder.findall(translation))
-                            if len(mph.symmetric_difference(tph)) > 0:
-                                place_holder_errors += 1
-                                print 'Warning. Placeholders do not match in %s translation table!' % language
-                                print message + '\n' + translation
-                                print 'Errors: %s' % ','.join(tph.difference(mph)) + '\n'
-
-                    escaped_translation = re.sub(_re_unescaped_quotes, r'\"', translation)
-
-                    poFile.write('msgid "%s"\n' % message)
-                    poFile.write('msgstr "%s"\n\n' % escaped_translation)
-
-                if src_lang == 'python':
-                    print '%d Place holder errors were found.' % place_holder_errors
-        else:
-            return False
+                     'msgstr ""\n')
+        poFile.write(''.join('"%s\\n"\n' % line for line in header.splitlines()) + '\n\n')
+
+        # Write the information to the file.
+        for message, translation in po_items:
+            if translation and transform:
+                translation = transform(translation)
+
+            escaped_translation = re.sub(_re_unescaped_quotes, r'\"', translation)
+
+            poFile.write('msgid "%s"\n' % message)
+            poFile.write('msgstr "%s"\n\n' % escaped_translation)
+            if mo_messages is not None and translation:
+                mo_messages.append((unescape(message), unescape(escaped_translation)))
+
+
+    if mo_path:
+        write_mo(mo_messages, mo_path, header=header)
+    return po_path
+
+
+def _checked(po_items, validator, locale, errors):
+    """
+    Pass translations through, checking their placeholders as they go by.
+    """
+    for msgid, msgstr in po_items:
+        if msgstr:
+            errors.extend(validator.check(locale, ((msgid, msgstr), )))
+        yield msgid, msgstr
+
+
+def _print_placeholder_errors(errors, language):
+    for error in errors:
+        print 'Warning. Placeholders do not match in %s translation table!' % language
+        print error.msgid + '\n' + error.msgstr
+        print 'Missing: %s Extra: %s' % (','.join(error.missing), ','.join(error.extra)) + '\n'
+    print '%d Place holder errors were found.' % len(errors)
 
-    return True
 
 if __name__ == '__main__':
     # Describe what this script does, and the parameters that are entered.
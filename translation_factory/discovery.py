@@ -0,0 +1,170 @@
+__author__ = 'clobo'
+
+import os
+import re
+import logging
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # Backport of os.scandir for python 2
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# gitignore-style globs of directories that never hold sources to translate
+DEFAULT_EXCLUDE_GLOBS = ('.git/', '.hg/', '.svn/', '__pycache__/', 'node_modules/')
+
+
+class _Entry(object):
+    """
+    Directory entry with the parts of the os.scandir interface used here, for when scandir is not available.
+    """
+    __slots__ = ('name', 'path')
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+
+def _scandir(directory):
+    if scandir is not None:
+        return scandir(directory)
+    return [_Entry(directory, name) for name in os.listdir(directory)]
+
+
+def compile_patterns(patterns):
+    """
+    Combine regex patterns into a single regex that matches where any of them matches.
+    :param patterns: list of regex patterns
+    :return: compiled regex, None if there are no patterns
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, basestring):
+        patterns = (patterns, )
+    return re.compile('|'.join('(?:%s)' % p for p in patterns))
+
+
+def glob_to_regex(glob):
+    """
+    Translate a gitignore-style glob into a regex matched against paths relative to the searched directory
+    (with / separators). Directories are matched with a trailing /.
+
+    - * and ? match within a path component, ** matches across components and [...] matches a character class
+    - a glob ending with / only matches directories
+    - a glob starting with or containing a / is anchored to the searched directory, it otherwise matches at any depth
+    - negated (!) globs are not supported
+
+    :param glob: gitignore-style glob
+    :return: regex pattern
+    """
+    dir_only = glob.endswith('/')
+    glob = glob.rstrip('/')
+    anchored = '/' in glob
+    glob = glob.lstrip('/')
+    regex = []
+    ii = 0
+    while ii < len(glob):
+        c = glob[ii]
+        if glob.startswith('**/', ii):
+            regex.append('(?:.*/)?')
+            ii += 3
+            continue
+        elif glob.startswith('**', ii):
+            regex.append('.*')
+            ii += 2
+            continue
+        elif c == '*':
+            regex.append('[^/]*')
+        elif c == '?':
+            regex.append('[^/]')
+        elif c == '[' and glob.find(']', ii + 2) != -1:
+            end = glob.find(']', ii + 2)
+            chars = glob[ii + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            regex.append('[%s]' % chars.replace('\\', '\\\\'))
+            ii = end
+        else:
+            regex.append(re.escape(c))
+        ii += 1
+    return '%s%s%s' % ('' if anchored else '(?:.*/)?', ''.join(regex), '/' if dir_only else '(?:/|$)')
+
+
+def compile_globs(globs):
+    """
+    Combine gitignore-style globs into a single regex (see glob_to_regex).
+    :param globs: list of globs
+    :return: compiled regex, None if there are no globs
+    """
+    if not globs:
+        return None
+    if isinstance(globs, basestring):
+        globs = (globs, )
+    return compile_patterns([glob_to_regex(g) for g in globs])
+
+
+def iter_source_files(directories, include_patterns=None, exclude_patterns=None, exclude_globs=DEFAULT_EXCLUDE_GLOBS,
+                      recursive=None):
+    """
+    Generator of the source files that tags should be extracted from, in directory order (top down, sorted by name).
+
+    The patterns and globs are compiled once. Directories that match an exclude pattern (their path followed by a
+    separator) or an exclude glob are not descended into.
+
+    :param directories: Directory to iterate through (recursively) or list of directories (non recursive)
+    :param include_patterns: regex patterns of files to include, matched against the full path of the files
+    :param exclude_patterns: regex patterns of files and directories to exclude, matched against their full path
+    :param exclude_globs: gitignore-style globs of files and directories to exclude, matched against their path
+                          relative to the directory searched. Defaults to version control directories,
+                          __pycache__ and node_modules.
+    :param recursive: search sub-directories. Defaults to True for a single directory and False for a list.
+    :return: full paths of the matching files
+    """
+    if isinstance(directories, basestring):
+        directories = (directories, )
+        if recursive is None:
+            recursive = True
+    elif recursive is None:
+        recursive = False
+
+    include = compile_patterns(include_patterns)
+    exclude = compile_patterns(exclude_patterns)
+    ignore = compile_globs(exclude_globs)
+
+    for directory in directories:
+        # Depth first, the files of a directory come before the files of its sub-directories
+        stack = [(directory, '')]
+        while stack:
+            top, relative = stack.pop()
+            try:
+                entries = sorted(_scandir(top), key=lambda e: e.name)
+            except OSError as e:
+                logging.warning('Unable to list %s: %s' % (top, e))
+                continue
+            subdirs = []
+            for entry in entries:
+                fullpath = os.path.join(top, entry.name)
+                relpath = relative + entry.name
+                if entry.is_dir():
+                    # Symbolic links to directories are not followed, as with os.walk
+                    if recursive and not entry.is_symlink() \
+                            and not (ignore and ignore.match(relpath + '/')) \
+                            and not (exclude and exclude.match(fullpath + os.sep)):
+                        subdirs.append((fullpath, relpath + '/'))
+                    continue
+                if ignore and ignore.match(relpath):
+                    continue
+                if exclude and exclude.match(fullpath):
+                    continue
+                if include is None or include.match(fullpath):
+                    yield fullpath
+            stack.extend(reversed(subdirs))
@@ -0,0 +1,111 @@
+__author__ = 'clobo'
+
+import os
+import hashlib
+import logging
+import cPickle as pickle
+
+from atomic import atomic_write
+
+CACHE_VERSION = 2
+
+
+def _file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as _f:
+        for chunk in iter(lambda: _f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ExtractionCache(object):
+    """
+    Persistent cache of the tags extracted from each source file.
+
+    Entries are keyed by path and hold the file's mtime, size and content hash along with the
+    (msgctxt, msgid, msgid_plural, lineno) tuples found in it. A file is only re-scanned when its content changes.
+    """
+
+    def __init__(self, path, backend, src_lang):
+        self.path = path
+        self.key = (CACHE_VERSION, backend, src_lang)
+        self.entries = {}
+        self._digests = {}
+        self.modified = False
+        if os.path.isfile(path):
+            try:
+                with open(path, 'rb') as _f:
+                    key, entries = pickle.load(_f)
+                if key == self.key:
+                    self.entries = entries
+                else:
+                    logging.info('Extraction cache %s was built with different settings. Ignoring it.' % path)
+            except Exception as e:
+                logging.warning('Unable to load extraction cache %s: %s' % (path, e))
+
+    def stale_files(self, paths):
+        """
+        Find the files that are new or have changed since they were last scanned.
+        :param paths: list of source file paths
+        :return: list of paths that need to be scanned
+        """
+        stale = []
+        for path in paths:
+            st = os.stat(path)
+            entry = self.entries.get(path)
+            if entry is not None:
+                mtime, size, digest, found = entry
+                if (mtime, size) == (st.st_mtime, st.st_size):
+                    continue
+                new_digest = _file_hash(path)
+                if new_digest == digest:
+                    # Touched but not modified
+                    self.entries[path] = (st.st_mtime, st.st_size, digest, found)
+                    self.modified = True
+                    continue
+                self._digests[path] = new_digest
+            stale.append(path)
+        return stale
+
+    def update(self, scanned):
+        """
+        Store the results of scanning files.
+        :param scanned: iterable of (path, [(msgctxt, msgid, msgid_plural, lineno), ...])
+        """
+        for path, found in scanned:
+            st = os.stat(path)
+            digest = self._digests.pop(path, None) or _file_hash(path)
+            self.entries[path] = (st.st_mtime, st.st_size, digest, found)
+            self.modified = True
+
+    def prune(self, paths):
+        """
+        Drop the entries of files that are no longer part of the extraction.
+        :param paths: list of source file paths currently being extracted
+        :return: number of entries removed
+        """
+        keep = set(paths)
+        removed = [p for p in self.entries if p not in keep]
+        for p in removed:
+            del self.entries[p]
+            self.modified = True
+        return len(removed)
+
+    def scanned(self, paths):
+        """
+        Generator of the cached scan results in the order of paths.
+        :param paths: list of source file paths
+        :return: (path, [(msgctxt, msgid, msgid_plural, lineno), ...])
+        """
+        for path in paths:
+            yield path, self.entries[path][3]
+
+    def save(self):
+        """
+        Write the cache to disk if it was modified.
+        """
+        if not self.modified:
+            return
+        with atomic_write(self.path, 'wb') as _f:
+            pickle.dump((self.key, self.entries), _f, pickle.HIGHEST_PROTOCOL)
+        self.modified = False
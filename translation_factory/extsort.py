@@ -0,0 +1,85 @@
+__author__ = 'clobo'
+
+import heapq
+import marshal
+import tempfile
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+# Estimated bytes taken by a row besides the characters of its strings (tuple, string and sort key objects)
+ROW_OVERHEAD = 200
+# Runs are merged into one once this many have been written, to bound the number of open files
+MAX_RUNS = 64
+
+
+def _row_size(row):
+    return ROW_OVERHEAD + sum(len(s) for s in row if s)
+
+
+def _spill(items, tmp_dir):
+    """
+    Write a sorted run to a temporary file.
+    :return: the file, positioned at its start
+    """
+    _f = tempfile.TemporaryFile(dir=tmp_dir)
+    for item in items:
+        marshal.dump(item, _f)
+    _f.seek(0)
+    return _f
+
+
+def _read_run(_f):
+    try:
+        while True:
+            yield marshal.load(_f)
+    except EOFError:
+        pass
+    finally:
+        _f.close()
+
+
+def external_sort(rows, key=lambda row: row[0], memory_budget=DEFAULT_MEMORY_BUDGET, tmp_dir=None):
+    """
+    Sort rows of strings within a memory budget.
+
+    Rows are collected into runs of about memory_budget bytes that are sorted and written to temporary files, the
+    runs are then merged as the sorted rows are consumed. The sort is stable, the rows come out in the same order as
+    from sorted(rows, key=key).
+
+    :param rows: iterable of tuples of strings (or None)
+    :param key: function returning the sort key of a row
+    :param memory_budget: approximate number of bytes of rows held in memory
+    :param tmp_dir: directory of the temporary files (defaults to the system's)
+    :return: generator of the sorted rows
+    """
+    runs = []
+    run = []
+    size = 0
+    # The position of each row breaks ties between equal keys, which keeps the sort stable across runs
+    for n, row in enumerate(rows):
+        run.append((key(row), n, tuple(row)))
+        size += _row_size(row)
+        if size > memory_budget:
+            run.sort()
+            runs.append(_spill(run, tmp_dir))
+            run = []
+            size = 0
+            if len(runs) >= MAX_RUNS:
+                runs = [_spill(heapq.merge(*[_read_run(r) for r in runs]), tmp_dir)]
+    run.sort()
+    merged = heapq.merge(*([_read_run(r) for r in runs] + [run])) if runs else run
+    return (row for _, _, row in merged)
+
+
+def unique(rows, key=lambda row: row[0]):
+    """
+    Drop the rows that have the same key as the row before them, so that the first of sorted rows sharing a key is
+    kept.
+    :param rows: iterable of rows sorted by key
+    :return: generator of rows
+    """
+    last = object()
+    for row in rows:
+        k = key(row)
+        if k != last:
+            last = k
+            yield row
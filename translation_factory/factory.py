@@ -2,50 +2,43 @@ __author__ = 'clobo'
 
 import logging
 import os
-import shutil
 import glob
 import collections
 import csv
+import json
+import time
+import multiprocessing
 
-from functools import partial
+from datetime import datetime
 
-from tags import extract_tags, test_tag_quality
-from po_to_csv import po_to_csv
-from csv_to_po import csv_to_po
+from atomic import atomic_write, temporary_file, replace, makedirs, remove, FileLock
+from tags import extract_catalog
+from tag_rules import TagChecker, DEFAULT_RULES
+from discovery import DEFAULT_EXCLUDE_GLOBS
+from csv_to_po import catalog_to_po
+from catalog import Catalog
 from combine_tables import create_master_table
+from memory import TranslationMemory, TranslationPool, read_translations
+from placeholders import PlaceholderValidator, PlaceholderReport, PlaceholderError
+from instrument import Instrumentation
+from manifest import BuildManifest, signature
+from rtl import RTL_LOCALES, ReshapeCache, available as rtl_available
 
-try:
-    import arabic_reshaper
-    from bidi.algorithm import get_display
-
-    def ARABIC_TRANSFORM(text, locale):
-        t = text.decode('utf-8')
-        # Converts individual characters to their word respresentation
-        reshaped = arabic_reshaper.reshape(t)
-        # To prevent escaped quotes from being reversed, reverse them ahead of time so they get re-reversed
-        reshaped = reshaped.replace('\\"', '"\\')
-        reshaped = reshaped.replace("\\'", "'\\")
-        if locale == 'ar_AE':
-            # Reverse the string (Right to Left)
-            T = get_display(reshaped)
-        else:
-            T = reshaped
-        converted = T.encode('utf-8')
-        return converted
-
-except ImportError as e:
-    ARABIC_TRANSFORM_LIBRARY = None
+MO_COMPILERS = ('builtin', 'msgfmt')
 
 
 def build(directory, application_name, locale_codes, build_dir, include_patterns=None, exclude_patterns=None,
-          clean=True, src_lang='python', mo_name=None, sort_messages=True, **kwargs):
+          clean=True, src_lang='python', mo_name=None, sort_messages=True, extract_backend='xgettext',
+          extract_cache=True, workers=1, mo_compiler='builtin', translation_memory=True,
+          suggestion_threshold=0.8, fail_on_placeholder_errors=False, profile=False, incremental=True, template=None,
+          tag_rules=DEFAULT_RULES, exclude_globs=DEFAULT_EXCLUDE_GLOBS, translation_pool=None, validator=None,
+          suggestion_cache=None, **kwargs):
 
     """
-    1. Extract tags into .po
-    2. Convert .po to .csv
-    3. Merge with any existing .csv files that contain translations
-    4. Convert to .po
-    5. Compile .po
+    1. Extract tags into a translation table (kept in memory)
+    2. Merge with any existing .csv files that contain translations and write the .csv of each locale
+    3. Write the .po of each locale
+    4. Compile the .mo of each locale
 
     :param directory: Directory to recursively search for tags
     :param application_name: Name of the application being translated
@@ -53,49 +46,110 @@ def build(directory, application_name, locale_codes, build_dir, include_patterns
     :param build_dir: Directory to build to
     :param include_patterns: regex patterns of files to include in search for tags
     :param exclude_patterns: regex patterns of files to exclude in search for tags
-    :param clean: clean intermediate files
-    :return: Success or fail
+    :param exclude_globs: gitignore-style globs of files and directories to exclude in search for tags, relative to
+                          directory (version control directories, __pycache__ and node_modules by default)
+    :param clean: do not write the intermediate templates (messages.po and messages.csv) to the build directory
+    :param sort_messages: sort the strings alphabetically
+    :param extract_backend: tool used to extract tags, 'xgettext' or 'python' (in-process parser, python sources only)
+    :param extract_cache: keep a cache of the tags found in each source file in the build directory so that
+                          only modified files are scanned on the next build
+    :param workers: number of processes used to build the locales in parallel
+    :param mo_compiler: 'builtin' to compile .mo files in-process from the translation table or 'msgfmt'.
+                        Raises ValueError for any other value.
+    :param translation_memory: keep the translations of every table of the build directory in a translation
+                               memory (build_dir/translation_memory.db) and fill tables from it instead of
+                               merging every table into every locale
+    :param suggestion_threshold: minimum similarity (0 - 1) of a phrase in the translation memory for its
+                                 translation to be suggested in the comments of an untranslated phrase.
+                                 None disables suggestions.
+    :param fail_on_placeholder_errors: fail the locales that have translations whose placeholders differ from the
+                                       placeholders of their phrase. The errors of every locale are written to
+                                       build_dir/placeholder_errors.json either way.
+    :param profile: run each stage under cProfile and write the stats to build_dir/profiles/<stage>.prof
+                    (<locale code>.<stage>.prof for the stages of each locale)
+    :param incremental: skip the locales whose template, tables and settings did not change since they were last
+                        built, and the master table if no locale changed (see build_dir/build_manifest.json)
+    :param template: Catalog of the phrases of the application (the template of an earlier BuildResult) to build
+                     the locales from instead of extracting the tags again
+    :param tag_rules: tag quality rules the phrases are checked with as they are extracted, names of
+                      tag_rules.RULES and / or (name, regex, description). The phrases that break them are written to
+                      build_dir/tag_quality.json.
+    :param translation_pool: memory.TranslationPool of the tables of other applications (see build_applications).
+                             Phrases left untranslated are filled from it, and it replaces merging the other
+                             tables of the locale directories when translation_memory is off.
+    :param validator: PlaceholderValidator to check translations with, its cached placeholders are shared with the
+                      other builds it is given to
+    :param suggestion_cache: fuzzy.SuggestionCache that keeps the suggestions of the translation memory between
+                             builds (see watch.Watcher). It is only used by the locales built in this process.
+    :return: BuildResult with the outcome of each locale (evaluates to False if any locale failed),
+             False if the build was aborted
     """
 
+    if mo_compiler not in MO_COMPILERS:
+        raise ValueError('Unknown .mo compiler: %s' % mo_compiler)
     print 'Building translations for %s' % application_name
+    started = datetime.now()
+    start = time.time()
     if mo_name is None:
         mo_name = application_name
     if not os.path.isdir(build_dir):
         logging.info('Creating build directory: %s' % build_dir)
-        os.makedirs(build_dir)
+        makedirs(build_dir)
     else:
         logging.info('Build directory exists: %s' % build_dir)
         logging.info('Translation tables will be updated and merged whenever possible using existing tables')
 
-    # Search through the source code and find all the tags to put into a po file
-    po_template = os.path.join(build_dir, 'messages.po')
-    if os.path.isfile(po_template):
-        os.remove(po_template)
-    print 'Extracting tags.. this may take several minutes.'
-    po_template = extract_tags(directories=directory,
-                               pofile_path=os.path.join(build_dir, 'messages.po'),
-                               include_patterns=include_patterns,
-                               exclude_patterns=exclude_patterns,
-                               src_lang='python')
-    files_to_clean = [po_template]
-    if po_template is None:
-        logging.error('Translation build failed at extracting tags. Aborting.')
-        return False
-
-    # Go through the template and check for any redundancies in the tags
-    # This doesn't fix anything, just notifies you to manually change the tags.
-    try:
-        redundancy_warnings = test_tag_quality(po_template)
-    except Exception as e:
-        print 'Tag redundancy check failed. See log for details.'
-        logging.error(e)
+    # Time, CPU, memory and counters of each stage are written to build_dir/build_report.json
+    profile_dir = os.path.join(build_dir, 'profiles') if profile else None
+    instruments = Instrumentation(profile_dir)
+    if template is None:
+        # Search through the source code and find all the tags. The template is kept in memory and only written to
+        # messages.po / messages.csv when intermediate files are not cleaned.
+        po_template = os.path.join(build_dir, 'messages.po')
+        csv_template = os.path.join(build_dir, 'messages.csv')
+        for _f in (po_template, csv_template):
+            remove(_f)
+        print 'Extracting tags.. this may take several minutes.'
+        cache_path = None
+        if extract_cache:
+            recursive = isinstance(directory, basestring)
+            cache_path = _extraction_cache_path(build_dir, (
+                os.path.abspath(directory) if recursive else [os.path.abspath(d) for d in directory], recursive,
+                include_patterns or (), exclude_patterns or (), exclude_globs or (), src_lang, extract_backend))
+        # Go through the tags as they are extracted and check for any redundancies
+        # This doesn't fix anything, just notifies you to manually change the tags.
+        checker = TagChecker(tag_rules)
+        with instruments.stage('extract') as stage:
+            extract_stats = {}
+            template = extract_catalog(directories=directory,
+                                       include_patterns=include_patterns,
+                                       exclude_patterns=exclude_patterns,
+                                       exclude_globs=exclude_globs,
+                                       src_lang=src_lang,
+                                       backend=extract_backend,
+                                       cache_path=cache_path,
+                                       pofile_path=None if clean else po_template,
+                                       stats=extract_stats,
+                                       checker=checker)
+            for counter in ('files', 'files_scanned'):
+                if counter in extract_stats:
+                    stage.count(counter, extract_stats[counter])
+        if template is None:
+            logging.error('Translation build failed at extracting tags. Aborting.')
+            return False
+        stage.count('entries', len(template))
+        stage.count('tag_warnings', len(checker))
+        checker.report()
+        checker.write_json(os.path.join(build_dir, 'tag_quality.json'))
 
-    # Conver the po template into a csv for easier modification / comparison
-    csv_template = po_to_csv(po_template, os.path.join(build_dir, 'messages.csv'), sort=sort_messages)
-    files_to_clean.append(csv_template)
-    if csv_template is None:
-        logging.error('Translation build failed at converting to csv. Aborting.')
-        return False
+        if sort_messages:
+            template.sort()
+        if not clean:
+            template.write_csv(csv_template)
+    else:
+        print 'Using the template of the previous build.'
+        if sort_messages:
+            template.sort()
 
     # For each language we want to generate a translation for, create a copy of the po template,
     # then fill the template with any words that have already been translated in previous po files.
@@ -106,69 +160,505 @@ def build(directory, application_name, locale_codes, build_dir, include_patterns
     # in place. Once you do that, run this same script again and it will compile the added phrases into
     # the mo.
 
-    for locale, code in locale_codes:
+    # The placeholders of the phrases are found once and shared by every locale
+    if validator is None:
+        validator = PlaceholderValidator()
+    if src_lang == 'python':
+        with instruments.stage('placeholders') as stage:
+            validator.prime(template.msgids)
+            stage.count('entries', len(template))
+
+    memory_path = os.path.join(build_dir, 'translation_memory.db') if translation_memory else None
+    locale_options = dict(sort_messages=sort_messages,
+                          src_lang=src_lang,
+                          validator=validator,
+                          fail_on_placeholder_errors=fail_on_placeholder_errors,
+                          mo_compiler=mo_compiler,
+                          suggestion_threshold=suggestion_threshold,
+                          memory_path=memory_path,
+                          profile_dir=profile_dir)
+    # Locales whose inputs did not change since their last build are skipped
+    manifest = BuildManifest(os.path.join(build_dir, 'build_manifest.json')) if incremental else None
+    settings = signature(signature(template.msgids), application_name, mo_name, sort_messages, src_lang, mo_compiler,
+                         translation_memory, suggestion_threshold, fail_on_placeholder_errors, rtl_available())
+    # Locales filled from other applications depend on the translations of the pool for the phrases of the template
+    shared = {}
+    if translation_pool is not None:
+        for locale, code in locale_codes:
+            known = translation_pool.translations(code)
+            shared[code] = [(msgid, known[msgid]) for msgid in template.msgids if known.get(msgid)]
+    skipped = {}
+    to_build = []
+    with instruments.stage('manifest') as stage:
+        for locale, code in locale_codes:
+            if manifest is not None and manifest.is_fresh(_locale_target(application_name, code),
+                                                          _locale_inputs(manifest, build_dir, locale, code, settings,
+                                                                         shared.get(code), memory_path)):
+                skipped[code] = _skipped_locale(manifest, application_name, locale, code)
+            else:
+                to_build.append((locale, code))
+        stage.count('locales_skipped', len(skipped))
+    # Locales are built in parallel when there are several, otherwise the workers reshape right to left translations
+    locale_options['reshape_workers'] = 1 if workers > 1 and len(to_build) > 1 else workers
+    locale_options['suggestion_cache'] = None if workers > 1 and len(to_build) > 1 else suggestion_cache
+    options = dict((code, dict(locale_options, known_translations=translation_pool.translations(code))
+                    if translation_pool is not None else locale_options) for locale, code in to_build)
+
+    with instruments.stage('locales') as stage:
+        if workers > 1 and len(to_build) > 1:
+            pool = multiprocessing.Pool(min(workers, len(to_build)))
+            try:
+                pending = [pool.apply_async(build_locale, (application_name, locale, code, build_dir, template,
+                                                           mo_name), options[code])
+                           for locale, code in to_build]
+                built = [p.get() for p in pending]
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            built = [build_locale(application_name, locale, code, build_dir, template, mo_name, **options[code])
+                     for locale, code in to_build]
+        stage.count('locales', len(built))
+    built = dict((r.code, r) for r in built)
+    locale_results = [skipped.get(code) or built[code] for locale, code in locale_codes]
+
+    if manifest is not None:
+        for locale, code in to_build:
+            locale_result = built[code]
+            if locale_result.success:
+                manifest.record(_locale_target(application_name, code),
+                                _locale_inputs(manifest, build_dir, locale, code, settings, shared.get(code),
+                                               memory_path),
+                                _locale_outputs(build_dir, application_name, locale, code, mo_name),
+                                placeholder_errors=[e.as_dict() for e in locale_result.placeholder_errors])
+            else:
+                manifest.discard(_locale_target(application_name, code))
+
+    result = BuildResult(application_name)
+    result.template = template
+    for locale_result in locale_results:
+        result.locales[locale_result.code] = locale_result
+        result.placeholder_report.add(locale_result.code, locale_result.placeholder_errors)
+        if not locale_result.success:
+            logging.error('Translation build failed for locale {} - {}: {}'.format(locale_result.locale,
+                                                                                   locale_result.code,
+                                                                                   locale_result.error))
+
+    if src_lang == 'python':
+        print '%d placeholder errors found in %d locales, see %s' % (
+            len(result.placeholder_report), len(locale_codes),
+            result.placeholder_report.write_json(os.path.join(build_dir, 'placeholder_errors.json')))
+
+    master_inputs = master_outputs = None
+    if manifest is not None:
+        master_inputs = signature(application_name, locale_codes, [manifest.digest(
+            os.path.join(build_dir, code, "{} - {}.csv".format(application_name, locale)))
+            for locale, code in locale_codes])
+        master_outputs = [os.path.join(build_dir, 'all_translations.csv'),
+                          os.path.join(build_dir, 'missing_translations.csv')]
+    # all_translations.csv and missing_translations.csv are shared by the applications of the build directory, the
+    # master table is exported again when another application replaced them
+    master_target = '%s:master_table' % application_name
+    if master_inputs is not None and manifest.is_fresh(master_target, master_inputs):
+        print 'Master table is up to date.'
+    else:
+        print 'Creating master table.'
+        with instruments.stage('master_table'):
+            create_master_table(build_dir, application_name, locale_codes)
+        if manifest is not None:
+            manifest.record(master_target, master_inputs, master_outputs)
+    if manifest is not None:
+        manifest.save()
+
+    result.instruments = instruments
+    write_build_report(os.path.join(build_dir, 'build_report.json'), result, started, time.time() - start,
+                       workers=workers)
+    return result
+
+
+def build_applications(configs, **defaults):
+    """
+    Build several applications as one plan.
+
+    1. Extract the tags of each unique source directory once (directories shared by several applications are not
+       searched again), and put the template of each application together from the directories it uses
+    2. Read the existing tables of every application once into a TranslationPool
+    3. Build each application from its template, filling the phrases it has not translated from the translations
+       of the other applications
+
+    :param configs: list of dictionaries of the arguments of build for each application
+    :param defaults: arguments of build shared by every application, the configs take precedence
+    :return: list of the BuildResult of each application (False for an application whose build was aborted)
+    """
+    configs = [dict(defaults, **config) for config in configs]
+    for config in configs:
+        # Before any directory is extracted
+        if config.get('mo_compiler', 'builtin') not in MO_COMPILERS:
+            raise ValueError('Unknown .mo compiler: %s' % config['mo_compiler'])
+    print 'Building translations for %d applications' % len(configs)
+    instruments = Instrumentation()
+
+    # A source directory is extracted once for every set of extraction settings it is used with
+    units = collections.OrderedDict()
+    app_units = []
+    for config in configs:
+        makedirs(config['build_dir'])
+        directories = config['directory']
+        recursive = isinstance(directories, basestring)
+        keys = []
+        for directory in ([directories] if recursive else directories):
+            key = (os.path.abspath(directory), recursive,
+                   tuple(config.get('include_patterns') or ()), tuple(config.get('exclude_patterns') or ()),
+                   tuple(config.get('exclude_globs', DEFAULT_EXCLUDE_GLOBS) or ()),
+                   config.get('src_lang', 'python'), config.get('extract_backend', 'xgettext'))
+            unit = units.setdefault(key, {'build_dir': config['build_dir'], 'cache': False,
+                                          'rules': collections.OrderedDict()})
+            unit['cache'] = unit['cache'] or config.get('extract_cache', True)
+            for rule in config.get('tag_rules', DEFAULT_RULES):
+                unit['rules'].setdefault(rule if isinstance(rule, basestring) else rule[0], rule)
+            if key not in keys:
+                keys.append(key)
+        app_units.append(keys)
+
+    print 'Extracting tags of %d directories.. this may take several minutes.' % len(units)
+    with instruments.stage('extract') as stage:
+        for key, unit in units.iteritems():
+            directory, recursive, include_patterns, exclude_patterns, exclude_globs, src_lang, backend = key
+            # The phrases are checked against the rules of every application that uses the directory
+            unit['checker'] = TagChecker(unit['rules'].values())
+            cache_path = _extraction_cache_path(unit['build_dir'], key) if unit['cache'] else None
+            extract_stats = {}
+            unit['template'] = extract_catalog(directories=directory if recursive else [directory],
+                                               include_patterns=list(include_patterns) or None,
+                                               exclude_patterns=list(exclude_patterns) or None,
+                                               exclude_globs=exclude_globs,
+                                               src_lang=src_lang,
+                                               backend=backend,
+                                               cache_path=cache_path,
+                                               stats=extract_stats,
+                                               checker=unit['checker'])
+            for counter in ('files', 'files_scanned'):
+                if counter in extract_stats:
+                    stage.count(counter, extract_stats[counter])
+        stage.count('directories', len(units))
+
+    translation_pool = TranslationPool()
+    for config in configs:
+        for locale, code in config['locale_codes']:
+            translation_pool.add_tables(config['build_dir'], locale, code)
+
+    # The placeholders of the phrases shared by the applications are found once
+    validator = PlaceholderValidator()
+    results = []
+    for config, keys in zip(configs, app_units):
+        if any(units[key]['template'] is None for key in keys):
+            logging.error('Translation build of %s failed at extracting tags. Aborting.' % config['application_name'])
+            results.append(False)
+            continue
+        template = Catalog()
+        references = collections.OrderedDict()
+        for key in keys:
+            for msgid in units[key]['template'].msgids:
+                template.add(msgid)
+            for finding in units[key]['checker'].findings:
+                refs = references.setdefault(finding.text, [])
+                refs.extend(r for r in finding.references if r not in refs)
+        # The phrases that broke any rule are checked again against the rules of the application
+        checker = TagChecker(config.get('tag_rules', DEFAULT_RULES))
+        for text, refs in references.iteritems():
+            checker.check(text, refs)
+        print 'Template of %s: %d entries' % (config['application_name'], len(template))
+        checker.report()
+        checker.write_json(os.path.join(config['build_dir'], 'tag_quality.json'))
+        results.append(build(template=template, translation_pool=translation_pool, validator=validator, **config))
+
+    logging.info('Extracted the tags of %d applications from %d directories in %.2f seconds'
+                 % (len(configs), len(units), stage.wall))
+    return results
+
+
+def _extraction_cache_path(build_dir, key):
+    """
+    Path of the extraction cache of the source files of an extraction: (directory or list of directories, recursive,
+    include patterns, exclude patterns, exclude globs, src_lang, backend). Applications sharing a build directory
+    keep separate caches, which would otherwise prune each other's files.
+    """
+    return os.path.join(build_dir, 'extraction-%s.cache' % signature(*key)[:12])
+
+
+def _locale_target(application_name, code):
+    """
+    Name of the target of a locale of an application in the build manifest (applications share build directories).
+    """
+    return '%s:locale:%s' % (application_name, code)
+
+
+def _locale_inputs(manifest, build_dir, locale, code, settings, shared=None, memory_path=None):
+    """
+    Signature of the inputs of a locale: the template and settings of the build and the contents of the tables
+    of the locale directory (its own table and the tables merged into it), along with the (msgid, msgstr) of the
+    phrases of the template known to other applications and the tables imported into the translation memory from
+    outside the locale directory.
+    """
+    locale_dir = os.path.join(build_dir, code)
+    tables = sorted(glob.glob(os.path.join(locale_dir, '*' + locale + '.csv')))
+    inputs = [(os.path.basename(t), manifest.digest(t)) for t in tables]
+    parts = [settings, inputs]
+    if shared is not None:
+        parts.append(shared)
+    if memory_path is not None and os.path.isfile(memory_path):
+        memory = TranslationMemory(memory_path)
+        try:
+            parts.append(memory.imported_tables(code, exclude_dir=locale_dir))
+        finally:
+            memory.close()
+    return signature(*parts)
+
+
+def _locale_outputs(build_dir, application_name, locale, code, mo_name):
+    locale_dir = os.path.join(build_dir, code)
+    return [os.path.join(locale_dir, "{} - {}.csv".format(application_name, locale)),
+            os.path.join(locale_dir, "{} - {}.po".format(application_name, locale)),
+            os.path.join(locale_dir, 'LC_MESSAGES', mo_name + '.mo')]
+
+
+def _skipped_locale(manifest, application_name, locale, code):
+    """
+    LocaleResult of a locale that is up to date, with the placeholder errors found when it was built.
+    """
+    print 'Locale {} - {} is up to date.'.format(locale, code)
+    result = LocaleResult(locale, code)
+    result.skipped = True
+    result.placeholder_errors = [PlaceholderError(**dict((str(k), v) for k, v in e.iteritems()))
+                                 for e in manifest.get(_locale_target(application_name, code),
+                                                       'placeholder_errors', [])]
+    return result
+
+
+def write_build_report(report_path, result, started, wall, **settings):
+    """
+    Write the instrumentation of a build as JSON: the wall / CPU time, memory (kB, see instrument.Stage) and counters
+    of each stage of the build and of each locale, along with the totals of the locale stages over every locale.
+
+    :param report_path: path of the report
+    :param result: BuildResult
+    :param started: datetime the build started at
+    :param wall: duration of the build in seconds
+    :param settings: build settings included in the report
+    :return: report_path
+    """
+    locales = collections.OrderedDict()
+    totals = collections.OrderedDict()
+    for code, locale_result in result.locales.iteritems():
+        stages = locale_result.instruments.as_dict()
+        locales[code] = collections.OrderedDict((('locale', locale_result.locale),
+                                                 ('skipped', locale_result.skipped),
+                                                 ('success', locale_result.success),
+                                                 ('error', locale_result.error),
+                                                 ('stages', stages)))
+        for name, stage in stages.iteritems():
+            total = totals.setdefault(name, collections.OrderedDict())
+            for key, value in stage.iteritems():
+                if value is None:
+                    continue
+                # Peak memory is the largest of the locales, everything else adds up
+                total[key] = max(total.get(key, 0), value) if key in ('peak_rss_kb', 'process_peak_rss_kb') \
+                    else total.get(key, 0) + value
+
+    report = collections.OrderedDict((('application_name', result.application_name),
+                                      ('started', started.isoformat()),
+                                      ('wall', wall),
+                                      ('success', bool(result)),
+                                      ('settings', settings),
+                                      ('stages', result.instruments.as_dict()),
+                                      ('locale_totals', totals),
+                                      ('locales', locales)))
+    with atomic_write(report_path) as _f:
+        json.dump(report, _f, indent=2)
+    return report_path
+
+
+def build_locale(application_name, locale, code, build_dir, template, mo_name, sort_messages=True,
+                 mo_compiler='builtin', memory_path=None, suggestion_threshold=None, src_lang='python',
+                 validator=None, fail_on_placeholder_errors=False, profile_dir=None, reshape_workers=1,
+                 known_translations=None, suggestion_cache=None):
+    """
+    Create the translation table, po and mo file of a single locale.
+
+    :param application_name: Name of the application being translated
+    :param locale: language name of the locale
+    :param code: locale code
+    :param build_dir: Directory to build to
+    :param template: Catalog of the phrases of the application
+    :param mo_name: name of the mo file
+    :param sort_messages: sort the strings alphabetically
+    :param mo_compiler: 'builtin' or 'msgfmt'
+    :param memory_path: path to the translation memory. If None, the existing tables are merged into the csv.
+    :param suggestion_threshold: minimum similarity of the translation suggestions taken from the memory
+    :param src_lang: language of the source files, placeholders are checked for python
+    :param validator: PlaceholderValidator holding the placeholders of the phrases of the template
+    :param fail_on_placeholder_errors: fail the locale if any translation has placeholder errors
+    :param profile_dir: if given, each stage is run under cProfile and its stats are written to this directory
+    :param reshape_workers: number of processes the translations of right to left locales are reshaped in
+    :param known_translations: dictionary of {msgid: msgstr} the phrases left untranslated are filled from,
+                               instead of merging the other tables of the locale directory
+    :param suggestion_cache: fuzzy.SuggestionCache that keeps the suggestions of the memory between builds
+    :return: LocaleResult
+    """
+    result = LocaleResult(locale, code, Instrumentation(profile_dir, prefix=code))
+    try:
         logging.info('Creating translation for locale {} - {}'.format(locale, code))
         # Create a directory for the locale
         locale_dir = os.path.join(build_dir, code)
-        if not os.path.isdir(locale_dir):
-            os.makedirs(locale_dir)
-
-        # Copy the csv template for the application over if a csv does not already exist, otherwise use the existing csv
-        # but add any new entries that may require translating
-        locale_csv_path = os.path.join(locale_dir, "{} - {}.csv".format(application_name, locale))
-        if os.path.isfile(locale_csv_path):
-            # Rename the populated csv that already exists to a temporary file
-            os.rename(locale_csv_path, locale_csv_path + '.temp')
-            files_to_clean.append(locale_csv_path + '.temp')
-            # Copy the template (which may have more/newer entries than the existing populated csv)
-            shutil.copy2(csv_template, locale_csv_path)
-            # Merge the existing csv into the template to ensure the new entries are transferred
-            merge_csv(locale_csv_path + '.temp', locale_csv_path)
-        else:
-            shutil.copy2(csv_template, locale_csv_path)
-
-        # Merge existing / already known translations into the csv
-        print 'Atempting to merge existing tables..'
-        for existing_translations in glob.glob(os.path.join(locale_dir, '*' + locale + '.csv')):
-            if existing_translations == locale_csv_path:
-                continue
-            merges = merge_csv(existing_translations, locale_csv_path)
-            print "{} entries found in {}.".format(merges, existing_translations)
-
-        print 'Generating po file..'
-        po_name = application_name + ' - %s.po' % locale
-        locale_po_file = os.path.join(locale_dir, po_name)
-        if code in ('fa_IR', 'ar_AE'):
-            if ARABIC_TRANSFORM is None:
-                print 'Warning: Cannot import arabic-reshaper or python-bidi. These libraries are required ' \
-                      'in order to reshape arabic characters into their word representation and to ' \
-                      'reverse the strings (right to left language)'
-                csv_transform = None
-            else:
-                csv_transform = partial(ARABIC_TRANSFORM, locale=code)
-        else:
+        makedirs(locale_dir)
+
+        # Builds sharing the build directory build a locale one at a time, so that the tables of the locale are read
+        # and written back without losing the changes of another build
+        with FileLock(os.path.join(locale_dir, '.lock')):
+            # Copy the csv template for the application over if a csv does not already exist, otherwise use the
+            # existing csv but add any new entries that may require translating
+            locale_csv_path = os.path.join(locale_dir, "{} - {}.csv".format(application_name, locale))
+            with result.instruments.stage('merge') as stage:
+                # Phrases of the existing csv that are not filled from other applications
+                kept = {}
+                if memory_path is not None:
+                    # Bring the memory up to date with any table that changed or was removed since the last build,
+                    # then create the table from the template, keeping the existing csv as it is (including the
+                    # phrases it leaves untranslated) and filling the new phrases from the memory
+                    memory = TranslationMemory(memory_path)
+                    try:
+                        memory.prune()
+                        for table in glob.glob(os.path.join(locale_dir, '*' + locale + '.csv')):
+                            stage.count('translations_imported', memory.import_csv(table, code))
+                        existing = read_translations(locale_csv_path, untranslated=True) \
+                            if os.path.isfile(locale_csv_path) else None
+                        kept = existing or {}
+                        catalog, result.merges = memory.fill(template, code, existing=existing,
+                                                             existing_source=locale_csv_path,
+                                                             suggestion_threshold=suggestion_threshold,
+                                                             suggestion_cache=suggestion_cache)
+                    finally:
+                        memory.close()
+                    for source, merges in result.merges.iteritems():
+                        print "{} entries found in {}.".format(merges, source)
+                else:
+                    # Start from the template (which may have more/newer entries than the existing populated csv), the
+                    # translations of the existing csv take precedence over the other tables
+                    catalog = template.copy()
+                    sources = [t for t in glob.glob(os.path.join(locale_dir, '*' + locale + '.csv'))
+                               if t != locale_csv_path] if known_translations is None else []
+                    if os.path.isfile(locale_csv_path):
+                        sources.insert(0, locale_csv_path)
+                    # Merge existing / already known translations into the table
+                    print 'Atempting to merge existing tables..'
+                    result.merges = merge_into_catalog(catalog, sources, name=os.path.split(locale_csv_path)[1])
+                    for existing_translations, merges in result.merges.iteritems():
+                        print "{} entries found in {}.".format(merges, existing_translations)
+                    stage.count('tables', len(sources))
+                if known_translations:
+                    filled = 0
+                    for ii, msgid in enumerate(catalog.msgids):
+                        if not catalog.msgstrs[ii] and msgid not in kept and known_translations.get(msgid):
+                            catalog.msgstrs[ii] = known_translations[msgid]
+                            filled += 1
+                    result.merges['other applications'] = filled
+                    print "{} entries found in the tables of other applications.".format(filled)
+                stage.count('entries', len(catalog))
+                stage.count('merges', sum(result.merges.itervalues()))
+
+            with result.instruments.stage('write_csv'):
+                catalog.write_csv(locale_csv_path)
+
+            print 'Generating po file..'
+            po_name = application_name + ' - %s.po' % locale
+            locale_po_file = os.path.join(locale_dir, po_name)
             csv_transform = None
-        csv_to_po(locale_csv_path, locale_po_file, sort=sort_messages, transform=csv_transform)
+            if code in RTL_LOCALES:
+                if not rtl_available():
+                    print 'Warning: Cannot import arabic-reshaper or python-bidi. These libraries are required ' \
+                          'in order to reshape arabic characters into their word representation and to ' \
+                          'reverse the strings (right to left language)'
+                else:
+                    # Only the translations that changed since the last build are reshaped
+                    with result.instruments.stage('reshape') as stage:
+                        cache = ReshapeCache(os.path.join(locale_dir, 'reshape.cache'))
+                        reshaped = cache.reshape([t for t in catalog.msgstrs if t], code, workers=reshape_workers)
+                        cache.save()
+                        stage.count('translations', len(reshaped))
+                    csv_transform = reshaped.__getitem__
+            makedirs(os.path.join(locale_dir, 'LC_MESSAGES'))
+            mo_path = os.path.join(locale_dir, 'LC_MESSAGES', mo_name + '.mo')
+            with result.instruments.stage('po') as stage:
+                # The mo file is compiled from the same rows that are written to the po file
+                result.placeholder_errors = catalog_to_po(catalog, locale_po_file, language=locale, sort=sort_messages,
+                                                          src_lang=src_lang, transform=csv_transform,
+                                                          mo_path=mo_path if mo_compiler == 'builtin' else None,
+                                                          validator=validator, locale=code)
+                stage.count('entries', len(catalog))
+                stage.count('placeholder_errors', len(result.placeholder_errors))
+            if result.placeholder_errors and fail_on_placeholder_errors:
+                result.success = False
+                result.error = '%d placeholder errors' % len(result.placeholder_errors)
+            if mo_compiler != 'builtin':
+                print 'Compiling po file..'
+                with result.instruments.stage('msgfmt'):
+                    # The mo file is replaced once msgfmt has written it completely, and left as it is if it fails
+                    fd, tmp_path = temporary_file(mo_path)
+                    os.close(fd)
+                    try:
+                        ec = os.system("msgfmt -o '{0}' '{1}'".format(tmp_path, locale_po_file))
+                        if ec == 0:
+                            replace(tmp_path, mo_path)
+                    finally:
+                        remove(tmp_path)
+                if ec != 0:
+                    print 'Compiling failed. Please ensure msgfmt is installed.'
+                    result.success = False
+                    result.error = 'msgfmt exited with status %d' % ec
+    except Exception as e:
+        logging.exception(e)
+        result.success = False
+        result.error = '%s: %s' % (type(e).__name__, e)
+    return result
 
-        print 'Compiling po file..'
-        if not os.path.isdir(os.path.join(locale_dir, 'LC_MESSAGES')):
-            os.makedirs(os.path.join(locale_dir, 'LC_MESSAGES'))
-        ec = os.system("msgfmt -o '{0}/LC_MESSAGES/{1}.mo' '{0}/{2}'".format(locale_dir, mo_name, po_name))
-        if ec != 0:
-            print 'Compiling failed. Please ensure msgfmt is installed.'
 
-    print 'Creating master table.'
-    create_master_table(build_dir, application_name, locale_codes)
+class LocaleResult(object):
+    """
+    Outcome of building a single locale.
+    """
 
-    if clean:
-        print 'Cleaning files..'
-        for _f in files_to_clean:
-            try:
-                os.remove(_f)
-            except OSError as e:
-                logging.error(e)
+    def __init__(self, locale, code, instruments=None):
+        self.locale = locale
+        self.code = code
+        self.instruments = instruments or Instrumentation()
+        self.success = True
+        self.error = None
+        self.merges = {}
+        self.placeholder_errors = []
+        self.skipped = False
 
-    return True
+    def __repr__(self):
+        return 'LocaleResult(%s, %s)' % (self.code, 'OK' if self.success else self.error)
+
+
+class BuildResult(object):
+    """
+    Outcome of a build. Evaluates to True only if every locale was built successfully.
+    """
+
+    def __init__(self, application_name):
+        self.application_name = application_name
+        self.locales = collections.OrderedDict()
+        self.placeholder_report = PlaceholderReport()
+        self.instruments = Instrumentation()
+        self.template = None
+
+    @property
+    def failed(self):
+        return [r for r in self.locales.itervalues() if not r.success]
+
+    def __nonzero__(self):
+        return not self.failed
 
 
 def merge_csv(from_file, into_file, prompt_conflicts=False):
@@ -180,48 +670,83 @@ def merge_csv(from_file, into_file, prompt_conflicts=False):
 
     :return: Number of successful merge entries.
     """
-    cells = collections.OrderedDict({})
-    merge_entries = 0
-    into_filename = os.path.split(into_file)[1]
-    with open(into_file, 'r') as f1:
-        f1_reader = csv.reader(f1)
-        header1 = f1_reader.next()
-        for line1 in f1_reader:
-            phrase, translation = line1[:2]
-            cells[phrase] = translation
-
-    from_filename = os.path.split(from_file)[1]
-    with open(from_file, 'r') as f2:
-        header2 = f2.readline()
-        csv_reader = csv.reader(f2)
-        for line2 in csv_reader:
-            phrase, translation = line2[:2]
-            if translation and phrase in cells:
-                if cells[phrase] == '':
-                    merge_entries += 1
-                    cells[phrase] = translation
-                elif prompt_conflicts and cells[phrase] != translation:
+    return merge_tables([from_file], into_file, prompt_conflicts=prompt_conflicts)[from_file]
+
+
+def merge_tables(sources, into_file, precedence='first', prompt_conflicts=False):
+    """
+    Merge translations from several existing csv tables into into_file, writing into_file once.
+
+    :param sources: list of files to look for existing translations, in order of precedence
+    :param into_file: File to update with existing translations. Its own translations are never replaced unless
+                      prompt_conflicts is set.
+    :param precedence: 'first' to keep the translation of the first source that has one, 'last' to let later
+                       sources replace translations merged from earlier sources
+    :param prompt_conflicts: ask on the command line whether differing translations should replace the
+                             existing ones of into_file
+    :return: OrderedDict of {source: number of successful merge entries}
+    """
+    catalog = Catalog.read_csv(into_file)
+    merges = merge_into_catalog(catalog, sources, precedence=precedence, prompt_conflicts=prompt_conflicts,
+                                name=os.path.split(into_file)[1])
+    catalog.write_csv(into_file)
+    return merges
+
+
+def merge_into_catalog(catalog, sources, precedence='first', prompt_conflicts=False, name='table'):
+    """
+    Merge translations from several existing csv tables into a translation table held in memory.
+
+    :param catalog: Catalog to update with existing translations. Its own translations are never replaced unless
+                    prompt_conflicts is set.
+    :param sources: list of files to look for existing translations, in order of precedence
+    :param precedence: 'first' to keep the translation of the first source that has one, 'last' to let later
+                       sources replace translations merged from earlier sources
+    :param prompt_conflicts: ask on the command line whether differing translations should replace the
+                             existing ones of the catalog
+    :param name: name of the catalog shown when prompting for conflicts
+    :return: OrderedDict of {source: number of successful merge entries}
+    """
+    if precedence not in ('first', 'last'):
+        raise ValueError('Unknown merge precedence: %s' % precedence)
+    merged_from = {}
+    merges = collections.OrderedDict((source, 0) for source in sources)
+    index, cells = catalog.index, catalog.msgstrs
+
+    for from_file in sources:
+        from_filename = os.path.split(from_file)[1]
+        with open(from_file, 'r') as f2:
+            header2 = f2.readline()
+            csv_reader = csv.reader(f2)
+            for line2 in csv_reader:
+                phrase, translation = line2[:2]
+                ii = index.get(phrase)
+                if not translation or ii is None or cells[ii] == translation:
+                    continue
+                if cells[ii] == '':
+                    replace = True
+                elif phrase in merged_from:
+                    # The current translation came from an earlier source
+                    replace = precedence == 'last'
+                elif prompt_conflicts:
                     replace = raw_input('\nThe following has mutliple differing translations phrase:\n'
                                         'Phrase: "{phrase}"\n'
                                         '{app1}: "{app1_trans}"\n'
                                         '{app2}: "{app2_trans}"\n\n'
                                         'Do you want to replace {app1} translation with {app2} (y/n)'.format(phrase=phrase,
-                                                                        app1=into_filename,
-                                                                        app1_trans=cells[phrase],
+                                                                        app1=name,
+                                                                        app1_trans=cells[ii],
                                                                         app2=from_filename,
                                                                         app2_trans=translation
                                                                         )
-                                        )
-                    if replace == 'y':
-                        merge_entries += 1
-                        cells[phrase] = translation
-
-    with open(into_file, 'w') as f1:
-        csv_writer = csv.writer(f1)
-        csv_writer.writerow(header1)
-        row = [''] * len(header1)
-        for phrase, trans in cells.iteritems():
-            row[0], row[1] = phrase, trans
-            csv_writer.writerow(row)
-
-    return merge_entries
\ No newline at end of file
+                                        ) == 'y'
+                else:
+                    replace = False
+                if replace:
+                    if phrase in merged_from:
+                        merges[merged_from[phrase]] -= 1
+                    merges[from_file] += 1
+                    merged_from[phrase] = from_file
+                    cells[ii] = translation
+
+    return merges
@@ -0,0 +1,158 @@
+__author__ = 'clobo'
+
+import re
+import math
+import array
+
+_re_whitespace = re.compile(r'\s+')
+
+
+def normalize(phrase):
+    """
+    Normalize a phrase for fuzzy matching: case, surrounding whitespace, escaped new lines and trailing
+    colons / periods are ignored.
+    """
+    phrase = phrase.replace('\\n', ' ').lower()
+    phrase = _re_whitespace.sub(' ', phrase).strip().rstrip(':.').strip()
+    return phrase
+
+
+def trigrams(phrase):
+    """
+    Set of the character trigrams of a normalized phrase, padded so that short phrases still have grams.
+    """
+    padded = '  %s ' % phrase
+    return set(padded[ii: ii + 3] for ii in xrange(len(padded) - 2))
+
+
+class FuzzyIndex(object):
+    """
+    Inverted trigram index of translated phrases used to suggest translations for similar phrases.
+
+    Similarity is the Dice coefficient of the trigram sets of the normalized phrases. Candidates are found
+    by prefix filtering: a phrase can only reach the threshold if it shares one of the query's rarest trigrams,
+    so only the (short) posting lists of those trigrams are visited rather than comparing against every phrase.
+    """
+
+    def __init__(self, translations, threshold=0.8):
+        """
+        :param translations: iterable of (msgid, msgstr)
+        :param threshold: minimum similarity (0 - 1) of a suggestion
+        """
+        self.threshold = threshold
+        self.phrases = []
+        self.translations = []
+        self.grams = {}
+        self.postings = []
+        # Gram ids of every phrase, concatenated. The grams of phrase i are phrase_grams[offsets[i]:offsets[i + 1]]
+        self.phrase_grams = array.array('I')
+        self.offsets = array.array('I', [0])
+        for msgid, msgstr in translations:
+            grams = trigrams(normalize(msgid))
+            if not grams:
+                continue
+            phrase_id = len(self.phrases)
+            self.phrases.append(msgid)
+            self.translations.append(msgstr)
+            for gram in grams:
+                gram_id = self.grams.get(gram)
+                if gram_id is None:
+                    gram_id = self.grams[gram] = len(self.postings)
+                    self.postings.append(array.array('I'))
+                self.postings[gram_id].append(phrase_id)
+                self.phrase_grams.append(gram_id)
+            self.offsets.append(len(self.phrase_grams))
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def suggest(self, phrase, limit=1):
+        """
+        Find the translated phrases most similar to a phrase.
+
+        :param phrase: phrase to find suggestions for
+        :param limit: maximum number of suggestions
+        :return: list of (similarity, msgid, msgstr) sorted by decreasing similarity (then by msgid and msgstr)
+        """
+        grams = trigrams(normalize(phrase))
+        size = len(grams)
+        if not size:
+            return []
+        t = self.threshold
+        min_overlap = int(math.ceil(t * size / (2 - t)))
+        min_size, max_size = size * t / (2 - t), size * (2 - t) / t
+
+        # Grams that are not in the index count towards the size of the phrase but can not be shared
+        gram_ids = [self.grams[g] for g in grams if g in self.grams]
+        if len(gram_ids) < min_overlap:
+            return []
+        # Visit the posting lists of the rarest grams only, any phrase sharing none of them can not be similar enough
+        gram_ids.sort(key=lambda g: len(self.postings[g]))
+        candidates = set()
+        for gram_id in gram_ids[:len(gram_ids) - min_overlap + 1]:
+            candidates.update(self.postings[gram_id])
+
+        query = set(gram_ids)
+        offsets = self.offsets
+        suggestions = []
+        for phrase_id in candidates:
+            start, end = offsets[phrase_id], offsets[phrase_id + 1]
+            other_size = end - start
+            if other_size < min_size or other_size > max_size:
+                continue
+            similarity = 2.0 * len(query.intersection(self.phrase_grams[start:end])) / (size + other_size)
+            if similarity >= t:
+                suggestions.append((similarity, self.phrases[phrase_id], self.translations[phrase_id]))
+        suggestions.sort(key=_rank)
+        return suggestions[:limit]
+
+
+def _rank(suggestion):
+    similarity, msgid, msgstr = suggestion
+    return -similarity, msgid, msgstr
+
+
+class SuggestionCache(object):
+    """
+    Suggestions of the phrases of each locale kept between builds (see watch.Watcher). When the translations they
+    are taken from change, the phrases are only compared with the added translations, unless their suggestion was
+    removed or most of the translations changed.
+    """
+
+    def __init__(self):
+        self._locales = {}
+
+    def suggest(self, locale, translations, phrases, threshold=0.8):
+        """
+        Find the most similar translated phrase of each phrase.
+
+        :param locale: locale code of the translations
+        :param translations: list of (msgid, msgstr) the suggestions are taken from
+        :param phrases: phrases to find suggestions for
+        :param threshold: minimum similarity (0 - 1) of a suggestion
+        :return: dictionary of {phrase: (similarity, msgid, msgstr)} of the phrases that have a suggestion
+        """
+        known, cached = self._locales.get((locale, threshold), (frozenset(), {}))
+        current = frozenset(translations)
+        added, removed = current - known, known - current
+        if len(added) + len(removed) > len(current) // 2:
+            cached = {}
+        index = added_index = None
+        found = {}
+        for phrase in phrases:
+            if phrase in cached and (cached[phrase] is None or cached[phrase][1:] not in removed):
+                best = cached[phrase]
+                if added:
+                    if added_index is None:
+                        added_index = FuzzyIndex([t for t in translations if t in added], threshold=threshold)
+                    suggestions = added_index.suggest(phrase)
+                    if suggestions and (best is None or _rank(suggestions[0]) < _rank(best)):
+                        best = suggestions[0]
+            else:
+                if index is None:
+                    index = FuzzyIndex(translations, threshold=threshold)
+                suggestions = index.suggest(phrase)
+                best = suggestions[0] if suggestions else None
+            found[phrase] = best
+        self._locales[(locale, threshold)] = current, found
+        return dict((phrase, best) for phrase, best in found.iteritems() if best is not None)
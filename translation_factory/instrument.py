@@ -0,0 +1,201 @@
+__author__ = 'clobo'
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import collections
+
+from atomic import makedirs
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+try:
+    _page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+except (AttributeError, ValueError, OSError):
+    _page_kb = None
+
+# Seconds between the samples of the memory of a stage
+RSS_INTERVAL = 0.01
+
+# Stages of each thread whose profiler is running, innermost last. Only one profiler can be enabled in a thread at a
+# time, so a stage run inside a profiled stage pauses the profiler of the outer stage until it ends.
+_profiled = threading.local()
+
+
+def current_rss():
+    """
+    :return: resident set size of this process in kB, None if it can not be measured (/proc is only on Linux)
+    """
+    if _page_kb is None:
+        return None
+    try:
+        with open('/proc/self/statm') as _f:
+            return int(_f.read().split()[1]) * _page_kb
+    except (IOError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """
+    :return: peak resident set size of this process so far (since it started, not since a stage started) in kB,
+             None if it can not be measured
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X and in kB everywhere else
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def cpu_time():
+    """
+    :return: user + system CPU time of this process in seconds
+    """
+    t = os.times()
+    return t[0] + t[1]
+
+
+class _RSSSampler(threading.Thread):
+    """
+    Samples the resident set size of the process while a stage runs to find its peak.
+    """
+
+    def __init__(self, interval=RSS_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.peak = current_rss()
+        self._done = threading.Event()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss > self.peak:
+            self.peak = rss
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self._sample()
+
+    def stop(self):
+        """
+        :return: peak resident set size in kB
+        """
+        self._done.set()
+        self.join()
+        self._sample()
+        return self.peak
+
+
+class Stage(object):
+    """
+    Wall time, CPU time, memory and counters of a stage of the build. Used as a context manager around the stage.
+
+    peak_rss is the largest resident set size of the process sampled while the stage ran (None where it can not be
+    sampled), process_peak_rss the peak of the process since it started, which includes the earlier stages. Memory
+    of the stages run in other processes (the locales built in parallel) is reported by their own stages.
+
+    The profile of a stage includes the profiles of the stages run inside it.
+    """
+
+    def __init__(self, name, profile_path=None):
+        self.name = name
+        self.profile_path = profile_path
+        self.wall = None
+        self.cpu = None
+        self.peak_rss = None
+        self.process_peak_rss = None
+        self.counters = collections.OrderedDict()
+        self._start = None
+        self._profiler = None
+        self._inner_profiles = []
+        self._sampler = None
+
+    def __enter__(self):
+        if self.profile_path is not None:
+            stack = _profiled.__dict__.setdefault('stages', [])
+            if stack:
+                stack[-1]._profiler.disable()
+            stack.append(self)
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if current_rss() is not None:
+            self._sampler = _RSSSampler()
+            self._sampler.start()
+        self._start = time.time(), cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        wall, cpu = self._start
+        self.wall = time.time() - wall
+        self.cpu = cpu_time() - cpu
+        if self._sampler is not None:
+            self.peak_rss = self._sampler.stop()
+            self._sampler = None
+        self.process_peak_rss = peak_rss()
+        if self._profiler is not None:
+            self._profiler.disable()
+            stats = pstats.Stats(self._profiler)
+            for profile in self._inner_profiles:
+                stats.add(profile)
+            stats.dump_stats(self.profile_path)
+            stack = _profiled.stages
+            stack.pop()
+            if stack:
+                # The outer stage takes the stats of this one and carries on profiling
+                stack[-1]._inner_profiles.append(stats)
+                stack[-1]._profiler.enable()
+            self._profiler = None
+            self._inner_profiles = []
+        return False
+
+    def count(self, counter, n=1):
+        """
+        Add n to a counter of the stage.
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def as_dict(self):
+        d = collections.OrderedDict((('wall', self.wall), ('cpu', self.cpu), ('peak_rss_kb', self.peak_rss),
+                                     ('process_peak_rss_kb', self.process_peak_rss)))
+        d.update(self.counters)
+        return d
+
+
+class Instrumentation(object):
+    """
+    Stages of a build (or of a single locale) in the order they ran.
+    """
+
+    def __init__(self, profile_dir=None, prefix=None):
+        """
+        :param profile_dir: if given, each stage is run under cProfile and its stats are written to
+                            profile_dir/[prefix.]stage.prof
+        :param prefix: prefix of the profile file names, ie. the locale code
+        """
+        self.profile_dir = profile_dir
+        self.prefix = prefix
+        self.stages = collections.OrderedDict()
+
+    def stage(self, name):
+        """
+        Create the Stage to run a stage of the build in.
+        :param name: name of the stage
+        :return: Stage
+        """
+        profile_path = None
+        if self.profile_dir is not None:
+            makedirs(self.profile_dir)
+            filename = '%s.%s.prof' % (self.prefix, name) if self.prefix else '%s.prof' % name
+            profile_path = os.path.join(self.profile_dir, filename)
+        stage = self.stages[name] = Stage(name, profile_path)
+        return stage
+
+    def as_dict(self):
+        return collections.OrderedDict((name, stage.as_dict()) for name, stage in self.stages.iteritems())
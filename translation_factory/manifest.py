@@ -0,0 +1,134 @@
+__author__ = 'clobo'
+
+import os
+import json
+import hashlib
+import logging
+
+from atomic import atomic_write, FileLock
+
+MANIFEST_VERSION = 2
+
+
+def file_digest(path):
+    """
+    :return: sha1 hex digest of the contents of a file
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as _f:
+        for chunk in iter(lambda: _f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def signature(*parts):
+    """
+    :return: sha1 hex digest of JSON serializable values
+    """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+
+class BuildManifest(object):
+    """
+    Record of the inputs and outputs of the targets of a build (each locale and the master table).
+
+    A target is up to date when the signature of its inputs is the one recorded when it was last built and none
+    of its outputs were modified or removed since. File contents are only hashed again when their mtime or size
+    changed. Only the targets recorded or discarded by a build are saved, over the manifest as it is on disk, so that
+    builds sharing the build directory keep each other's records.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files, self.targets = self._read()
+        self.modified = False
+        self._changed = {}
+
+    def _read(self):
+        """
+        :return: (files, targets) of the manifest on disk
+        """
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r') as _f:
+                    data = json.load(_f)
+                if data.get('version') == MANIFEST_VERSION:
+                    return data['files'], data['targets']
+            except (ValueError, KeyError) as e:
+                logging.warning('Unable to load build manifest %s: %s' % (self.path, e))
+        return {}, {}
+
+    def digest(self, path):
+        """
+        Content hash of a file.
+        :param path: path to the file
+        :return: sha1 hex digest, None if the file does not exist
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = self.files.get(path)
+        if entry is not None and entry[:2] == [st.st_mtime, st.st_size]:
+            return entry[2]
+        digest = file_digest(path)
+        self.files[path] = [st.st_mtime, st.st_size, digest]
+        self.modified = True
+        return digest
+
+    def is_fresh(self, target, inputs):
+        """
+        :param target: name of the target
+        :param inputs: signature of the inputs of the target
+        :return: True if the target was built from the same inputs and its outputs are intact
+        """
+        entry = self.targets.get(target)
+        if entry is None or entry['inputs'] != inputs:
+            return False
+        return all(self.digest(path) == digest for path, digest in entry['outputs'].iteritems())
+
+    def get(self, target, key, default=None):
+        """
+        :return: a value recorded along with a target
+        """
+        return self.targets.get(target, {}).get(key, default)
+
+    def record(self, target, inputs, outputs, **extra):
+        """
+        Record that a target was built.
+        :param target: name of the target
+        :param inputs: signature of the inputs of the target
+        :param outputs: paths of the files the target produced
+        :param extra: JSON serializable values kept along with the target
+        """
+        entry = dict(extra, inputs=inputs, outputs=dict((path, self.digest(path)) for path in outputs))
+        self.targets[target] = self._changed[target] = entry
+        self.modified = True
+
+    def discard(self, target):
+        """
+        Forget a target so that it is built again.
+        """
+        self.targets.pop(target, None)
+        self._changed[target] = None
+        self.modified = True
+
+    def save(self):
+        """
+        Write the manifest if it was modified.
+        """
+        if not self.modified:
+            return
+        with FileLock(self.path + '.lock'):
+            files, targets = self._read()
+            files.update(self.files)
+            for target, entry in self._changed.iteritems():
+                if entry is None:
+                    targets.pop(target, None)
+                else:
+                    targets[target] = entry
+            with atomic_write(self.path) as _f:
+                json.dump({'version': MANIFEST_VERSION, 'files': files, 'targets': targets}, _f)
+        self.files, self.targets = files, targets
+        self.modified = False
+        self._changed = {}
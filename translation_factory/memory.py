@@ -0,0 +1,279 @@
+__author__ = 'clobo'
+
+import os
+import csv
+import glob
+import sqlite3
+import argparse
+import logging
+import collections
+
+from fuzzy import FuzzyIndex
+from catalog import Catalog
+
+
+class TranslationMemory(object):
+    """
+    Persistent store of known translations indexed by (locale, msgid).
+
+    Translated tables are ingested once and skipped afterwards until they change, so building a locale
+    only costs indexed lookups for the phrases of the template instead of re-merging every table.
+    """
+    # Number of msgids per lookup query, kept below SQLite's limit on host parameters
+    LOOKUP_BATCH = 500
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.text_factory = str
+        with self.db:
+            if self.db.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+                # The memory is rebuilt from the tables when its layout changes
+                self.db.execute('DROP TABLE IF EXISTS translations')
+                self.db.execute('DROP TABLE IF EXISTS tables')
+                self.db.execute('PRAGMA user_version = %d' % self.SCHEMA_VERSION)
+            # Each table keeps its own rows, so that they can be replaced when it changes
+            self.db.execute('CREATE TABLE IF NOT EXISTS translations ('
+                            'locale TEXT NOT NULL, '
+                            'msgid TEXT NOT NULL, '
+                            'msgstr TEXT NOT NULL, '
+                            'source TEXT NOT NULL, '
+                            'PRIMARY KEY (locale, msgid, source))')
+            self.db.execute('CREATE TABLE IF NOT EXISTS tables ('
+                            'path TEXT PRIMARY KEY, '
+                            'locale TEXT NOT NULL, '
+                            'mtime REAL NOT NULL, '
+                            'size INTEGER NOT NULL)')
+
+    def close(self):
+        self.db.close()
+
+    def import_csv(self, csv_path, locale, force=False):
+        """
+        Add the translations of a translated table to the memory, replacing the ones it was last imported with (so
+        that translations removed from the table are removed from the memory). Translations of the last imported
+        table take precedence over the other tables. Tables that have not changed since they were last imported are
+        skipped.
+
+        :param csv_path: path to the translated csv file
+        :param locale: locale code of the translations
+        :param force: import the table even if it has not changed
+        :return: number of translations imported
+        """
+        st = os.stat(csv_path)
+        source = os.path.abspath(csv_path)
+        if not force:
+            row = self.db.execute('SELECT mtime, size FROM tables WHERE path = ? AND locale = ?',
+                                  (source, locale)).fetchone()
+            if row is not None and tuple(row) == (st.st_mtime, st.st_size):
+                return 0
+
+        with open(csv_path, 'r') as _csv:
+            csv_reader = csv.reader(_csv)
+            header = next(csv_reader, None)
+            rows = [(locale, row[0], row[1], source) for row in csv_reader if len(row) > 1 and row[0] and row[1]]
+
+        with self.db:
+            self.db.execute('DELETE FROM translations WHERE locale = ? AND source = ?', (locale, source))
+            self.db.executemany('INSERT OR REPLACE INTO translations (locale, msgid, msgstr, source) '
+                                'VALUES (?, ?, ?, ?)', rows)
+            self.db.execute('INSERT OR REPLACE INTO tables (path, locale, mtime, size) VALUES (?, ?, ?, ?)',
+                            (source, locale, st.st_mtime, st.st_size))
+        logging.info('Imported %d translations from %s' % (len(rows), csv_path))
+        return len(rows)
+
+    def prune(self):
+        """
+        Remove the translations of the tables that do not exist anymore.
+        :return: number of tables removed
+        """
+        removed = [(path, locale) for path, locale in self.db.execute('SELECT path, locale FROM tables')
+                   if not os.path.isfile(path)]
+        with self.db:
+            for path, locale in removed:
+                self.db.execute('DELETE FROM translations WHERE locale = ? AND source = ?', (locale, path))
+                self.db.execute('DELETE FROM tables WHERE path = ? AND locale = ?', (path, locale))
+        for path, locale in removed:
+            logging.info('Removed the translations of %s from the memory' % path)
+        return len(removed)
+
+    def imported_tables(self, locale, exclude_dir=None):
+        """
+        Tables the translations of a locale were imported from (that still exist).
+
+        :param locale: locale code
+        :param exclude_dir: leave out the tables of this directory
+        :return: sorted list of [path, mtime, size] of the tables as they were when imported
+        """
+        exclude_dir = os.path.join(os.path.abspath(exclude_dir), '') if exclude_dir is not None else None
+        return sorted([path, mtime, size] for path, mtime, size in
+                      self.db.execute('SELECT path, mtime, size FROM tables WHERE locale = ?', (locale,))
+                      if not (exclude_dir and path.startswith(exclude_dir)) and os.path.isfile(path))
+
+    def lookup(self, locale, msgids):
+        """
+        Find the known translations of a list of phrases.
+
+        :param locale: locale code
+        :param msgids: iterable of phrases
+        :return: dictionary of {msgid: (msgstr, source table)} for the phrases that have a translation
+        """
+        found = {}
+        msgids = list(msgids)
+        for ii in xrange(0, len(msgids), self.LOOKUP_BATCH):
+            batch = msgids[ii: ii + self.LOOKUP_BATCH]
+            # The rows of the last imported table come last
+            query = ('SELECT msgid, msgstr, source FROM translations WHERE locale = ? AND msgid IN (%s) '
+                     'ORDER BY rowid' % ','.join('?' * len(batch)))
+            for msgid, msgstr, source in self.db.execute(query, [locale] + batch):
+                found[msgid] = (msgstr, source)
+        return found
+
+    def fuzzy_index(self, locale, threshold=0.8):
+        """
+        Build a fuzzy index of the translations of a locale.
+
+        :param locale: locale code
+        :param threshold: minimum similarity of the suggestions
+        :return: FuzzyIndex
+        """
+        return FuzzyIndex(self.db.execute('SELECT msgid, msgstr FROM translations WHERE locale = ?', (locale,)),
+                          threshold=threshold)
+
+    def fill_csv(self, csv_template, into_file, locale, existing=None, suggestion_threshold=None):
+        """
+        Write a translation table for a locale from the csv template, filling in every known translation.
+
+        :param csv_template: path to the csv template of the application
+        :param into_file: path of the translation table to write
+        :param locale: locale code
+        :param existing: dictionary of {msgid: msgstr} that take precedence over the memory, including the phrases
+                         left untranslated ('')
+        :param suggestion_threshold: if given, phrases that remain untranslated get the translation of the most
+                                     similar phrase in the memory (with at least this similarity) as a
+                                     suggestion in the comments column
+        :return: dictionary of {source: number of translations filled from it}
+        """
+        catalog, merges = self.fill(Catalog.read_csv(csv_template), locale, existing=existing,
+                                    existing_source=into_file, suggestion_threshold=suggestion_threshold)
+        catalog.write_csv(into_file)
+        return merges
+
+    def fill(self, template, locale, existing=None, existing_source=None, suggestion_threshold=None,
+             suggestion_cache=None):
+        """
+        Create the translation table of a locale from a template, filling in every known translation.
+
+        :param template: Catalog of the phrases of the application
+        :param locale: locale code
+        :param existing: dictionary of {msgid: msgstr} that take precedence over the memory, including the phrases
+                         left untranslated ('') so that a translation removed from the table is not filled again
+        :param existing_source: name the translations of existing are counted under in the merges
+        :param suggestion_threshold: if given, phrases that remain untranslated get the translation of the most
+                                     similar phrase in the memory (with at least this similarity) as a
+                                     suggestion in the comments column
+        :param suggestion_cache: fuzzy.SuggestionCache that keeps the suggestions between builds
+        :return: (Catalog, dictionary of {source: number of translations filled from it})
+        """
+        existing = existing or {}
+        phrases = template.msgids
+        known = self.lookup(locale, [p for p in phrases if p not in existing])
+        untranslated = [p for p in phrases if not existing.get(p, known.get(p))]
+        suggestions = {}
+        if suggestion_threshold is not None and len(template.header) > 2 and untranslated:
+            if suggestion_cache is not None:
+                translations = self.db.execute('SELECT msgid, msgstr FROM translations WHERE locale = ?',
+                                               (locale,)).fetchall()
+                suggestions = suggestion_cache.suggest(locale, translations, untranslated,
+                                                       threshold=suggestion_threshold)
+            else:
+                index = self.fuzzy_index(locale, threshold=suggestion_threshold)
+                for phrase in untranslated:
+                    found = index.suggest(phrase)
+                    if found:
+                        suggestions[phrase] = found[0]
+        merges = {}
+        catalog = Catalog(template.header)
+        for phrase in phrases:
+            translation = existing.get(phrase)
+            if translation is not None:
+                source = existing_source if translation else None
+            elif phrase in known:
+                translation, source = known[phrase]
+            else:
+                translation, source = '', None
+            if source is not None:
+                merges[source] = merges.get(source, 0) + 1
+            comment = ''
+            if not translation and phrase in suggestions:
+                similarity, similar_phrase, suggestion = suggestions[phrase]
+                comment = 'Suggestion ({:.0%} match with "{}"): {}'.format(similarity, similar_phrase, suggestion)
+            catalog.add(phrase, translation, comment)
+        return catalog, merges
+
+
+def read_translations(csv_path, untranslated=False):
+    """
+    Read the translations of a translation table.
+    :param csv_path: path to the csv file
+    :param untranslated: include the phrases that are not translated (with an empty msgstr)
+    :return: dictionary of {msgid: msgstr}
+    """
+    with open(csv_path, 'r') as _csv:
+        csv_reader = csv.reader(_csv)
+        header = next(csv_reader, None)
+        return dict((row[0], row[1] if len(row) > 1 else '') for row in csv_reader
+                    if row and (untranslated or (len(row) > 1 and row[1])))
+
+
+class TranslationPool(object):
+    """
+    Translations of the tables of several applications, read once and shared by the builds of a batch
+    (see factory.build_applications) to fill each application from the others.
+    """
+
+    def __init__(self):
+        self.tables = collections.OrderedDict()
+        self._translations = {}
+
+    def add_tables(self, build_dir, locale, code):
+        """
+        Add the tables of a locale directory to the pool.
+        :param build_dir: build directory of an application
+        :param locale: language name of the locale
+        :param code: locale code
+        """
+        tables = self.tables.setdefault(code, [])
+        for table in sorted(glob.glob(os.path.join(build_dir, code, '*' + locale + '.csv'))):
+            table = os.path.abspath(table)
+            if table not in tables:
+                tables.append(table)
+        self._translations.pop(code, None)
+
+    def translations(self, code):
+        """
+        Known translations of a locale, the first table that translates a phrase takes precedence.
+        :param code: locale code
+        :return: dictionary of {msgid: msgstr}
+        """
+        known = self._translations.get(code)
+        if known is None:
+            known = self._translations[code] = {}
+            for table in self.tables.get(code, ()):
+                for msgid, msgstr in read_translations(table).iteritems():
+                    known.setdefault(msgid, msgstr)
+        return known
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import existing translation tables into a translation memory.')
+    parser.add_argument('memory', help='path to the translation memory (build_dir/translation_memory.db)')
+    parser.add_argument('locale', help='locale code of the tables, ie. es_ES')
+    parser.add_argument('tables', nargs='+', help='translated csv tables to import')
+    args = parser.parse_args()
+
+    memory = TranslationMemory(args.memory)
+    for table in args.tables:
+        print '{} translations imported from {}'.format(memory.import_csv(table, args.locale, force=True), table)
+    memory.close()
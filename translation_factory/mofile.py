@@ -0,0 +1,101 @@
+__author__ = 'clobo'
+
+import array
+import struct
+
+from atomic import atomic_write
+
+MO_MAGIC = 0x950412de
+
+
+def hashpjw(s):
+    """
+    The ELF / GNU gettext string hash used to index the hash table of .mo files.
+    """
+    hval = 0
+    for c in s:
+        hval = (hval << 4) + ord(c)
+        g = hval & 0xf0000000
+        if g:
+            hval ^= g >> 24
+            hval ^= g
+    return hval
+
+
+def _is_prime(n):
+    if n < 4:
+        return n > 1
+    if n % 2 == 0:
+        return False
+    d = 3
+    while d * d <= n:
+        if n % d == 0:
+            return False
+        d += 2
+    return True
+
+
+def hash_table_size(n):
+    """
+    Size of the hash table msgfmt creates for n strings: the smallest prime >= 4n/3 (at least 3).
+    """
+    size = max(3, n * 4 // 3)
+    while not _is_prime(size):
+        size += 1
+    return size
+
+
+def write_mo(messages, mo_path, header=None):
+    """
+    Compile messages into a GNU .mo file, including the hash table used by gettext for lookups.
+
+    :param messages: iterable of (msgid, msgstr) raw (unescaped) strings. Entries without a msgstr are skipped.
+                     Plural forms are given as msgid + '\\0' + msgid_plural, msgstr[0] + '\\0' + msgstr[1] ...
+    :param mo_path: path to write the .mo file to
+    :param header: metadata of the catalog (the msgstr of the empty msgid)
+    :return: number of translated messages written
+    """
+    catalog = dict((msgid, msgstr) for msgid, msgstr in messages if msgid and msgstr)
+    n_translated = len(catalog)
+    if header:
+        catalog[''] = header
+    keys = sorted(catalog)
+    n = len(keys)
+    hash_size = hash_table_size(n)
+
+    originals_offset = 7 * 4
+    translations_offset = originals_offset + n * 8
+    hash_offset = translations_offset + n * 8
+    strings_offset = hash_offset + hash_size * 4
+
+    originals = array.array('I')
+    translations = array.array('I')
+    strings = []
+    offset = strings_offset
+    for key in keys:
+        originals.extend((len(key), offset))
+        strings.append(key + '\0')
+        offset += len(key) + 1
+    for key in keys:
+        value = catalog[key]
+        translations.extend((len(value), offset))
+        strings.append(value + '\0')
+        offset += len(value) + 1
+
+    hash_table = array.array('I', [0]) * hash_size
+    for ii, key in enumerate(keys):
+        # Like msgfmt, plural entries are hashed on their singular msgid (the key up to the \0)
+        hval = hashpjw(key.split('\0', 1)[0])
+        idx = hval % hash_size
+        incr = 1 + (hval % (hash_size - 2))
+        while hash_table[idx] != 0:
+            idx = (idx + incr) % hash_size
+        hash_table[idx] = ii + 1
+
+    with atomic_write(mo_path, 'wb') as _mo:
+        _mo.write(struct.pack('=7I', MO_MAGIC, 0, n, originals_offset, translations_offset, hash_size, hash_offset))
+        _mo.write(originals.tostring())
+        _mo.write(translations.tostring())
+        _mo.write(hash_table.tostring())
+        _mo.write(''.join(strings))
+    return n_translated
@@ -0,0 +1,173 @@
+__author__ = 'clobo'
+
+import re
+import json
+import string
+import collections
+
+from atomic import atomic_write
+
+# printf style conversions: %s, %5.2f, %-10d, %(name)s, %(count)05d. '%%' is a literal percent sign.
+# The space flag is left out so that phrases such as "50% off" are not taken for a conversion.
+_re_percent_placeholder = re.compile(r'%(?:\([^)]*\))?[-#0+]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?[diouxXeEfFgGcrs%]')
+_formatter = string.Formatter()
+
+
+def placeholders(text):
+    """
+    Find the python format placeholders of a string: printf style conversions (%s, %(name)s) and str.format
+    replacement fields ({}, {0}, {name}, {name!r:>10}, {obj.attr}, {0[key]}).
+
+    :param text: string to search
+    :return: Counter of {placeholder: number of occurrences}
+    """
+    found = collections.Counter(m for m in _re_percent_placeholder.findall(text) if m != '%%')
+    if '{' in text or '}' in text:
+        _format_fields(text, found)
+    return found
+
+
+def _format_fields(text, found):
+    try:
+        for literal, field_name, format_spec, conversion in _formatter.parse(text):
+            if field_name is None:
+                continue
+            field = '{' + field_name
+            if conversion:
+                field += '!' + conversion
+            if format_spec:
+                field += ':' + format_spec
+                # Format specs may hold nested fields, ie. {value:{width}}
+                _format_fields(format_spec, found)
+            found[field + '}'] += 1
+    except ValueError:
+        # Unbalanced braces, str.format would fail on this string
+        found['{?}'] += 1
+
+
+class PlaceholderError(object):
+    """
+    A translation whose placeholders differ from the placeholders of its phrase.
+    """
+    __slots__ = ('locale', 'msgid', 'msgstr', 'missing', 'extra')
+
+    def __init__(self, locale, msgid, msgstr, missing, extra):
+        self.locale = locale
+        self.msgid = msgid
+        self.msgstr = msgstr
+        self.missing = missing
+        self.extra = extra
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state[name])
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __repr__(self):
+        return 'PlaceholderError(%s, %r, missing=%s, extra=%s)' % (self.locale, self.msgid, self.missing, self.extra)
+
+
+class PlaceholderValidator(object):
+    """
+    Checks that translations keep the placeholders of their phrase.
+
+    The placeholders of each phrase are found once and cached so that checking the tables of every locale only
+    costs a scan of the translations.
+    """
+
+    def __init__(self):
+        self.signatures = {}
+
+    def __getstate__(self):
+        return self.signatures
+
+    def __setstate__(self, state):
+        self.signatures = state
+
+    def signature(self, msgid):
+        """
+        :return: Counter of the placeholders of a phrase
+        """
+        signature = self.signatures.get(msgid)
+        if signature is None:
+            signature = self.signatures[msgid] = placeholders(msgid)
+        return signature
+
+    def prime(self, msgids):
+        """
+        Find the placeholders of a batch of phrases ahead of checking translations of them.
+        :param msgids: iterable of phrases
+        """
+        for msgid in msgids:
+            self.signature(msgid)
+
+    def check(self, locale, translations):
+        """
+        Check the translations of a locale.
+        :param locale: locale code of the translations
+        :param translations: iterable of (msgid, msgstr), untranslated phrases are skipped
+        :return: list of PlaceholderError
+        """
+        errors = []
+        for msgid, msgstr in translations:
+            if not msgstr:
+                continue
+            expected = self.signature(msgid)
+            found = placeholders(msgstr)
+            if found != expected:
+                errors.append(PlaceholderError(locale, msgid, msgstr,
+                                               sorted((expected - found).elements()),
+                                               sorted((found - expected).elements())))
+        return errors
+
+    def validate(self, tables):
+        """
+        Check the translations of several locales in one batch.
+        :param tables: dictionary of {locale: iterable of (msgid, msgstr)}
+        :return: PlaceholderReport
+        """
+        report = PlaceholderReport()
+        for locale, translations in tables.iteritems():
+            report.add(locale, self.check(locale, translations))
+        return report
+
+
+class PlaceholderReport(object):
+    """
+    Placeholder errors of a build, by locale. Evaluates to True when there are no errors.
+    """
+
+    def __init__(self):
+        self.locales = collections.OrderedDict()
+
+    def add(self, locale, errors):
+        self.locales.setdefault(locale, []).extend(errors)
+
+    @property
+    def errors(self):
+        return [e for errors in self.locales.itervalues() for e in errors]
+
+    def __len__(self):
+        return sum(len(errors) for errors in self.locales.itervalues())
+
+    def __nonzero__(self):
+        return len(self) == 0
+
+    def as_dict(self):
+        return collections.OrderedDict((locale, [e.as_dict() for e in errors])
+                                       for locale, errors in self.locales.iteritems())
+
+    def write_json(self, path):
+        """
+        Write the report as JSON of {locale: [{locale, msgid, msgstr, missing, extra}, ...]}
+        :param path: path of the report
+        :return: path
+        """
+        with atomic_write(path) as _f:
+            json.dump(self.as_dict(), _f, indent=2)
+        return path
@@ -2,10 +2,11 @@ __author__ = 'clobo'
 
 import os
 import sys
-import csv
 import argparse
 
-from itertools import chain
+from pofile import iter_entries
+from catalog import Catalog, write_csv
+from extsort import external_sort, unique
 
 
 def iter_po(filepath):
@@ -14,40 +15,18 @@ def iter_po(filepath):
     :param filepath: path to .po file
     :return: string tuple of (msgid, msgstr)
     """
-    msgid, msgstr = [], []
-    append_to = None
-    with open(filepath, 'r') as poFile:
-        for line in chain(poFile, '\n'):
-            # Decide if the line is part of the phrase or the translation and assign it to the corresponding list
-            if line.startswith('msgstr'):
-                append_to = msgstr
-            elif line.startswith('msgid'):
-                append_to = msgid
+    for entry in iter_entries(filepath):
+        yield entry.msgid, entry.msgstr
 
-            if append_to is not None:
-                append_to.append(line)
 
-            if line == '\n':
-                append_to = None
-
-                _msgid = ''.join([m.strip('"') for m in msgid])
-                _msgid = _msgid.replace('msgid "', '')
-                _msgid = _msgid.replace('"\n', '')
-
-                _msgstr = ''.join([m.strip('"') for m in msgstr])
-                _msgstr = _msgstr.replace('msgstr "', '')
-                _msgstr = _msgstr.replace('"\n', '')
-
-                del msgid[:]
-                del msgstr[:]
-                yield _msgid, _msgstr
-
-
-def po_to_csv(po_path, csv_path, sort=True):
+def po_to_csv(po_path, csv_path, sort=True, memory_budget=None):
     """
     Convert the po file to a csv file that can be sent to the translator
     :param po_path: path to the po file
     :param csv_path: output path to the csv
+    :param sort: sort the strings alphabetically
+    :param memory_budget: if given, the entries are sorted as they are read, holding about this many bytes in memory
+                          and spilling the rest to temporary files, instead of reading the whole table first
 
     :return: csv_path if successful else None
     """
@@ -57,24 +36,16 @@ def po_to_csv(po_path, csv_path, sort=True):
     if not os.path.isfile(po_path):
         raise ValueError('No po file "%s" exists' % po_path)
 
-    msgid_sorted = []
-    with open(csv_path, 'w') as _csv:
-        csvFile = csv.writer(_csv)
-        for count, (msgid, msgstr) in enumerate(iter_po(po_path)):
-            if count == 0:
-                pass
-            else:
-                if count == 2:
-                    csvFile.writerow(('Original Text', 'Translation', 'Additional Comments'))
-
-                if sort:
-                    msgid_sorted.append(msgid)
-                else:
-                    csvFile.writerow((msgid, '', '', '' ))
-        if sort:
-            msgid_sorted.sort()
-            for t in msgid_sorted:
-                csvFile.writerow((t, '', '', '' ))
+    if sort and memory_budget is not None:
+        rows = ((entry.msgid, '', '') for entry in iter_entries(po_path) if not (entry.is_header or entry.obsolete))
+        # Entries that share a msgid are next to each other once sorted, the first one is kept like Catalog.add does
+        write_csv(csv_path, unique(external_sort(rows, memory_budget=memory_budget)))
+        return csv_path
+
+    catalog = Catalog.read_po(po_path, translations=False)
+    if sort:
+        catalog.sort()
+    catalog.write_csv(csv_path)
 
     return csv_path
 
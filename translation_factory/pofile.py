@@ -0,0 +1,358 @@
+__author__ = 'clobo'
+
+import re
+
+from itertools import chain
+from cStringIO import StringIO
+
+from atomic import atomic_write
+
+_re_po_escape = re.compile(r'\\(.)')
+_po_unescapes = {'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+
+def unescape(s):
+    """
+    Convert a PO-escaped string (as found between the quotes of a msgid / msgstr) into its raw value.
+    """
+    if '\\' not in s:
+        return s
+    return _re_po_escape.sub(lambda m: _po_unescapes.get(m.group(1), m.group(1)), s)
+
+
+def escape(s):
+    """
+    Convert a raw string into its PO-escaped form.
+    """
+    return s.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t').replace('\r', '\\r')
+
+
+class POEntry(object):
+    """
+    A single entry of a PO file.
+
+    Strings are kept in their PO-escaped form (the text between the quotes) unless the file is parsed with
+    decode=True. Plural translations are in msgstr_plural, ordered by index, and msgstr is then msgstr[0].
+    """
+    __slots__ = ('msgctxt', 'msgid', 'msgid_plural', 'msgstr', 'msgstr_plural', 'references', 'flags',
+                 'comments', 'lineno', 'obsolete')
+
+    def __init__(self, msgid, msgstr='', msgctxt=None, msgid_plural=None, msgstr_plural=None, references=(),
+                 flags=(), comments=(), lineno=0, obsolete=False):
+        self.msgctxt = msgctxt
+        self.msgid = msgid
+        self.msgid_plural = msgid_plural
+        self.msgstr = msgstr
+        self.msgstr_plural = msgstr_plural
+        self.references = references
+        self.flags = flags
+        self.comments = comments
+        self.lineno = lineno
+        self.obsolete = obsolete
+
+    @property
+    def is_header(self):
+        return self.msgid == '' and self.msgctxt is None
+
+    @property
+    def fuzzy(self):
+        return 'fuzzy' in self.flags
+
+    def __repr__(self):
+        return 'POEntry(%r, %r)' % (self.msgid, self.msgstr)
+
+
+def _quoted(s):
+    """ Text between the first and last quote of a line """
+    return s[s.index('"') + 1: s.rindex('"')]
+
+
+# Bytes of a PO file read at a time by iter_entries
+READ_SIZE = 1 << 20
+
+# Entries are separated by blank lines, and most of them are made of comments (but not #~ obsolete lines, and a
+# single #: line is matched on its own), an optional msgctxt, a msgid and a msgstr. Such a block is matched at once,
+# each string as the text between the quotes of its first line and of its continuation lines, joined by '"\n"' (which
+# a line can not hold otherwise). Any other block is parsed line by line.
+_re_entry = re.compile(r'(?:#: ([^\n]*)\n(?=msg)|((?:#(?!~)[^\n]*\n)*))'
+                       r'(?:msgctxt "([^\n]*(?:"\n"[^\n]*)*)"\n)?'
+                       r'msgid "([^\n]*(?:"\n"[^\n]*)*)"\n'
+                       r'msgstr "([^\n]*(?:"\n"[^\n]*)*)"\n?\Z')
+
+
+def iter_entries(po_path, decode=False):
+    """
+    Iterate through the entries of a PO file in a single pass.
+
+    The file is read in blocks of lines separated by blank lines, so that the common entries (comments, msgctxt,
+    msgid and msgstr) are parsed with one regex match instead of line by line.
+
+    :param po_path: path to the po file
+    :param decode: unescape the strings into their raw values
+    :return: generator of POEntry (the header is the first entry)
+    """
+    parser = _Parser(decode)
+    convert = parser.convert
+    match = _re_entry.match
+    new_entry, entry_class, intern_ = object.__new__, POEntry, intern
+    # Blocks are matched while the parser holds no lines of an entry, or a translated entry that the block completes
+    ready = True
+    # Last matched entry (with its strings still escaped). Lines of the next block may still belong to it (ie. a #~
+    # msgstr), it is only complete once a matched block follows it.
+    pending = None
+    lineno = 1
+    with open(po_path, 'r') as _po:
+        buf = ''
+        while True:
+            chunk = _po.read(READ_SIZE)
+            buf += chunk
+            end = buf.rfind('\n\n') if chunk else len(buf)
+            if end < 0:
+                if len(buf) < 4 * READ_SIZE:
+                    continue
+                # No blank lines (ie. \r\n line endings), the rest of the file is parsed line by line
+                if pending is not None:
+                    parser.resume(pending)
+                    pending = None
+                for entry in parser.feed(chain(StringIO(buf + _po.readline()), _po), lineno):
+                    yield entry
+                break
+            for block in buf[:end].split('\n\n'):
+                nl = block.count('\n')
+                m = match(block) if ready else None
+                if m is None:
+                    stripped = block.lstrip('\n')
+                    if stripped:
+                        if pending is not None:
+                            parser.resume(pending)
+                            pending = None
+                        for entry in parser.feed(stripped.split('\n'), lineno + len(block) - len(stripped)):
+                            yield entry
+                        ready = parser.translated or parser.is_empty
+                    lineno += nl + 2
+                    continue
+
+                # The block starts the next entry
+                if pending is not None:
+                    if convert:
+                        pending.msgid, pending.msgstr = intern_(convert(pending.msgid)), convert(pending.msgstr)
+                        if pending.msgctxt is not None:
+                            pending.msgctxt = convert(pending.msgctxt)
+                    yield pending
+                elif parser.translated:
+                    yield parser.entry()
+
+                reference_line, comment_lines, msgctxt, msgid, msgstr = m.groups()
+                if reference_line is not None:
+                    # Most entries only have their references
+                    n = 1
+                    references, flags, comments = reference_line.split(), [], []
+                else:
+                    n = comment_lines.count('\n')
+                    references, flags, comments = [], [], []
+                    for line in comment_lines.split('\n')[:n]:
+                        _add_comment(line, references, flags, comments)
+                if nl != n + 1 or msgctxt is not None:
+                    # Strings continued over several lines
+                    msgid = msgid.replace('"\n"', '')
+                    msgstr = msgstr.replace('"\n"', '')
+                    if msgctxt is not None:
+                        msgctxt = msgctxt.replace('"\n"', '')
+                # Same as POEntry(...), without the call of __init__
+                pending = entry = new_entry(entry_class)
+                entry.msgctxt, entry.msgid, entry.msgstr, entry.lineno = msgctxt, intern_(msgid), msgstr, lineno + n
+                entry.references, entry.flags, entry.comments = references, flags, comments
+                entry.msgid_plural = entry.msgstr_plural = None
+                entry.obsolete = False
+                lineno += nl + 2
+            if not chunk:
+                break
+            buf = buf[end + 2:]
+    if pending is not None:
+        parser.resume(pending)
+    if 'msgid' in parser.fields:
+        yield parser.entry()
+
+
+def parse(lines, decode=False):
+    """
+    Parse PO syntax: translator / extracted comments, #: references, #, flags, #| previous strings, #~ obsolete
+    entries, msgctxt, msgid, msgid_plural, msgstr and msgstr[n], with strings continued over several lines.
+
+    :param lines: iterable of the lines of a PO file
+    :param decode: unescape the strings into their raw values
+    :return: generator of POEntry
+    """
+    parser = _Parser(decode)
+    for entry in parser.feed(lines):
+        yield entry
+    if 'msgid' in parser.fields:
+        yield parser.entry()
+
+
+def _add_comment(line, references, flags, comments):
+    """ Add a comment line (other than #~) to the references, flags or comments of an entry """
+    kind = line[1:2]
+    if kind == ':':
+        references.extend(line[2:].split())
+    elif kind == ',':
+        flags.extend(f.strip() for f in line[2:].split(',') if f.strip())
+    elif kind != '|':
+        comments.append(line[1:].strip())
+
+
+class _Parser(object):
+    """
+    Line by line PO parser, keeping the entry being parsed between the blocks of lines it is given.
+    """
+
+    def __init__(self, decode=False):
+        self.convert = unescape if decode else None
+        self.fields = {}
+        self.references, self.flags, self.comments = [], [], []
+        self.start = 0
+        self.obsolete = False
+        self.translated = False
+
+    @property
+    def is_empty(self):
+        return not (self.fields or self.references or self.flags or self.comments)
+
+    def entry(self):
+        """
+        :return: POEntry of the lines parsed so far, the lines that follow start the next entry
+        """
+        entry = _make_entry(self.fields, self.references, self.flags, self.comments, self.start, self.obsolete,
+                            self.convert)
+        self.fields, self.references, self.flags, self.comments = {}, [], [], []
+        self.translated = False
+        return entry
+
+    def resume(self, entry):
+        """
+        Continue a translated entry parsed without the parser, with its strings still escaped (see iter_entries).
+        """
+        self.fields = {'msgid': [entry.msgid], 'msgstr': [entry.msgstr]}
+        if entry.msgctxt is not None:
+            self.fields['msgctxt'] = [entry.msgctxt]
+        self.references, self.flags, self.comments = entry.references, entry.flags, entry.comments
+        self.start = entry.lineno
+        self.obsolete = False
+        self.translated = True
+
+    def feed(self, lines, lineno=1):
+        """
+        Parse lines that follow a blank line (or start the file).
+        :param lines: iterable of lines
+        :param lineno: line number of the first line
+        :return: generator of the POEntry completed by the lines
+        """
+        fields, references, flags, comments = self.fields, self.references, self.flags, self.comments
+        start, obsolete, translated, convert = self.start, self.obsolete, self.translated, self.convert
+        current = None
+
+        for lineno, line in enumerate(lines, lineno):
+            first = line[:1]
+            if first == '"':
+                # Continuation lines are by far the most common after msgid / msgstr lines so they are checked first
+                if current is not None:
+                    current.append(line[1:line.rindex('"')])
+                continue
+            if first in ' \t':
+                line = line.strip()
+                first = line[:1]
+            line_obsolete = first == '#' and line[1:2] == '~'
+            if line_obsolete:
+                # Obsolete entries hold regular entry lines behind the #~ marker
+                line = line[2:].strip()
+                first = line[:1]
+                if first == '"':
+                    if current is not None:
+                        current.append(_quoted(line))
+                    continue
+                if first == '|':
+                    continue
+
+            if first == 'm':
+                keyword, _, value = line.partition(' ')
+                if keyword[:6] == 'msgstr':
+                    translated = True
+                elif translated:
+                    # A msgid or msgctxt after a translation starts the next entry
+                    yield _make_entry(fields, references, flags, comments, start, obsolete, convert)
+                    fields, references, flags, comments = {}, [], [], []
+                    translated = False
+                if not fields:
+                    start = lineno
+                    obsolete = line_obsolete
+                current = fields[keyword] = [value[value.index('"') + 1: value.rindex('"')]]
+            elif first == '#':
+                if translated:
+                    yield _make_entry(fields, references, flags, comments, start, obsolete, convert)
+                    fields, references, flags, comments = {}, [], [], []
+                    translated = False
+                current = None
+                _add_comment(line, references, flags, comments)
+            else:
+                current = None
+
+        self.fields, self.references, self.flags, self.comments = fields, references, flags, comments
+        self.start, self.obsolete, self.translated = start, obsolete, translated
+
+
+def _make_entry(fields, references, flags, comments, lineno, obsolete, convert):
+    for key, parts in fields.items():
+        s = parts[0] if len(parts) == 1 else ''.join(parts)
+        fields[key] = convert(s) if convert else s
+
+    msgstr_plural = None
+    if 'msgstr[0]' in fields:
+        msgstr_plural = []
+        n = 0
+        while 'msgstr[%d]' % n in fields:
+            msgstr_plural.append(fields['msgstr[%d]' % n])
+            n += 1
+        msgstr = msgstr_plural[0]
+    else:
+        msgstr = fields.get('msgstr', '')
+    return POEntry(intern(fields.get('msgid', '')), msgstr, fields.get('msgctxt'), fields.get('msgid_plural'),
+                   msgstr_plural, references, flags, comments, lineno, obsolete)
+
+
+def format_entry(entry):
+    """
+    Format an entry in PO syntax. The strings of the entry must be in their PO-escaped form (decode=False).
+    :param entry: POEntry
+    :return: text of the entry, without the blank line that separates it from the next one
+    """
+    lines = []
+    for comment in entry.comments:
+        # Extracted comments (#.) keep their marker, translator comments are separated from the # by a space
+        lines.append(('#' + comment if comment[:1] == '.' else '# ' + comment).rstrip() + '\n')
+    if entry.references:
+        lines.append('#: %s\n' % ' '.join(entry.references))
+    if entry.flags:
+        lines.append('#, %s\n' % ', '.join(entry.flags))
+    prefix = '#~ ' if entry.obsolete else ''
+    if entry.msgctxt is not None:
+        lines.append('%smsgctxt "%s"\n' % (prefix, entry.msgctxt))
+    lines.append('%smsgid "%s"\n' % (prefix, entry.msgid))
+    if entry.msgid_plural is not None:
+        lines.append('%smsgid_plural "%s"\n' % (prefix, entry.msgid_plural))
+        for n, msgstr in enumerate(entry.msgstr_plural or ('', '')):
+            lines.append('%smsgstr[%d] "%s"\n' % (prefix, n, msgstr))
+    else:
+        lines.append('%smsgstr "%s"\n' % (prefix, entry.msgstr))
+    return ''.join(lines)
+
+
+def write_po(entries, po_path):
+    """
+    Write entries (the header first) to a po file.
+    :param entries: iterable of POEntry with their strings in their PO-escaped form
+    :param po_path: path to the po file
+    :return: po_path
+    """
+    with atomic_write(po_path) as _po:
+        _po.write('\n'.join(format_entry(entry) for entry in entries))
+    return po_path
@@ -0,0 +1,212 @@
+__author__ = 'clobo'
+
+import re
+import ast
+import logging
+import collections
+import multiprocessing
+
+from datetime import datetime
+
+from atomic import atomic_write
+from pofile import escape
+
+# Default python keywords of xgettext (xgettext -L python): keyword -> (msgid argument index, msgid_plural argument
+# index)
+KEYWORDS = {'_': (0, None),
+            'gettext': (0, None),
+            'ugettext': (0, None),
+            'dgettext': (1, None),
+            'ngettext': (0, 1),
+            'ungettext': (0, 1),
+            'dngettext': (1, 2)}
+
+_re_python_format = re.compile(r'%(\(\w+\))?[-#0 +]*(\*|\d+)?(\.(\*|\d+))?[diouxXeEfFgGcrs]')
+_re_non_ascii = re.compile(r'[^\x00-\x7f]')
+
+
+class Message(object):
+    """
+    A message extracted from the source code along with the locations it was found in.
+    """
+    __slots__ = ('msgctxt', 'msgid', 'msgid_plural', 'references')
+
+    def __init__(self, msgid, msgid_plural=None, msgctxt=None):
+        self.msgctxt = msgctxt
+        self.msgid = msgid
+        self.msgid_plural = msgid_plural
+        self.references = []
+
+
+def _string_value(node):
+    """
+    Return the value of a string literal node encoded as utf-8 or None if the node is not a string literal.
+    """
+    if not isinstance(node, ast.Str):
+        return None
+    s = node.s
+    if isinstance(s, unicode):
+        s = s.encode('utf-8')
+    return s
+
+
+def scan_file(path):
+    """
+    Find all the gettext calls in a python source file.
+    :param path: path to the source file
+    :return: list of (msgctxt, msgid, msgid_plural, lineno) in the order they appear in the file. msgctxt is always
+             None, none of the keywords have a context.
+    """
+    with open(path, 'r') as _f:
+        source = _f.read()
+    try:
+        tree = ast.parse(source, path)
+    except (SyntaxError, TypeError) as e:
+        logging.warning('Unable to parse %s: %s' % (path, e))
+        return []
+
+    found = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        if isinstance(node.func, ast.Name):
+            name = node.func.id
+        elif isinstance(node.func, ast.Attribute):
+            name = node.func.attr
+        else:
+            continue
+        if name not in KEYWORDS:
+            continue
+        msgid_arg, plural_arg = KEYWORDS[name]
+        if len(node.args) <= msgid_arg:
+            continue
+        msgid = _string_value(node.args[msgid_arg])
+        if not msgid:
+            continue
+        msgid_plural = None
+        if plural_arg is not None and len(node.args) > plural_arg:
+            msgid_plural = _string_value(node.args[plural_arg])
+        found.append((node.args[msgid_arg].lineno, node.args[msgid_arg].col_offset, msgid, msgid_plural))
+
+    # ast.walk is breadth first, put the calls back into source order
+    found.sort()
+    return [(None, msgid, msgid_plural, lineno) for lineno, col, msgid, msgid_plural in found]
+
+
+def _scan_path(path):
+    return path, scan_file(path)
+
+
+def scan_files(paths, workers=None):
+    """
+    Scan python source files for gettext calls using a pool of processes.
+    :param paths: list or iterable of source file paths. An iterator (ie. discovery.iter_source_files) is consumed
+                  while the files found so far are being scanned.
+    :param workers: number of processes to use. Defaults to the number of CPUs, 1 scans in this process.
+    :return: generator of (path, [(msgctxt, msgid, msgid_plural, lineno), ...]) in the order of paths
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    sized = isinstance(paths, (list, tuple))
+    if workers > 1 and (not sized or len(paths) > 1):
+        pool = multiprocessing.Pool(workers)
+        try:
+            chunksize = max(1, len(paths) // (workers * 4)) if sized else 16
+            for path, found in pool.imap(_scan_path, paths, chunksize=chunksize):
+                yield path, found
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for path in paths:
+            yield path, scan_file(path)
+
+
+def collect_messages(scanned):
+    """
+    Combine the results of scanned files into a catalog of unique messages.
+    :param scanned: iterable of (path, [(msgctxt, msgid, msgid_plural, lineno), ...])
+    :return: OrderedDict of {(msgctxt, msgid): Message} in order of first appearance
+    """
+    messages = collections.OrderedDict()
+    for path, found in scanned:
+        for msgctxt, msgid, msgid_plural, lineno in found:
+            message = messages.get((msgctxt, msgid))
+            if message is None:
+                message = messages[(msgctxt, msgid)] = Message(msgid, msgid_plural, msgctxt)
+            elif message.msgid_plural is None:
+                message.msgid_plural = msgid_plural
+            message.references.append('%s:%d' % (path, lineno))
+    return messages
+
+
+def extract_messages(paths, workers=None):
+    """
+    Extract the gettext messages from a sequence of python source files using a pool of processes.
+    :param paths: iterable of source file paths
+    :param workers: number of processes to use. Defaults to the number of CPUs, 1 scans in this process.
+    :return: OrderedDict of {(msgctxt, msgid): Message} in order of first appearance
+    """
+    return collect_messages(scan_files(paths, workers=workers))
+
+
+def _po_string(keyword, s):
+    """
+    Format a PO string, splitting it onto multiple lines at new line characters the same way xgettext does.
+    """
+    lines = s.split('\n')
+    lines = [l + '\n' for l in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+    if len(lines) <= 1:
+        return '%s "%s"\n' % (keyword, escape(s))
+    return '%s ""\n' % keyword + ''.join('"%s"\n' % escape(l) for l in lines)
+
+
+def write_template(messages, pofile_path):
+    """
+    Write extracted messages to a po template in the same layout as xgettext.
+    :param messages: dictionary of {(msgctxt, msgid): Message}
+    :param pofile_path: path to write the po file to
+    :return: path to the po file
+    """
+    charset = 'ASCII'
+    if any(_re_non_ascii.search(message.msgid) or (message.msgctxt and _re_non_ascii.search(message.msgctxt))
+           for message in messages.itervalues()):
+        charset = 'UTF-8'
+
+    with atomic_write(pofile_path) as _po:
+        _po.write('# SOME DESCRIPTIVE TITLE.\n'
+                  '# Copyright (C) YEAR THE PACKAGE\'S COPYRIGHT HOLDER\n'
+                  '# This file is distributed under the same license as the PACKAGE package.\n'
+                  '# FIRST AUTHOR <EMAIL@ADDRESS>, YEAR.\n'
+                  '#\n'
+                  '#, fuzzy\n'
+                  'msgid ""\n'
+                  'msgstr ""\n'
+                  '"Project-Id-Version: PACKAGE VERSION\\n"\n'
+                  '"Report-Msgid-Bugs-To: \\n"\n'
+                  '"POT-Creation-Date: {dt}\\n"\n'
+                  '"PO-Revision-Date: YEAR-MO-DA HO:MI+ZONE\\n"\n'
+                  '"Last-Translator: FULL NAME <EMAIL@ADDRESS>\\n"\n'
+                  '"Language-Team: LANGUAGE <LL@li.org>\\n"\n'
+                  '"Language: \\n"\n'
+                  '"MIME-Version: 1.0\\n"\n'
+                  '"Content-Type: text/plain; charset={charset}\\n"\n'
+                  '"Content-Transfer-Encoding: 8bit\\n"\n'.format(dt=datetime.now().strftime('%Y-%m-%d %H:%M%z'),
+                                                                  charset=charset))
+        for message in messages.itervalues():
+            # Entries are separated by exactly one blank line and the file does not end with one
+            _po.write('\n')
+            _po.write('#: %s\n' % ' '.join(message.references))
+            if _re_python_format.search(message.msgid):
+                _po.write('#, python-format\n')
+            if message.msgctxt is not None:
+                _po.write(_po_string('msgctxt', message.msgctxt))
+            _po.write(_po_string('msgid', message.msgid))
+            if message.msgid_plural is None:
+                _po.write('msgstr ""\n')
+            else:
+                _po.write(_po_string('msgid_plural', message.msgid_plural))
+                _po.write('msgstr[0] ""\n'
+                          'msgstr[1] ""\n')
+    return pofile_path
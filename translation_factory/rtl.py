@@ -0,0 +1,126 @@
+__author__ = 'clobo'
+
+import os
+import logging
+import multiprocessing
+import cPickle as pickle
+
+from atomic import atomic_write
+
+try:
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+except ImportError:
+    arabic_reshaper = None
+    get_display = None
+
+CACHE_VERSION = 1
+# Locales whose translations are reshaped
+RTL_LOCALES = ('fa_IR', 'ar_AE')
+
+
+def available():
+    """
+    :return: True if arabic-reshaper and python-bidi are installed
+    """
+    return arabic_reshaper is not None
+
+
+def reshape(text, locale):
+    """
+    Combine the individual characters of a translation into their word form and, for ar_AE, reverse it
+    (right to left).
+    :param text: utf-8 encoded translation
+    :param locale: locale code
+    :return: utf-8 encoded reshaped translation
+    """
+    t = text.decode('utf-8')
+    # Converts individual characters to their word respresentation
+    reshaped = arabic_reshaper.reshape(t)
+    # To prevent escaped quotes from being reversed, reverse them ahead of time so they get re-reversed
+    reshaped = reshaped.replace('\\"', '"\\')
+    reshaped = reshaped.replace("\\'", "'\\")
+    if locale == 'ar_AE':
+        # Reverse the string (Right to Left)
+        T = get_display(reshaped)
+    else:
+        T = reshaped
+    return T.encode('utf-8')
+
+
+def _reshape_batch(args):
+    texts, locale = args
+    return [reshape(text, locale) for text in texts]
+
+
+class ReshapeCache(object):
+    """
+    Persistent cache of the reshaped translations of a locale, keyed by (locale, translation).
+
+    Only translations that are new or changed since the last build are reshaped. The cache is rewritten with the
+    translations of the last build so that it does not grow with every edit of the table.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.key = (CACHE_VERSION, getattr(arabic_reshaper, '__version__', None))
+        self.entries = {}
+        self.modified = False
+        if os.path.isfile(path):
+            try:
+                with open(path, 'rb') as _f:
+                    key, entries = pickle.load(_f)
+                if key == self.key:
+                    self.entries = entries
+            except Exception as e:
+                logging.warning('Unable to load reshape cache %s: %s' % (path, e))
+
+    def reshape(self, translations, locale, workers=1, batch_size=1000):
+        """
+        Reshape translations, using the cached result of those reshaped before.
+
+        :param translations: iterable of utf-8 encoded translations
+        :param locale: locale code
+        :param workers: number of processes the translations that are not cached are reshaped in
+        :param batch_size: number of translations reshaped by a process at a time
+        :return: {translation: reshaped translation}
+        """
+        reshaped = {}
+        missing = []
+        for text in translations:
+            if text in reshaped:
+                continue
+            cached = self.entries.get((locale, text))
+            reshaped[text] = cached
+            if cached is None:
+                missing.append(text)
+        if missing:
+            batches = [(missing[ii:ii + batch_size], locale) for ii in xrange(0, len(missing), batch_size)]
+            # Processes of a pool (ie. a locale built by a worker of factory.build) can not start a pool of their own
+            if workers > 1 and len(batches) > 1 and not multiprocessing.current_process().daemon:
+                pool = multiprocessing.Pool(min(workers, len(batches)))
+                try:
+                    results = pool.map(_reshape_batch, batches)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = map(_reshape_batch, batches)
+            for (texts, _), result in zip(batches, results):
+                reshaped.update(zip(texts, result))
+        entries = dict(((locale, text), r) for text, r in reshaped.iteritems())
+        entries.update((k, v) for k, v in self.entries.iteritems() if k[0] != locale)
+        if missing or len(entries) != len(self.entries):
+            self.entries = entries
+            self.modified = True
+        return reshaped
+
+    def save(self):
+        """
+        Write the cache to disk if it was modified.
+        """
+        if not self.modified:
+            return
+        with atomic_write(self.path, 'wb') as _f:
+            pickle.dump((self.key, self.entries), _f, pickle.HIGHEST_PROTOCOL)
+        self.modified = False
@@ -0,0 +1,223 @@
+__author__ = 'clobo'
+
+import os
+import copy
+import mmap
+import errno
+import struct
+import gettext
+
+from mofile import MO_MAGIC, hashpjw
+
+_translations = {}
+
+
+class MMapTranslations(gettext.NullTranslations):
+    """
+    gettext translations read from a memory-mapped .mo file.
+
+    Unlike gettext.GNUTranslations, the file is not read into a dictionary when it is opened. Messages are looked up
+    through the hash table of the .mo file (the one written by msgfmt or by mofile.write_mo) when they are first
+    asked for and the result is kept. The mapping is read-only, so the pages of the file are shared by every process
+    that opens it.
+    """
+
+    def __init__(self, mo_path):
+        gettext.NullTranslations.__init__(self)
+        self.path = mo_path
+        with open(mo_path, 'rb') as _f:
+            self._mm = mmap.mmap(_f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = struct.unpack_from('<I', self._mm)[0]
+        if magic == MO_MAGIC:
+            endian = '<'
+        elif magic == struct.unpack('>I', struct.pack('<I', MO_MAGIC))[0]:
+            endian = '>'
+        else:
+            raise IOError(0, 'Bad magic number', mo_path)
+        self._uint = struct.Struct(endian + 'I')
+        self._pair = struct.Struct(endian + '2I')
+        version, self._n, self._originals, self._translations, self._hash_size, self._hash_offset = \
+            struct.unpack_from(endian + '6I', self._mm, 4)
+        if version >> 16 not in (0, 1):
+            raise IOError(0, 'Bad version number ' + str(version >> 16), mo_path)
+        self._cache = {}
+        self.plural = lambda n: int(n != 1)
+        metadata = self._lookup('')
+        if metadata:
+            self._parse_metadata(metadata)
+
+    def _parse_metadata(self, metadata):
+        # Same handling of the metadata as gettext.GNUTranslations
+        lastk = None
+        for item in metadata.split('\n'):
+            item = item.strip()
+            if not item:
+                continue
+            k = v = None
+            if ':' in item:
+                k, v = item.split(':', 1)
+                k = k.strip().lower()
+                v = v.strip()
+                self._info[k] = v
+                lastk = k
+            elif lastk:
+                self._info[lastk] += '\n' + item
+            if k == 'content-type':
+                self._charset = v.split('charset=')[1]
+            elif k == 'plural-forms':
+                v = v.split(';')
+                plural = v[1].split('plural=')[1]
+                self.plural = gettext.c2py(plural)
+
+    def close(self):
+        self._mm.close()
+
+    def _original(self, nstr):
+        length, offset = self._pair.unpack_from(self._mm, self._originals + nstr * 8)
+        # Plural entries are keyed by their singular msgid, followed by a \0 and the plural msgid
+        return self._mm[offset:offset + length].split('\0', 1)[0]
+
+    def _lookup(self, msgid):
+        """
+        :param msgid: message encoded in the charset of the catalog
+        :return: the translation (plural forms separated by \\0), None if the message is not in the catalog
+        """
+        try:
+            return self._cache[msgid]
+        except KeyError:
+            pass
+        nstr = None
+        mm = self._mm
+        if self._hash_size > 2:
+            size = self._hash_size
+            hval = hashpjw(msgid)
+            idx = hval % size
+            incr = 1 + hval % (size - 2)
+            while True:
+                entry = self._uint.unpack_from(mm, self._hash_offset + idx * 4)[0]
+                if entry == 0:
+                    break
+                if self._original(entry - 1) == msgid:
+                    nstr = entry - 1
+                    break
+                idx += incr
+                if idx >= size:
+                    idx -= size
+        else:
+            # No hash table (msgfmt --no-hash), the originals are sorted
+            lo, hi = 0, self._n
+            while lo < hi:
+                mid = (lo + hi) // 2
+                original = self._original(mid)
+                if original < msgid:
+                    lo = mid + 1
+                elif original > msgid:
+                    hi = mid
+                else:
+                    nstr = mid
+                    break
+        translation = None
+        if nstr is not None:
+            length, offset = self._pair.unpack_from(mm, self._translations + nstr * 8)
+            translation = mm[offset:offset + length]
+        self._cache[msgid] = translation
+        return translation
+
+    def _encode(self, message):
+        if isinstance(message, unicode):
+            return message.encode(self._charset or 'ascii')
+        return message
+
+    def _decode(self, tmsg):
+        return tmsg.decode(self._charset or 'ascii')
+
+    def gettext(self, message):
+        tmsg = self._lookup(self._encode(message))
+        if tmsg is None:
+            if self._fallback:
+                return self._fallback.gettext(message)
+            return message
+        if self._output_charset:
+            return self._decode(tmsg).encode(self._output_charset)
+        return tmsg
+
+    def lgettext(self, message):
+        tmsg = self._lookup(self._encode(message))
+        if tmsg is None:
+            if self._fallback:
+                return self._fallback.lgettext(message)
+            return message
+        return self._decode(tmsg).encode(self._output_charset or gettext.locale.getpreferredencoding())
+
+    def ugettext(self, message):
+        tmsg = self._lookup(self._encode(message))
+        if tmsg is None:
+            if self._fallback:
+                return self._fallback.ugettext(message)
+            return unicode(message)
+        return self._decode(tmsg)
+
+    def _plural(self, msgid1, n):
+        tmsg = self._lookup(self._encode(msgid1))
+        if tmsg is None:
+            return None
+        try:
+            return tmsg.split('\0')[self.plural(n)]
+        except IndexError:
+            return None
+
+    def ngettext(self, msgid1, msgid2, n):
+        tmsg = self._plural(msgid1, n)
+        if tmsg is None:
+            if self._fallback:
+                return self._fallback.ngettext(msgid1, msgid2, n)
+            return msgid1 if n == 1 else msgid2
+        if self._output_charset:
+            return self._decode(tmsg).encode(self._output_charset)
+        return tmsg
+
+    def lngettext(self, msgid1, msgid2, n):
+        tmsg = self._plural(msgid1, n)
+        if tmsg is None:
+            if self._fallback:
+                return self._fallback.lngettext(msgid1, msgid2, n)
+            return msgid1 if n == 1 else msgid2
+        return self._decode(tmsg).encode(self._output_charset or gettext.locale.getpreferredencoding())
+
+    def ungettext(self, msgid1, msgid2, n):
+        tmsg = self._plural(msgid1, n)
+        if tmsg is None:
+            if self._fallback:
+                return self._fallback.ungettext(msgid1, msgid2, n)
+            return unicode(msgid1 if n == 1 else msgid2)
+        return self._decode(tmsg)
+
+
+def translation(domain, localedir=None, languages=None, fallback=False):
+    """
+    Drop-in replacement of gettext.translation returning MMapTranslations. A .mo file is mapped once per process.
+
+    :param domain: name of the .mo files (the mo_name of the build)
+    :param localedir: directory holding <locale code>/LC_MESSAGES/<domain>.mo, ie. the build directory
+    :param languages: locale codes in order of preference, defaults to the environment (see gettext.find)
+    :param fallback: return gettext.NullTranslations instead of raising IOError when no .mo file is found
+    :return: MMapTranslations of the first language found, falling back to the others
+    """
+    mofiles = gettext.find(domain, localedir, languages, all=True)
+    if not mofiles:
+        if fallback:
+            return gettext.NullTranslations()
+        raise IOError(errno.ENOENT, 'No translation file found for domain', domain)
+    result = None
+    for mofile in mofiles:
+        key = os.path.abspath(mofile)
+        t = _translations.get(key)
+        if t is None:
+            t = _translations[key] = MMapTranslations(mofile)
+        # Copied so that the fallbacks of one translation do not affect the others, as gettext does
+        t = copy.copy(t)
+        if result is None:
+            result = t
+        else:
+            result.add_fallback(t)
+    return result
@@ -0,0 +1,128 @@
+__author__ = 'clobo'
+
+import re
+import json
+import collections
+
+from atomic import atomic_write
+
+# name: (regex, description). Phrases are checked in their PO-escaped form, as they appear in the tables.
+RULES = collections.OrderedDict((
+    ('empty_placeholder', (r'\{\}', 'Empty placeholder')),
+    ('trailing_newline', (r'\\n$', 'New line character at the end')),
+    ('trailing_colon', (r':$', 'Colon at the end')),
+))
+DEFAULT_RULES = ('empty_placeholder', 'trailing_newline')
+
+
+def _text(s):
+    """
+    :return: s as unicode for the JSON report. Phrases of tables that are not UTF-8 get replacement characters.
+    """
+    return s.decode('utf-8', 'replace') if isinstance(s, str) else s
+
+
+class Finding(object):
+    """
+    A phrase that breaks a tag quality rule, along with the file:line references of its tags.
+    """
+    __slots__ = ('rule', 'description', 'text', 'references')
+
+    def __init__(self, rule, description, text, references=()):
+        self.rule = rule
+        self.description = description
+        self.text = text
+        self.references = references
+
+    def __str__(self):
+        return '{}: {}: {}'.format(', '.join(self.references) or '?', self.description, self.text)
+
+    def as_dict(self):
+        return collections.OrderedDict((('rule', self.rule), ('description', _text(self.description)),
+                                        ('text', _text(self.text)),
+                                        ('references', [_text(r) for r in self.references])))
+
+
+class TagChecker(object):
+    """
+    Checks phrases against a set of rules in a single pass.
+
+    The rules are combined into one regex so that a phrase that breaks none of them (nearly all of them) is
+    searched only once. The rules are then searched separately for the phrases that matched to find which
+    ones they break. Rules with groups or inline flags, which would change meaning in the combined regex
+    (backreferences are renumbered and (?i) applies to the whole pattern), are always searched on their own.
+    Phrases are checked as they are extracted (see Catalog.from_messages and Catalog.read_po).
+    """
+
+    def __init__(self, rules=DEFAULT_RULES):
+        """
+        :param rules: names of RULES and / or (name, regex, description) of other rules
+        """
+        self.rules = []
+        for rule in rules:
+            if isinstance(rule, basestring):
+                regex, description = RULES[rule]
+            else:
+                rule, regex, description = rule
+            try:
+                self.rules.append((rule, re.compile(regex), description))
+            except re.error as e:
+                raise ValueError('Tag rule %s has an invalid regex %r: %s' % (rule, regex, e))
+        # Whether each rule is part of the combined regex
+        self._in_combined = [not r.groups and not r.flags for _, r, _ in self.rules]
+        combinable = [r.pattern for (_, r, _), combined in zip(self.rules, self._in_combined) if combined]
+        self._combined = re.compile('|'.join('(?:%s)' % p for p in combinable)) if combinable else None
+        self._separate = not all(self._in_combined)
+        self.findings = []
+
+    def __len__(self):
+        return len(self.findings)
+
+    def check(self, text, references=()):
+        """
+        Check a phrase against the rules.
+        :param text: PO-escaped phrase
+        :param references: file:line references of the phrase
+        :return: list of Finding for the rules the phrase breaks
+        """
+        matched = self._combined is not None and self._combined.search(text) is not None
+        if not matched and not self._separate:
+            return []
+        found = [Finding(name, description, text, references)
+                 for (name, regex, description), combined in zip(self.rules, self._in_combined)
+                 if (matched or not combined) and regex.search(text)]
+        self.findings.extend(found)
+        return found
+
+    def counts(self):
+        """
+        :return: {rule: number of findings}
+        """
+        counts = collections.OrderedDict((name, 0) for name, _, _ in self.rules)
+        for finding in self.findings:
+            counts[finding.rule] += 1
+        return counts
+
+    def report(self):
+        """
+        Print the findings.
+        :return: number of findings
+        """
+        for finding in self.findings:
+            print finding
+        print "%d Redundancy warnings found." % len(self.findings)
+        return len(self.findings)
+
+    def as_dict(self):
+        return collections.OrderedDict((('counts', self.counts()),
+                                        ('findings', [f.as_dict() for f in self.findings])))
+
+    def write_json(self, path):
+        """
+        Write the findings as JSON of {counts: {rule: n}, findings: [{rule, description, text, references}, ...]}
+        :param path: path of the report
+        :return: path
+        """
+        with atomic_write(path) as _f:
+            json.dump(self.as_dict(), _f, indent=2)
+        return path
@@ -5,10 +5,26 @@ import sys
 import subprocess
 import argparse
 import logging
-import re
+import time
+import tempfile
+import shutil
+import collections
+import multiprocessing
 
+from multiprocessing.pool import ThreadPool
 
-def extract_tags(directories, pofile_path, include_patterns=None, exclude_patterns=None, src_lang='python'):
+from pyextract import extract_messages, scan_files, collect_messages, write_template
+from extract_cache import ExtractionCache
+from atomic import atomic_write
+from pofile import iter_entries, write_po
+from catalog import Catalog
+from discovery import iter_source_files, DEFAULT_EXCLUDE_GLOBS
+from tag_rules import TagChecker, DEFAULT_RULES
+
+
+def extract_tags(directories, pofile_path, include_patterns=None, exclude_patterns=None, src_lang='python',
+                 batch_size=500, backend='xgettext', workers=None, cache_path=None,
+                 exclude_globs=DEFAULT_EXCLUDE_GLOBS):
     """
     Recursively iterate through directories and extract gettext tags.
     :param directories: Directory to iterate through (recursively) or list of directories (non recursive) 
@@ -16,114 +32,323 @@ def extract_tags(directories, pofile_path, include_patterns=None, exclude_patter
     :param include_patterns: regex patterns of files to include
     :param exclude_patterns: regex patterns of files to exclude
     :param src_lang: language of the source files (defaults to python)
+    :param batch_size: number of files handed to each xgettext call through --files-from.
+                       If None, xgettext is called once per file.
+    :param backend: 'xgettext' or 'python'. The python backend parses the source files in a pool of processes
+                    and writes the po file directly (src_lang must be python).
+    :param workers: number of processes used by the python backend, or number of shards of the files that are
+                    given to concurrent xgettext processes (defaults to the number of CPUs)
+    :param cache_path: path to a persistent extraction cache. When given, only new or modified files are scanned
+                       and the po file is rebuilt from the cache.
+    :param exclude_globs: gitignore-style globs of files and directories to exclude (see discovery.iter_source_files)
     :return: path to the po file
     """
-    if isinstance(directories, basestring):
-        directories = (directories, )
+    pofile_path = os.path.splitext(pofile_path)[0]
+    start = time.time()
+    source_files = iter_source_files(directories, include_patterns, exclude_patterns, exclude_globs)
+    if backend not in ('xgettext', 'python'):
+        raise ValueError('Unknown extraction backend: %s' % backend)
+    if backend == 'python' and src_lang != 'python':
+        raise ValueError('The python extraction backend cannot extract tags from %s source files' % src_lang)
 
-    recursive = len(directories) == 1
+    if cache_path is not None or backend == 'python':
+        messages = _extract_messages(source_files, src_lang, batch_size, backend, workers, cache_path)
+        if messages is None:
+            return None
+        if messages:
+            write_template(messages, pofile_path + '.po')
+    elif batch_size is None:
+        for fullpath in source_files:
+            if os.path.isfile(pofile_path + '.po'):
+                call_args = ('xgettext', fullpath, '--join-existing', '-L', src_lang, '--default-domain=%s' % pofile_path)
+                _fix_charset(pofile_path + '.po')
+            else:
+                # On the first call
+                call_args = ('xgettext', fullpath, '-L', src_lang, '--default-domain=%s' % pofile_path)
+            logging.debug('Searching %s' % fullpath)
+            result = subprocess.call(call_args, stdout=sys.stdout, stderr=sys.stderr)
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            shard_files = _xgettext_shards(list(source_files), os.path.join(tmp_dir, 'shard'), src_lang, batch_size,
+                                           workers)
+            if shard_files is None:
+                return None
+            if os.path.isfile(pofile_path + '.po'):
+                # Join the existing po file, as xgettext --join-existing would
+                shard_files.insert(0, pofile_path + '.po')
+            if shard_files:
+                merge_po_files(shard_files, pofile_path + '.po')
+        finally:
+            shutil.rmtree(tmp_dir)
+    logging.info('Extracted tags in %.2f seconds' % (time.time() - start))
+    return pofile_path + '.po'
 
-    pofile_path = os.path.splitext(pofile_path)[0]
-    for directory in directories:
-        for top, dirs, files in os.walk(directory):
-            for f in files:
-                fullpath = os.path.join(top, f)
-                skip = False
-                # If no include patterns are provided, always call gettext on the file
-                do_call = False if include_patterns else True
-
-                # Exclude files that match the exclude_patterns regex
-                if exclude_patterns:
-                    for exc in exclude_patterns:
-                        if re.match(exc, fullpath):
-                            skip = True
-                            break
-                if skip:
+
+def extract_catalog(directories, include_patterns=None, exclude_patterns=None, src_lang='python', batch_size=500,
+                    backend='xgettext', workers=None, cache_path=None, pofile_path=None, stats=None, checker=None,
+                    exclude_globs=DEFAULT_EXCLUDE_GLOBS):
+    """
+    Extract gettext tags into an untranslated translation table held in memory.
+
+    The messages found by the python backend or kept in the extraction cache are used directly, xgettext
+    is otherwise run over the files and its po file is parsed once.
+    Takes the same parameters as extract_tags.
+    :param pofile_path: if given, the po template is also written to this path
+    :param stats: dictionary filled with the number of source 'files' and of 'files_scanned' (files that were not
+                  in the extraction cache or changed), when they are known
+    :param checker: TagChecker the phrases are checked with as they are extracted
+    :return: Catalog or None if the extraction failed
+    """
+    if cache_path is None and backend == 'xgettext':
+        tmp_dir = None
+        if pofile_path is None:
+            tmp_dir = tempfile.mkdtemp()
+            pofile_path = os.path.join(tmp_dir, 'messages.po')
+        try:
+            pofile_path = extract_tags(directories, pofile_path, include_patterns=include_patterns,
+                                       exclude_patterns=exclude_patterns, src_lang=src_lang,
+                                       batch_size=batch_size, backend=backend, workers=workers,
+                                       exclude_globs=exclude_globs)
+            if pofile_path is None:
+                return None
+            if not os.path.isfile(pofile_path):
+                # No tags were found
+                return Catalog()
+            return Catalog.read_po(pofile_path, translations=False, checker=checker)
+        finally:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir)
+
+    start = time.time()
+    if backend not in ('xgettext', 'python'):
+        raise ValueError('Unknown extraction backend: %s' % backend)
+    if backend == 'python' and src_lang != 'python':
+        raise ValueError('The python extraction backend cannot extract tags from %s source files' % src_lang)
+    source_files = iter_source_files(directories, include_patterns, exclude_patterns, exclude_globs)
+    messages = _extract_messages(source_files, src_lang, batch_size, backend, workers, cache_path, stats)
+    if messages is None:
+        return None
+    if messages and pofile_path is not None:
+        write_template(messages, os.path.splitext(pofile_path)[0] + '.po')
+    logging.info('Extracted tags in %.2f seconds' % (time.time() - start))
+    return Catalog.from_messages(messages, checker=checker)
+
+
+def _extract_messages(source_files, src_lang, batch_size, backend, workers, cache_path, stats=None):
+    """
+    Extract the messages of the source files in memory with the python backend and / or the extraction cache.
+    :return: OrderedDict of {(msgctxt, msgid): Message} or None if xgettext failed
+    """
+    if stats is None:
+        stats = {}
+    if cache_path is None:
+        # The files are scanned as they are found
+        return extract_messages(_counted(source_files, stats), workers=workers)
+
+    source_files = list(source_files)
+    stats['files'] = len(source_files)
+
+    cache = ExtractionCache(cache_path, backend, src_lang)
+    stale = cache.stale_files(source_files)
+    removed = cache.prune(source_files)
+    logging.info('%d of %d files changed since the last extraction, %d removed'
+                 % (len(stale), len(source_files), removed))
+    stats['files_scanned'] = len(stale)
+    if stale:
+        if backend == 'python':
+            scanned = scan_files(stale, workers=workers)
+        else:
+            scanned = _xgettext_scan(stale, src_lang, batch_size or 1, workers)
+            if scanned is None:
+                return None
+        cache.update(scanned)
+    cache.save()
+    return collect_messages(cache.scanned(source_files))
+
+
+def _counted(source_files, stats):
+    """
+    Pass the source files through, counting them in stats.
+    """
+    stats['files'] = stats['files_scanned'] = 0
+    for path in source_files:
+        stats['files'] += 1
+        stats['files_scanned'] += 1
+        yield path
+
+
+def _xgettext_scan(files, src_lang, batch_size, workers=None):
+    """
+    Run xgettext over a list of files and attribute the messages found back to each file using the
+    source references of the po file.
+    :param files: list of source file paths
+    :param src_lang: language of the source files
+    :param batch_size: number of files handed to each xgettext call
+    :param workers: number of concurrent xgettext processes
+    :return: list of (path, [(msgctxt, msgid, msgid_plural, lineno), ...]) or None if xgettext failed
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        shard_files = _xgettext_shards(files, os.path.join(tmp_dir, 'scan'), src_lang, batch_size, workers)
+        if shard_files is None:
+            return None
+        found = dict((f, []) for f in files)
+        for shard_file in shard_files:
+            for entry in iter_entries(shard_file, decode=True):
+                if entry.is_header:
                     continue
+                for ref in entry.references:
+                    path, _, lineno = ref.rpartition(':')
+                    if path in found:
+                        found[path].append((int(lineno), entry.msgctxt, entry.msgid, entry.msgid_plural))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return [(f, [(msgctxt, msgid, msgid_plural, lineno) for lineno, msgctxt, msgid, msgid_plural in sorted(found[f])])
+            for f in files]
 
-                if include_patterns:
-                    for inc in include_patterns:
-                        do_call = re.match(inc, fullpath)
-                        if do_call:
-                            break
 
-                if do_call:
+def _xgettext_shards(files, pofile_path, src_lang, batch_size, workers=None):
+    """
+    Split the files into contiguous shards and run xgettext over the shards concurrently. The files of a shard are
+    handed to xgettext in batches that are joined into the po file of the shard.
+    :param files: list of source file paths
+    :param pofile_path: path prefix of the po files of the shards (without extension)
+    :param src_lang: language of the source files
+    :param batch_size: number of files handed to each xgettext call
+    :param workers: number of shards (defaults to the number of CPUs)
+    :return: paths of the po files of the shards in order (shards without tags have none), None if xgettext failed
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    size = max(1, -(-len(files) // max(1, workers)))
+    shards = [(ii, files[ii: ii + size], '%s%d' % (pofile_path, n)) for n, ii in enumerate(xrange(0, len(files), size))]
 
-                    if os.path.isfile(pofile_path + '.po'):
-                        call_args = ('xgettext', fullpath, '--join-existing', '-L', src_lang, '--default-domain=%s' % pofile_path)
-                        with open(pofile_path + '.po', 'r') as _po:
-                            po_lines = _po.readlines()
+    def run(shard):
+        offset, shard_files, shard_path = shard
+        for ii in xrange(0, len(shard_files), batch_size):
+            if not _xgettext_batch(shard_files[ii: ii + batch_size], shard_path, src_lang):
+                logging.error('xgettext failed on files %d to %d' % (offset + ii, offset + ii + batch_size))
+                return False
+        return True
 
-                        for ii, line in enumerate(po_lines):
-                            if "Content-Type" in line:
-                                po_lines[ii] = line.replace("CHARSET", "ASCII")
+    if len(shards) > 1:
+        # The threads only wait on the xgettext processes
+        pool = ThreadPool(len(shards))
+        try:
+            succeeded = pool.map(run, shards)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        succeeded = map(run, shards)
+    if not all(succeeded):
+        return None
+    return [path + '.po' for _, _, path in shards if os.path.isfile(path + '.po')]
 
-                        with open(pofile_path + '.po', 'w') as _po:
-                            _po.writelines(po_lines)
 
-                    else:
-                        # On the first call
-                        call_args = ('xgettext', fullpath, '-L', src_lang, '--default-domain=%s' % pofile_path)
-                    logging.debug('Searching %s' % fullpath)
-                    result = subprocess.call(call_args, stdout=sys.stdout, stderr=sys.stderr)
+def merge_po_files(po_paths, po_path):
+    """
+    Merge po templates into one. Entries are identified by their msgctxt and msgid and keep the order in which they
+    first appear; the references, flags and comments of duplicates are combined.
+    :param po_paths: paths of the po files, in order
+    :param po_path: path of the merged po file
+    :return: po_path
+    """
+    header = None
+    merged = collections.OrderedDict()
+    for path in po_paths:
+        for entry in iter_entries(path):
+            if entry.is_header:
+                # Non-ASCII sources make xgettext declare UTF-8 rather than the CHARSET placeholder
+                if header is None or 'CHARSET' in header.msgstr:
+                    header = entry
+                continue
+            existing = merged.get((entry.msgctxt, entry.msgid))
+            if existing is None:
+                merged[(entry.msgctxt, entry.msgid)] = entry
+                continue
+            seen = set(existing.references)
+            existing.references.extend(r for r in entry.references if r not in seen)
+            existing.flags.extend(f for f in entry.flags if f not in existing.flags)
+            existing.comments.extend(c for c in entry.comments if c not in existing.comments)
+            if existing.msgid_plural is None:
+                existing.msgid_plural = entry.msgid_plural
+    write_po(([header] if header is not None else []) + merged.values(), po_path)
+    _fix_charset(po_path)
+    return po_path
 
-            if not recursive:
-                # Do not walk into sub-directories
-                break
-        return pofile_path + '.po'
 
+def _xgettext_batch(files, pofile_path, src_lang):
+    """
+    Run a single xgettext call over a list of files, joining the results with the existing po file.
+    :param files: list of source file paths
+    :param pofile_path: path to the po file (without extension)
+    :param src_lang: language of the source files
+    :return: True if xgettext succeeded
+    """
+    call_args = ['xgettext', '-L', src_lang, '--default-domain=%s' % pofile_path]
+    if os.path.isfile(pofile_path + '.po'):
+        # xgettext refuses to join a file with a CHARSET placeholder, fix it before every subsequent batch
+        _fix_charset(pofile_path + '.po')
+        call_args.append('--join-existing')
 
-def test_tag_quality(pofile_path):
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as files_from:
+        files_from.write('\n'.join(files) + '\n')
+    call_args.append('--files-from=%s' % files_from.name)
+    try:
+        logging.debug('Searching %d files' % len(files))
+        result = subprocess.call(call_args, stdout=sys.stdout, stderr=sys.stderr)
+    finally:
+        os.remove(files_from.name)
+    return result == 0
+
+
+def _fix_charset(po_path):
+    """
+    Replace the CHARSET placeholder in the Content-Type header written by xgettext.
+    :param po_path: path to the po file
     """
-    Checks several conditions to reduce redundancy in the po file:
+    with open(po_path, 'r') as _po:
+        po_lines = _po.readlines()
+
+    for ii, line in enumerate(po_lines):
+        if "Content-Type" in line:
+            po_lines[ii] = line.replace("CHARSET", "ASCII")
+
+    with atomic_write(po_path) as _po:
+        _po.writelines(po_lines)
+
+
+def test_tag_quality(pofile_path, rules=DEFAULT_RULES):
+    """
+    Checks several conditions to reduce redundancy in the po file (see tag_rules.RULES):
 
     - Checks for empty place holders, ie {} in str.format()
     - Checks for lines ending with \n
-    - Checks for lines ending with :
+    - Checks for lines ending with : (not part of the default rules)
+
+    The build checks the phrases as they are extracted instead, see extract_catalog.
 
-    :param pofile_path: path to po file
+    :param pofile_path: path to po file or Catalog
+    :param rules: rules to check, names of tag_rules.RULES and / or (name, regex, description)
     :return: number of warnings
 
     """
-    pofile_path = os.path.splitext(pofile_path)[0] + '.po'
-    warnings = 0
-    re_empty_bracket = re.compile(r'\".*\{\}.*\"$')
-    re_new_line_char = re.compile(r'\".*\\n\"$')
-    # re_ends_with_colon = re.compile(r'\".*:\"$')
-    msgstr, msgid = [], []
-    append_to = None
-    with open(pofile_path, 'r') as _po:
-        for ii, line in enumerate(_po):
-            if line.startswith('msgstr'):
-                append_to = msgstr
-            elif line.startswith('msgid'):
-                append_to = msgid
-
-            if append_to is not None:
-                append_to.append(line)
-
-            if line == '\n':
-                append_to = None
-
-                _msgid = ''.join(msgid)
-                _msgstr = ''.join(msgstr)
-
-                if _msgid != 'msgid ""\n':
-                    for txt in (_msgid, _msgstr):
-                        if re.findall(re_empty_bracket, txt):
-                            print "Empty placeholder in line {}: {}".format(ii, txt.strip())
-                            warnings += 1
-                        if re.findall(re_new_line_char, txt):
-                            print "New line character found in line {}: {}".format(ii, txt.strip())
-                            warnings += 1
-                        # if re.findall(re_ends_with_colon, txt):
-                        #     print "Colon detected at the end of line {}: {}".format(ii, txt.strip())
-                            warnings += 1
-                del msgid[:]
-                del msgstr[:]
-
-    print "%d Redundancy warnings found." % warnings
-    return warnings
+    checker = TagChecker(rules)
+    if isinstance(pofile_path, Catalog):
+        # Report the line of the phrase in the csv table
+        for ii, (msgid, msgstr, comment) in enumerate(pofile_path):
+            for txt in (msgid, msgstr):
+                checker.check(txt, ('line %d' % (ii + 2), ))
+    else:
+        po_path = os.path.splitext(pofile_path)[0] + '.po'
+        for entry in iter_entries(po_path):
+            if entry.is_header or entry.obsolete:
+                continue
+            for txt in (entry.msgid, entry.msgstr):
+                checker.check(txt, entry.references or ('%s:%d' % (po_path, entry.lineno), ))
+    return checker.report()
 
 if __name__ == '__main__':
 
@@ -132,13 +357,22 @@ if __name__ == '__main__':
     parser.add_argument("outfile", help="outpul po file path")
     parser.add_argument("--include_patterns", action='append', help="list of regex expressions for files to include")
     parser.add_argument("--exclude_patterns", help="list of regex expressions for files to exclude")
+    parser.add_argument("--exclude_globs", action='append',
+                        help="gitignore-style globs of files and directories to exclude")
+    parser.add_argument("--batch_size", type=int, default=500,
+                        help="number of files passed to each xgettext call, 0 to call xgettext once per file")
+    parser.add_argument("--backend", default='xgettext', choices=('xgettext', 'python'),
+                        help="tool used to extract the tags")
     args = parser.parse_args()
 
     po_path = os.path.splitext(args.outfile)[0] + '.po'
     if os.path.isfile(po_path):
         os.remove(po_path)
-    extract_tags(directory=args.directory,
-            pofile_path=args.outfile,
-            include_patterns=args.include_patterns,
-            exclude_patterns=args.exclude_patterns)
+    extract_tags(directories=args.directory,
+                 pofile_path=args.outfile,
+                 include_patterns=args.include_patterns,
+                 exclude_patterns=args.exclude_patterns,
+                 exclude_globs=DEFAULT_EXCLUDE_GLOBS if args.exclude_globs is None else args.exclude_globs,
+                 batch_size=args.batch_size or None,
+                 backend=args.backend)
     test_tag_quality(po_path)
@@ -0,0 +1,12 @@
+from gettext import gettext, ngettext, dgettext
+
+
+def greet(name, count):
+    yield _('Hello')
+    yield _("Goodbye")
+    yield gettext('Welcome, %s') % name
+    yield _('Line one\nLine two')
+    yield _('Tab\tand "quotes"')
+    yield ngettext('%d file', '%d files', count) % count
+    yield dgettext('errors', 'Not found')
+    yield _('Concatenated ' 'string')
@@ -0,0 +1,14 @@
+from gettext import ungettext, dngettext
+
+
+class Panel(object):
+    title = _('Hello')
+
+    def labels(self):
+        return [_('Save'), _('Cancel')]
+
+    def status(self, count):
+        return ungettext('%d item', '%d items', count) % count
+
+    def errors(self, count):
+        return dngettext('errors', '%d error', '%d errors', count) % count
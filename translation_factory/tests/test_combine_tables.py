@@ -0,0 +1,171 @@
+"""
+The master table store: the phrases missing a translation, the coverage of each locale, the store written and read
+back, and the tables exported from it.
+"""
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+
+from translation_factory.factory import build
+from translation_factory.combine_tables import MasterTable, create_master_table, store_path
+
+SAMPLE_TREE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_tree')
+LOCALES = [('Spanish', 'es_ES'), ('French', 'fr_FR')]
+
+# {locale: {phrase: (translation, comment)}} of the sample tree, the other phrases are left untranslated
+TRANSLATIONS = {'es_ES': {'%d file': ('%d archivo', ''),
+                          'Cancel': ('Cancelar', 'Button'),
+                          'Goodbye': ('Adi\xc3\xb3s', ''),
+                          'Hello': ('Hola', 'Greeting, said "once"'),
+                          r'Line one\nLine two': ('L\xc3\xadnea uno\\nL\xc3\xadnea dos', ''),
+                          'Save': ('Guardar', '')},
+                'fr_FR': {'%d file': ('%d fichier', ''),
+                          'Cancel': ('Annuler', 'Bouton\nde dialogue'),
+                          'Hello': ('Bonjour', ''),
+                          'Welcome, %s': ('Bienvenue, %s', 'Comma'),
+                          'Not found': ('Introuvable', '')}}
+
+# all_translations.csv and missing_translations.csv written from the tables above by the baseline combine_tables
+ALL_TRANSLATIONS = '''Original Text,Spanish (es_ES),French (fr_FR),Additional Comments\r
+%d error,,,\r
+%d file,%d archivo,%d fichier,\r
+%d item,,,\r
+Cancel,Cancelar,Annuler,"Spanish (es_ES): Button
+French (fr_FR): Bouton
+de dialogue"\r
+Concatenated string,,,\r
+Goodbye,Adi\xc3\xb3s,,\r
+Hello,Hola,Bonjour,"Spanish (es_ES): Greeting, said ""once"""\r
+Line one\\nLine two,L\xc3\xadnea uno\\nL\xc3\xadnea dos,,\r
+Not found,,Introuvable,\r
+Save,Guardar,,\r
+"Tab\\tand \\""quotes\\""",,,\r
+"Welcome, %s",,"Bienvenue, %s",French (fr_FR): Comma\r
+'''
+MISSING_TRANSLATIONS = '''Original Text,Spanish (es_ES),French (fr_FR)\r
+%d error,%d error,%d error\r
+%d item,%d item,%d item\r
+Concatenated string,Concatenated string,Concatenated string\r
+Goodbye,,Goodbye\r
+Line one\\nLine two,,Line one\\nLine two\r
+Not found,Not found,\r
+Save,,Save\r
+"Tab\\tand \\""quotes\\""","Tab\\tand \\""quotes\\""","Tab\\tand \\""quotes\\"""\r
+"Welcome, %s","Welcome, %s",\r
+'''
+
+
+def table_path(build_dir, code, application_name='Sample'):
+    language = dict((c, l) for l, c in LOCALES)[code]
+    return os.path.join(build_dir, code, '%s - %s.csv' % (application_name, language))
+
+
+def read(path):
+    with open(path, 'rb') as _f:
+        return _f.read()
+
+
+def translate(build_dir, code, translations):
+    """
+    Fill the translations and comments of the table of a locale, keeping the order of its rows.
+    """
+    path = table_path(build_dir, code)
+    with open(path, 'rb') as _f:
+        rows = list(csv.reader(_f))
+    for row in rows[1:]:
+        row[1:3] = translations.get(row[0], ('', ''))
+    with open(path, 'wb') as _f:
+        csv.writer(_f).writerows(rows)
+
+
+class MasterTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The tables of the sample tree are built once and copied for each test
+        cls.sample_dir = tempfile.mkdtemp()
+        build(SAMPLE_TREE, 'Sample', LOCALES, os.path.join(cls.sample_dir, 'build'), extract_backend='python')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.sample_dir)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.build_dir = os.path.join(self.tmp_dir, 'build')
+        shutil.copytree(os.path.join(self.sample_dir, 'build'), self.build_dir)
+        for code, translations in TRANSLATIONS.iteritems():
+            translate(self.build_dir, code, translations)
+        self.all_path = os.path.join(self.build_dir, 'all_translations.csv')
+        self.missing_path = os.path.join(self.build_dir, 'missing_translations.csv')
+        self.store = create_master_table(self.build_dir, 'Sample', LOCALES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_export(self):
+        self.assertEqual(read(self.all_path), ALL_TRANSLATIONS)
+        self.assertEqual(read(self.missing_path), MISSING_TRANSLATIONS)
+        # The files are not written again while the tables do not change
+        self.assertTrue(MasterTable(store_path(self.build_dir, 'Sample')).exported(self.all_path, self.missing_path))
+
+    def test_missing(self):
+        self.assertEqual(self.store.missing('es_ES'), ['%d error', '%d item', 'Concatenated string', 'Not found',
+                                                       r'Tab\tand \"quotes\"', 'Welcome, %s'])
+        self.assertEqual(self.store.missing('fr_FR'), ['%d error', '%d item', 'Concatenated string', 'Goodbye',
+                                                       r'Line one\nLine two', 'Save', r'Tab\tand \"quotes\"'])
+        self.assertRaises(KeyError, self.store.missing, 'de_DE')
+
+    def test_coverage(self):
+        self.assertEqual(len(self.store), 12)
+        self.assertEqual(self.store.coverage().items(), [('es_ES', (6, 12)), ('fr_FR', (5, 12))])
+
+    def test_store(self):
+        store = MasterTable(store_path(self.build_dir, 'Sample'))
+        self.assertEqual(store.coverage(), self.store.coverage())
+        for code in ('es_ES', 'fr_FR'):
+            self.assertEqual(store.missing(code), self.store.missing(code))
+        rows, expected_rows = store.rows(), self.store.rows()
+        self.assertEqual([store.msgids[ii] for ii in rows], [self.store.msgids[ii] for ii in expected_rows])
+        for code, column in store.columns.iteritems():
+            expected = self.store.columns[code]
+            self.assertEqual([column.get(ii) for ii in rows], [expected.get(ii) for ii in expected_rows])
+            self.assertEqual(column.comments, expected.comments)
+        # Only the tables that changed are read again
+        self.assertEqual(store.refresh(self.build_dir, 'Sample', LOCALES), [])
+        translate(self.build_dir, 'fr_FR', dict(TRANSLATIONS['fr_FR'], Goodbye=('Au revoir', '')))
+        os.utime(table_path(self.build_dir, 'fr_FR'), (0, 0))
+        self.assertEqual(store.refresh(self.build_dir, 'Sample', LOCALES), ['fr_FR'])
+        self.assertNotIn('Goodbye', store.missing('fr_FR'))
+        self.assertEqual(store.coverage()['fr_FR'], (6, 12))
+        store.save()
+        self.assertEqual(MasterTable(store.path).coverage(), store.coverage())
+
+    def test_removed(self):
+        # A locale without a table is dropped, and so are the phrases that were only in its table
+        os.remove(table_path(self.build_dir, 'es_ES'))
+        with open(table_path(self.build_dir, 'fr_FR'), 'rb') as _f:
+            rows = list(csv.reader(_f))
+        with open(table_path(self.build_dir, 'fr_FR'), 'wb') as _f:
+            csv.writer(_f).writerows([row for row in rows if row[0] != 'Goodbye'])
+        store = create_master_table(self.build_dir, 'Sample', LOCALES)
+        self.assertEqual(store.coverage().items(), [('fr_FR', (5, 11))])
+        self.assertEqual(MasterTable(store.path).coverage(), store.coverage())
+        with open(self.all_path, 'rb') as _f:
+            rows = list(csv.reader(_f))
+        self.assertEqual(rows[0], ['Original Text', 'French (fr_FR)', 'Additional Comments'])
+        self.assertNotIn('Goodbye', [row[0] for row in rows])
+
+    def test_unreadable_store(self):
+        with open(self.store.path, 'wb') as _f:
+            _f.write('not a store')
+        store = MasterTable(self.store.path)
+        self.assertEqual((len(store), store.coverage().items()), (0, []))
+        self.assertEqual(create_master_table(self.build_dir, 'Sample', LOCALES).coverage(), self.store.coverage())
+        self.assertEqual(read(self.all_path), ALL_TRANSLATIONS)
+
+
+if __name__ == '__main__':
+    unittest.main()
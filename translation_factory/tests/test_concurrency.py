@@ -0,0 +1,19 @@
+"""
+Builds sharing a build directory, some of them killed part way through, must leave it complete and consistent (see
+benchmarks/concurrency.py, which runs the same stress test at a larger scale).
+"""
+import unittest
+
+from translation_factory.benchmarks.concurrency import stress
+
+
+class ConcurrentBuildsTest(unittest.TestCase):
+
+    def test_concurrent_builds(self):
+        elapsed, failed, problems = stress(builds=8, rounds=3, kill=2, files=50, locales=4, workers=2)
+        self.assertEqual(failed, 0)
+        self.assertEqual(problems, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
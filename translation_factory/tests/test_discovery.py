@@ -0,0 +1,128 @@
+"""
+Discovery of the source files: gitignore-style globs and the directories that are not descended into.
+"""
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from translation_factory import discovery
+from translation_factory.discovery import glob_to_regex, iter_source_files
+
+# (glob, {relative path: matched}). Directories are given with a trailing /, as iter_source_files matches them.
+GLOBS = [('*.pyc', {'app.pyc': True, 'pkg/app.pyc': True, 'app.py': False, 'app.pyc.txt': False}),
+         ('test_?.py', {'test_a.py': True, 'pkg/test_b.py': True, 'test_ab.py': False, 'test_/.py': False}),
+         ('*.py[co]', {'a.pyc': True, 'a.pyo': True, 'a.pyd': False}),
+         ('[!a]*.py', {'b.py': True, 'a.py': False, 'pkg/c.py': True}),
+         ('a.b+c', {'a.b+c': True, 'axb+c': False, 'a.bbc': False}),
+         # Without a / the glob matches at any depth, directories and what they hold included
+         ('build', {'build': True, 'build/': True, 'pkg/build/': True, 'build/x.py': True, 'builder.py': False}),
+         # A leading / anchors the glob to the searched directory
+         ('/app.py', {'app.py': True, 'pkg/app.py': False, 'app.pyc': False}),
+         ('/build/', {'build/': True, 'pkg/build/': False}),
+         # A / within the glob anchors it too
+         ('pkg/*.py', {'pkg/a.py': True, 'pkg/sub/a.py': False, 'other/pkg/a.py': False}),
+         # A trailing / only matches directories
+         ('docs/', {'docs/': True, 'pkg/docs/': True, 'docs': False, 'docs.py': False}),
+         # ** matches across directories, none included
+         ('**/test_*.py', {'test_a.py': True, 'pkg/sub/test_a.py': True, 'pkg/a_test.py': False}),
+         ('pkg/**/generated', {'pkg/generated': True, 'pkg/a/b/generated': True, 'generated': False,
+                               'other/pkg/generated': False}),
+         ('pkg/**', {'pkg/': True, 'pkg/a.py': True, 'pkg/sub/a.py': True, 'pkg.py': False}),
+         ('**/node_modules/', {'node_modules/': True, 'web/node_modules/': True, 'node_modules.py': False})]
+
+TREE = ['app.py', 'app.pyc', 'README.txt', 'docs.py', 'build/out.py', 'docs/conf.py',
+        'pkg/__init__.py', 'pkg/widgets.py', 'pkg/build/gen.py', 'pkg/docs/index.py', 'pkg/sub/deep.py',
+        'pkg/sub/test_deep.py', 'node_modules/lib/index.py', '.git/hooks/pre-commit.py', 'zeta/z.py']
+PKG = ['pkg/__init__.py', 'pkg/widgets.py', 'pkg/build/gen.py', 'pkg/docs/index.py', 'pkg/sub/deep.py',
+       'pkg/sub/test_deep.py']
+
+# (exclude globs, files excluded, directories not descended into)
+EXCLUDES = [(['*.pyc', '*.txt'], ['app.pyc', 'README.txt'], []),
+            (['build'], ['build/out.py', 'pkg/build/gen.py'], ['build', 'pkg/build']),
+            (['/build/'], ['build/out.py'], ['build']),
+            (['docs/'], ['docs/conf.py', 'pkg/docs/index.py'], ['docs', 'pkg/docs']),
+            (['/pkg/sub'], ['pkg/sub/deep.py', 'pkg/sub/test_deep.py'], ['pkg/sub']),
+            (['pkg/**/*.py'], PKG, []),
+            (['**/test_*.py'], ['pkg/sub/test_deep.py'], []),
+            (['pkg/**'], PKG, ['pkg']),
+            (['**/node_modules/', '.git/'], ['node_modules/lib/index.py', '.git/hooks/pre-commit.py'],
+             ['node_modules', '.git']),
+            ([], [], [])]
+
+
+class GlobTest(unittest.TestCase):
+
+    def test_globs(self):
+        for glob, paths in GLOBS:
+            regex = re.compile(glob_to_regex(glob))
+            for path, matched in sorted(paths.items()):
+                self.assertEqual(regex.match(path) is not None, matched, '%s %s' % (glob, path))
+
+
+class IterSourceFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        for path in TREE:
+            path = os.path.join(self.tmp_dir, *path.split('/'))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+        # Directories that are listed, to check that excluded directories are not descended into
+        self.listed = []
+        self._scandir = discovery._scandir
+
+        def listing(directory):
+            self.listed.append(self.relative(directory))
+            return self._scandir(directory)
+        discovery._scandir = listing
+
+    def tearDown(self):
+        discovery._scandir = self._scandir
+        shutil.rmtree(self.tmp_dir)
+
+    def relative(self, path):
+        return os.path.relpath(path, self.tmp_dir).replace(os.sep, '/')
+
+    def files(self, directories=None, **kwargs):
+        del self.listed[:]
+        return [self.relative(path) for path in iter_source_files(directories or self.tmp_dir, **kwargs)]
+
+    def test_default_excludes(self):
+        # Files of a directory come before the files of its sub-directories, each sorted by name
+        self.assertEqual(self.files(), ['README.txt', 'app.py', 'app.pyc', 'docs.py', 'build/out.py', 'docs/conf.py'] +
+                         PKG + ['zeta/z.py'])
+        self.assertNotIn('.git', self.listed)
+        self.assertNotIn('node_modules', self.listed)
+
+    def test_exclude_globs(self):
+        every_file = self.files(exclude_globs=())
+        self.assertEqual(sorted(every_file), sorted(TREE))
+        for globs, excluded, pruned in EXCLUDES:
+            self.assertEqual(self.files(exclude_globs=globs), [f for f in every_file if f not in excluded], globs)
+            for directory in pruned:
+                self.assertNotIn(directory, self.listed, globs)
+
+    def test_patterns(self):
+        sep = re.escape(os.sep)
+        files = self.files(include_patterns=[r'.*\.py$'], exclude_patterns=[r'.*%spkg%ssub%s' % (sep, sep, sep)])
+        self.assertEqual(files, ['app.py', 'docs.py', 'build/out.py', 'docs/conf.py'] + PKG[:4] + ['zeta/z.py'])
+        self.assertNotIn('pkg/sub', self.listed)
+
+    def test_not_recursive(self):
+        files = self.files([self.tmp_dir, os.path.join(self.tmp_dir, 'pkg')], exclude_globs=['*.pyc'])
+        self.assertEqual(files, ['README.txt', 'app.py', 'docs.py', 'pkg/__init__.py', 'pkg/widgets.py'])
+        self.assertEqual(self.listed, ['.', 'pkg'])
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'symbolic links are not supported')
+    def test_symlinks(self):
+        # Symbolic links to directories are not followed, as with os.walk
+        os.symlink(os.path.join(self.tmp_dir, 'pkg'), os.path.join(self.tmp_dir, 'link'))
+        self.assertEqual([f for f in self.files() if f.startswith('link/')], [])
+        self.assertNotIn('link', self.listed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+The python extraction backend must find the same messages as xgettext in the sample tree (tests/sample_tree).
+
+    python -m unittest discover translation_factory/tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from distutils.spawn import find_executable
+
+from translation_factory.tags import extract_tags
+from translation_factory.pofile import iter_entries
+
+SAMPLE_TREE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_tree')
+
+# {msgid: (msgid_plural, references)} of the sample tree
+EXPECTED = {'Hello': (None, ['app.py:5', 'widgets/panel.py:5']),
+            'Goodbye': (None, ['app.py:6']),
+            'Welcome, %s': (None, ['app.py:7']),
+            'Line one\nLine two': (None, ['app.py:8']),
+            'Tab\tand "quotes"': (None, ['app.py:9']),
+            '%d file': ('%d files', ['app.py:10']),
+            'Not found': (None, ['app.py:11']),
+            'Concatenated string': (None, ['app.py:12']),
+            'Save': (None, ['widgets/panel.py:8']),
+            'Cancel': (None, ['widgets/panel.py:8']),
+            '%d item': ('%d items', ['widgets/panel.py:11']),
+            '%d error': ('%d errors', ['widgets/panel.py:14'])}
+
+
+def read_messages(po_path):
+    """
+    :return: dictionary of {msgid: (msgid_plural, sorted references relative to the sample tree)} of a po file
+    """
+    messages = {}
+    for entry in iter_entries(po_path, decode=True):
+        if entry.is_header:
+            continue
+        references = sorted(os.path.relpath(path, SAMPLE_TREE) + ':' + lineno
+                            for path, _, lineno in (ref.rpartition(':') for ref in entry.references))
+        messages[entry.msgid] = (entry.msgid_plural, references)
+    return messages
+
+
+class ExtractionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def extract(self, name, **options):
+        return read_messages(extract_tags(SAMPLE_TREE, os.path.join(self.tmp_dir, name + '.po'), workers=1,
+                                          **options))
+
+    def test_python_backend(self):
+        self.assertEqual(self.extract('python', backend='python'), EXPECTED)
+
+    def test_python_backend_cached(self):
+        cache_path = os.path.join(self.tmp_dir, 'extraction.cache')
+        for name in ('first', 'cached'):
+            self.assertEqual(self.extract(name, backend='python', cache_path=cache_path), EXPECTED)
+
+    @unittest.skipIf(find_executable('xgettext') is None, 'xgettext is not installed')
+    def test_xgettext_backend(self):
+        python = self.extract('python', backend='python')
+        self.assertEqual(self.extract('xgettext'), python)
+        self.assertEqual(self.extract('xgettext_cached', cache_path=os.path.join(self.tmp_dir, 'xgettext.cache')),
+                         python)
+
+
+if __name__ == '__main__':
+    unittest.main()
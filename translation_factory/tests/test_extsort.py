@@ -0,0 +1,110 @@
+"""
+Sorting within a memory budget: the runs spilled to temporary files and merged must give the same rows as sorted()
+and, once duplicates are dropped, the same translations as reading the whole table.
+"""
+import os
+import csv
+import random
+import shutil
+import tempfile
+import unittest
+
+from translation_factory import extsort
+from translation_factory.extsort import external_sort, unique
+from translation_factory.csv_to_po import csv_to_po
+from translation_factory.pofile import iter_entries
+
+
+def random_rows(n, seed=0):
+    """
+    :return: list of (msgid, msgstr) with many msgids repeated and some translations missing
+    """
+    rng = random.Random(seed)
+    words = ['apple', 'Banana', 'cherry', '%s file', '{0} of {1}', 'Caf\xc3\xa9', '', 'zebra', 'a\\nb']
+    return [(rng.choice(words) + str(rng.randint(0, n // 4)), rng.choice(['', 'x%d' % ii, None]))
+            for ii in xrange(n)]
+
+
+class ExternalSortTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spilled = []
+        self._spill = extsort._spill
+
+        def counted_spill(items, tmp_dir):
+            self.spilled.append(tmp_dir)
+            return self._spill(items, tmp_dir)
+        extsort._spill = counted_spill
+
+    def tearDown(self):
+        extsort._spill = self._spill
+
+    def test_sorted(self):
+        rows = random_rows(2000)
+        # A budget of a hundred rows, a budget of a row that spills more runs than MAX_RUNS and one that holds them all
+        for memory_budget, runs in ((extsort.ROW_OVERHEAD * 100, 10), (1, extsort.MAX_RUNS),
+                                    (extsort.DEFAULT_MEMORY_BUDGET, 0)):
+            del self.spilled[:]
+            result = list(external_sort(rows, memory_budget=memory_budget))
+            self.assertEqual(result, sorted(rows, key=lambda row: row[0]), memory_budget)
+            self.assertGreaterEqual(len(self.spilled), runs, memory_budget)
+            if not runs:
+                self.assertEqual(self.spilled, [])
+
+    def test_stable(self):
+        # Rows that share a key come out in the order they went in, whichever run they were spilled to
+        rows = [('key%d' % (ii % 7), str(ii)) for ii in xrange(500)]
+        self.assertEqual(list(external_sort(rows, memory_budget=extsort.ROW_OVERHEAD * 30)),
+                         sorted(rows, key=lambda row: row[0]))
+        self.assertEqual(list(external_sort(rows, key=lambda row: int(row[1]) % 3, memory_budget=1)),
+                         sorted(rows, key=lambda row: int(row[1]) % 3))
+
+    def test_unique(self):
+        rows = random_rows(1000, seed=1)
+        first = {}
+        for row in rows:
+            first.setdefault(row[0], row)
+        result = list(unique(external_sort(rows, memory_budget=extsort.ROW_OVERHEAD * 50)))
+        self.assertEqual(result, sorted(first.values()))
+        self.assertEqual([row[0] for row in result], sorted(set(row[0] for row in rows)))
+
+    def test_empty(self):
+        for memory_budget in (1, extsort.DEFAULT_MEMORY_BUDGET):
+            self.assertEqual(list(external_sort([], memory_budget=memory_budget)), [])
+            self.assertEqual(list(unique(external_sort(iter([]), memory_budget=memory_budget))), [])
+        self.assertEqual(self.spilled, [])
+
+
+class CSVToPOMemoryBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def convert(self, rows, memory_budget):
+        csv_path = os.path.join(self.tmp_dir, 'Sample - Spanish.csv')
+        with open(csv_path, 'wb') as _f:
+            writer = csv.writer(_f)
+            writer.writerow(['Original Text', 'Translated Text', 'Comments'])
+            writer.writerows(rows)
+        po_path = os.path.join(self.tmp_dir, 'messages.po')
+        # The placeholders are checked in test_placeholders
+        self.assertTrue(csv_to_po(csv_path, po_path, src_lang=None, memory_budget=memory_budget))
+        return [(e.msgid, e.msgstr) for e in iter_entries(po_path) if not e.is_header]
+
+    def test_same_as_whole_table(self):
+        rows = [(msgid, msgstr or '', 'comment') for msgid, msgstr in random_rows(600, seed=2) if msgid]
+        expected = self.convert(rows, None)
+        self.assertEqual(len(expected), len(set(row[0] for row in rows)))
+        for memory_budget in (1, extsort.ROW_OVERHEAD * 20):
+            self.assertEqual(self.convert(rows, memory_budget), expected)
+
+    def test_empty_table(self):
+        self.assertEqual(self.convert([], None), [])
+        self.assertEqual(self.convert([], 1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Arguments of a build that are checked before anything is extracted or written.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from translation_factory.factory import build, build_applications
+
+SAMPLE_TREE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_tree')
+LOCALES = [('Spanish', 'es_ES')]
+
+
+class BuildArgumentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.build_dir = os.path.join(self.tmp_dir, 'build')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_mo_compiler(self):
+        for mo_compiler in ('msgfmt ', 'MSGFMT', 'python', None):
+            with self.assertRaises(ValueError) as context:
+                build(SAMPLE_TREE, 'Sample', LOCALES, self.build_dir, extract_backend='python',
+                      mo_compiler=mo_compiler)
+            self.assertIn('Unknown .mo compiler', str(context.exception))
+            self.assertFalse(os.path.exists(self.build_dir))
+
+        configs = [{'directory': SAMPLE_TREE, 'application_name': 'Sample', 'locale_codes': LOCALES,
+                    'build_dir': self.build_dir},
+                   {'directory': SAMPLE_TREE, 'application_name': 'Other', 'locale_codes': LOCALES,
+                    'build_dir': self.build_dir, 'mo_compiler': 'gettext'}]
+        self.assertRaises(ValueError, build_applications, configs, extract_backend='python')
+        self.assertFalse(os.path.exists(self.build_dir))
+
+        self.assertTrue(build(SAMPLE_TREE, 'Sample', LOCALES, self.build_dir, extract_backend='python',
+                              mo_compiler='builtin'))
+        self.assertTrue(os.path.isfile(os.path.join(self.build_dir, 'es_ES', 'LC_MESSAGES', 'Sample.mo')))
+
+
+if __name__ == '__main__':
+    unittest.main()
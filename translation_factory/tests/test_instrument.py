@@ -0,0 +1,71 @@
+"""
+The profiles of the stages of a build must be complete, including stages that run inside other profiled stages.
+"""
+import os
+import shutil
+import pstats
+import tempfile
+import unittest
+
+from translation_factory.factory import build
+from translation_factory.instrument import Stage
+
+SAMPLE_TREE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_tree')
+
+
+def inner_work():
+    return sum(range(1000))
+
+
+def outer_work():
+    return sum(range(1000))
+
+
+def profiled_functions(prof_path):
+    """
+    :return: set of the names of the functions recorded in a profile
+    """
+    return set(name for filename, lineno, name in pstats.Stats(prof_path).stats)
+
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_nested_stages(self):
+        outer_path = os.path.join(self.tmp_dir, 'outer.prof')
+        inner_path = os.path.join(self.tmp_dir, 'inner.prof')
+        with Stage('outer', outer_path):
+            with Stage('inner', inner_path):
+                inner_work()
+            outer_work()
+        self.assertIn('inner_work', profiled_functions(inner_path))
+        self.assertNotIn('outer_work', profiled_functions(inner_path))
+        # The outer profile carries on after the inner stage and includes it
+        self.assertTrue({'inner_work', 'outer_work'} <= profiled_functions(outer_path))
+
+    def test_build_profiles(self):
+        build_dir = os.path.join(self.tmp_dir, 'build')
+        result = build(SAMPLE_TREE, 'Sample', [('Spanish', 'es_ES'), ('French', 'fr_FR')], build_dir,
+                       extract_backend='python', profile=True, incremental=False)
+        self.assertTrue(result)
+        profile_dir = os.path.join(build_dir, 'profiles')
+        names = sorted(os.listdir(profile_dir))
+        self.assertEqual(names, sorted(['extract.prof', 'placeholders.prof', 'manifest.prof', 'locales.prof',
+                                        'master_table.prof'] +
+                                       ['%s.%s.prof' % (code, stage) for code in ('es_ES', 'fr_FR')
+                                        for stage in ('merge', 'write_csv', 'po')]))
+        for name in names:
+            self.assertTrue(pstats.Stats(os.path.join(profile_dir, name)).total_calls > 0, name)
+        # The stages of every locale are part of the profile of the locales stage
+        functions = profiled_functions(os.path.join(profile_dir, 'locales.prof'))
+        self.assertTrue({'build_locale', 'fill', 'write_csv', 'catalog_to_po', 'write_mo'} <= functions, functions)
+        self.assertIn('catalog_to_po', profiled_functions(os.path.join(profile_dir, 'fr_FR.po.prof')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Incremental builds must skip the locales whose inputs did not change, for each application of a shared build directory.
+"""
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+
+from translation_factory.factory import build
+from translation_factory.memory import TranslationMemory
+
+SAMPLE_TREE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sample_tree')
+LOCALES = [('Spanish', 'es_ES'), ('French', 'fr_FR')]
+
+
+class IncrementalBuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.build_dir = os.path.join(self.tmp_dir, 'build')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def build(self, application_name):
+        result = build(SAMPLE_TREE, application_name, LOCALES, self.build_dir, extract_backend='python')
+        self.assertTrue(result)
+        return result
+
+    def skipped(self, result):
+        return sorted(code for code, locale_result in result.locales.iteritems() if locale_result.skipped)
+
+    def test_applications_sharing_build_dir(self):
+        for application_name in ('AppA', 'AppB'):
+            self.assertEqual(self.skipped(self.build(application_name)), [])
+        # The table of AppB is merged into the locales of AppA, which are built again once it was created
+        self.assertEqual(self.skipped(self.build('AppA')), [])
+        self.assertEqual(self.skipped(self.build('AppB')), ['es_ES', 'fr_FR'])
+        for application_name in ('AppA', 'AppB'):
+            self.assertEqual(self.skipped(self.build(application_name)), ['es_ES', 'fr_FR'])
+
+    def test_translation_memory_import(self):
+        self.build('AppA')
+        self.assertEqual(self.skipped(self.build('AppA')), ['es_ES', 'fr_FR'])
+
+        # A table imported into the translation memory from outside the build directory
+        table = os.path.join(self.tmp_dir, 'Other - Spanish.csv')
+        with open(table, 'wb') as _f:
+            writer = csv.writer(_f)
+            writer.writerow(['Phrase', 'Translation'])
+            writer.writerow(['Goodbye', 'Adios'])
+        memory = TranslationMemory(os.path.join(self.build_dir, 'translation_memory.db'))
+        memory.import_csv(table, 'es_ES', force=True)
+        memory.close()
+
+        self.assertEqual(self.skipped(self.build('AppA')), ['fr_FR'])
+        # The phrase is left untranslated in the existing table, the memory suggests the imported translation
+        with open(os.path.join(self.build_dir, 'es_ES', 'AppA - Spanish.csv'), 'rb') as _f:
+            rows = dict((row[0], row[1:]) for row in csv.reader(_f))
+        self.assertEqual(rows['Goodbye'][0], '')
+        self.assertIn('Adios', rows['Goodbye'][1])
+        self.assertEqual(self.skipped(self.build('AppA')), ['es_ES', 'fr_FR'])
+
+        # The locale is built again once the table is removed
+        os.remove(table)
+        self.assertEqual(self.skipped(self.build('AppA')), ['fr_FR'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Merging the translations of other tables into a translation table, with conflicting translations between the tables.
+"""
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+import __builtin__
+
+from translation_factory.catalog import Catalog, CSV_HEADER
+from translation_factory.factory import merge_into_catalog, merge_tables
+
+# (phrase, translation) of the table merged into, and of the two tables merged from, in order of precedence
+TABLE = [('Own', 'Propia'), ('Conflict', ''), ('Agreed', ''), ('Only second', ''), ('Untranslated', '')]
+FIRST = [('Own', 'Otra'), ('Conflict', 'Uno'), ('Agreed', 'Igual'), ('Only second', ''),
+         ('Not in the table', 'Fuera')]
+SECOND = [('Own', 'Otra mas'), ('Conflict', 'Dos'), ('Agreed', 'Igual'), ('Only second', 'Segunda')]
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.table = self.write('App - Spanish.csv', TABLE)
+        self.sources = [self.write('First - Spanish.csv', FIRST), self.write('Second - Spanish.csv', SECOND)]
+        self.prompts = []
+        self._raw_input = __builtin__.raw_input
+
+    def tearDown(self):
+        __builtin__.raw_input = self._raw_input
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, rows):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'wb') as _f:
+            writer = csv.writer(_f)
+            writer.writerow(CSV_HEADER)
+            writer.writerows([(phrase, translation, '') for phrase, translation in rows])
+        return path
+
+    def answer(self, answers):
+        """
+        Answer the conflicts prompted for on the command line in turn.
+        """
+        answers = iter(answers)
+
+        def raw_input(prompt):
+            self.prompts.append(prompt)
+            return next(answers)
+        __builtin__.raw_input = raw_input
+
+    def merge(self, **kwargs):
+        catalog = Catalog.read_csv(self.table)
+        merges = merge_into_catalog(catalog, self.sources, name='App - Spanish.csv', **kwargs)
+        return dict((msgid, catalog.msgstrs[ii]) for msgid, ii in catalog.index.iteritems()), merges.values()
+
+    def test_first(self):
+        translations, merges = self.merge(precedence='first')
+        self.assertEqual(translations, {'Own': 'Propia', 'Conflict': 'Uno', 'Agreed': 'Igual',
+                                        'Only second': 'Segunda', 'Untranslated': ''})
+        self.assertEqual(merges, [2, 1])
+
+    def test_last(self):
+        translations, merges = self.merge(precedence='last')
+        self.assertEqual(translations, {'Own': 'Propia', 'Conflict': 'Dos', 'Agreed': 'Igual',
+                                        'Only second': 'Segunda', 'Untranslated': ''})
+        # The translation of the second table replaced the one merged from the first
+        self.assertEqual(merges, [1, 2])
+
+    def test_unknown_precedence(self):
+        self.assertRaises(ValueError, self.merge, precedence='newest')
+
+    def test_prompt_conflicts(self):
+        # Only the translations of the table itself are prompted for, the tables merged from follow the precedence
+        for precedence, expected in (('first', 'Otra'), ('last', 'Otra mas')):
+            del self.prompts[:]
+            self.answer(['y'])
+            translations, merges = self.merge(precedence=precedence, prompt_conflicts=True)
+            self.assertEqual(translations['Own'], expected)
+            self.assertEqual(translations['Conflict'], 'Uno' if precedence == 'first' else 'Dos')
+            self.assertEqual(len(self.prompts), 1)
+            self.assertIn('Phrase: "Own"', self.prompts[0])
+            self.assertIn('App - Spanish.csv: "Propia"', self.prompts[0])
+            self.assertIn('First - Spanish.csv: "Otra"', self.prompts[0])
+        # Refused in the first table, the conflict is prompted for again with the second
+        del self.prompts[:]
+        self.answer(['n', 'n'])
+        translations, merges = self.merge(prompt_conflicts=True)
+        self.assertEqual(translations['Own'], 'Propia')
+        self.assertEqual(len(self.prompts), 2)
+        self.assertIn('Second - Spanish.csv: "Otra mas"', self.prompts[1])
+
+    def test_merge_tables(self):
+        merges = merge_tables(self.sources, self.table, precedence='last')
+        self.assertEqual(merges.items(), zip(self.sources, [1, 2]))
+        with open(self.table, 'rb') as _f:
+            rows = list(csv.reader(_f))
+        self.assertEqual(tuple(rows[0]), CSV_HEADER)
+        self.assertEqual([tuple(row[:2]) for row in rows[1:]],
+                         [('Own', 'Propia'), ('Conflict', 'Dos'), ('Agreed', 'Igual'), ('Only second', 'Segunda'),
+                          ('Untranslated', '')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+The .mo files written by mofile.write_mo must give the same lookups with gettext.GNUTranslations and with
+runtime.MMapTranslations (which goes through the hash table of the file).
+"""
+import os
+import shutil
+import gettext
+import tempfile
+import unittest
+
+from translation_factory.mofile import write_mo, hash_table_size
+from translation_factory import runtime
+
+HEADER = ('Project-Id-Version: Sample\n'
+          'Content-Type: text/plain; charset=UTF-8\n'
+          'Content-Transfer-Encoding: 8bit\n'
+          'Plural-Forms: nplurals=3; plural=(n==1 ? 0 : n%10>=2 && n%10<=4 && (n%100<10 || n%100>=20) ? 1 : 2);\n')
+
+# (msgid, msgstr) as given to write_mo: plurals are joined by \0 and contexts prefixed to the msgid with \x04
+MESSAGES = [('Hello', 'Witaj'),
+            ('Untranslated', ''),
+            ('', 'An empty msgid is not a message'),
+            ('%d file\0%d files', '%d plik\0%d pliki\0%d plik\xc3\xb3w'),
+            ('menu\x04Open', 'Otw\xc3\xb3rz'),
+            ('file\x04Open', 'Otwarty'),
+            ('Open', 'Otwieranie'),
+            ('button\x04%d item\0%d items', '%d element\0%d elementy\0%d element\xc3\xb3w'),
+            ('Za\xc5\xbc\xc3\xb3\xc5\x82\xc4\x87 g\xc4\x99\xc5\x9bl\xc4\x85 ja\xc5\xba\xc5\x84',
+             'Zero \xe2\x86\x92 one'),
+            ('\xe6\x97\xa5\xe6\x9c\xac\xe8\xaa\x9e', '\xe6\x97\xa5\xe6\x9c\xac\xe8\xaa\x9e (ja)'),
+            ('Line one\nLine two', 'Linia jeden\nLinia dwa'),
+            ('Tab\tand "quotes"', 'Tab\ti "cudzys\xc5\x82owy"')]
+
+SINGULAR = [u'Hello', u'Untranslated', u'', u'Open', u'menu\x04Open', u'file\x04Open', u'other\x04Open',
+            u'Zaż\xf3łć gęślą jaźń', u'日本語',
+            u'Line one\nLine two', u'Tab\tand "quotes"', u'Not in the catalog']
+PLURAL = [(u'%d file', u'%d files'), (u'button\x04%d item', u'%d items'), (u'%d item', u'%d items'),
+          (u'%d missing', u'%d missing ones')]
+
+
+def read_both(mo_path):
+    """
+    :return: (gettext.GNUTranslations, runtime.MMapTranslations) of a .mo file
+    """
+    with open(mo_path, 'rb') as _f:
+        return gettext.GNUTranslations(_f), runtime.MMapTranslations(mo_path)
+
+
+class MOFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, messages, header=HEADER, name='messages.mo'):
+        mo_path = os.path.join(self.tmp_dir, name)
+        write_mo(messages, mo_path, header=header)
+        return mo_path
+
+    def assertSameLookups(self, mo_path, singular, plural):
+        gnu, mmapped = read_both(mo_path)
+        try:
+            for message in singular:
+                self.assertEqual(mmapped.ugettext(message), gnu.ugettext(message), repr(message))
+                encoded = message.encode('utf-8')
+                if encoded == message:
+                    self.assertEqual(mmapped.gettext(encoded), gnu.gettext(encoded), repr(message))
+                else:
+                    # GNUTranslations keys the catalog by unicode, so only finds non-ASCII messages given as unicode
+                    self.assertEqual(mmapped.gettext(encoded), gnu.ugettext(message).encode('utf-8'), repr(message))
+            for msgid1, msgid2 in plural:
+                for n in range(30):
+                    self.assertEqual(mmapped.ungettext(msgid1, msgid2, n), gnu.ungettext(msgid1, msgid2, n),
+                                     '%r %d' % (msgid1, n))
+            self.assertEqual(mmapped.info(), gnu.info())
+            self.assertEqual(mmapped.charset(), gnu.charset())
+        finally:
+            mmapped.close()
+
+    def test_lookups(self):
+        mo_path = self.write(MESSAGES)
+        self.assertSameLookups(mo_path, SINGULAR, PLURAL)
+        gnu, mmapped = read_both(mo_path)
+        self.assertEqual(mmapped.ugettext(u'menu\x04Open'), u'Otw\xf3rz')
+        self.assertEqual(mmapped.ungettext(u'%d file', u'%d files', 5), u'%d plik\xf3w')
+        # Messages without a translation are left out, the empty msgid holds the header
+        self.assertEqual(mmapped.ugettext(u'Untranslated'), u'Untranslated')
+        self.assertEqual(mmapped._lookup(''), HEADER)
+        mmapped.close()
+
+    def test_written_count(self):
+        self.assertEqual(write_mo(MESSAGES, os.path.join(self.tmp_dir, 'count.mo'), header=HEADER),
+                         len([m for m in MESSAGES if m[0] and m[1]]))
+
+    def test_without_header(self):
+        mo_path = self.write(MESSAGES, header=None)
+        gnu, mmapped = read_both(mo_path)
+        # Without a charset the messages are bytes
+        for message in [m.encode('utf-8') for m in SINGULAR]:
+            self.assertEqual(mmapped.gettext(message), gnu.gettext(message))
+        self.assertEqual(mmapped.ngettext('%d file', '%d files', 2), gnu.ngettext('%d file', '%d files', 2))
+        mmapped.close()
+
+    def test_empty_catalog(self):
+        for name, header in (('empty.mo', None), ('header.mo', HEADER)):
+            self.assertSameLookups(self.write([], header=header, name=name), [u'Hello', u''], PLURAL)
+
+    def test_hash_collisions(self):
+        # Enough messages for the probing of the hash table to wrap around
+        messages = [('Message %d' % ii, 'Wiadomo\xc5\x9b\xc4\x87 %d' % ii) for ii in range(3000)]
+        messages += [('ctx%d\x04Message %d' % (ii, ii), 'Kontekst %d' % ii) for ii in range(0, 3000, 7)]
+        mo_path = self.write(messages)
+        mmapped = runtime.MMapTranslations(mo_path)
+        self.assertEqual(mmapped._hash_size, hash_table_size(len(messages) + 1))
+        mmapped.close()
+        singular = [unicode(msgid) for msgid, msgstr in messages] + [u'Message %d' % ii for ii in (3000, 5000)]
+        self.assertSameLookups(mo_path, singular, [])
+
+    def test_translation(self):
+        mo_dir = os.path.join(self.tmp_dir, 'pl_PL', 'LC_MESSAGES')
+        os.makedirs(mo_dir)
+        write_mo(MESSAGES, os.path.join(mo_dir, 'sample.mo'), header=HEADER)
+        t = runtime.translation('sample', self.tmp_dir, ['de_DE', 'pl_PL'])
+        self.assertIsInstance(t, runtime.MMapTranslations)
+        self.assertEqual(t.ugettext(u'Hello'), u'Witaj')
+        self.assertRaises(IOError, runtime.translation, 'sample', self.tmp_dir, ['de_DE'])
+        self.assertIsInstance(runtime.translation('sample', self.tmp_dir, ['de_DE'], fallback=True),
+                              gettext.NullTranslations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Placeholders of phrases and translations (printf style and str.format) and the errors of translations that do not
+keep the placeholders of their phrase.
+"""
+import os
+import json
+import shutil
+import pickle
+import tempfile
+import unittest
+
+from translation_factory.placeholders import placeholders, PlaceholderValidator
+
+# (text, {placeholder: occurrences})
+PLACEHOLDERS = [('Plain text', {}),
+                ('Hello %s', {'%s': 1}),
+                ('Hello %(name)s', {'%(name)s': 1}),
+                ('%(count)05d files', {'%(count)05d': 1}),
+                ('100%% done', {}),
+                ('100%%s done', {}),
+                ('50% off', {}),
+                ('%-5d|%+.2f|%5.1e', {'%-5d': 1, '%+.2f': 1, '%5.1e': 1}),
+                ('%s and %s', {'%s': 2}),
+                ('{0}', {'{0}': 1}),
+                ('{} and {}', {'{}': 2}),
+                ('{name}', {'{name}': 1}),
+                ('{name!r:>10}', {'{name!r:>10}': 1}),
+                ('{0[key]} {obj.attr}', {'{0[key]}': 1, '{obj.attr}': 1}),
+                ('{value:{width}}', {'{value:{width}}': 1, '{width}': 1}),
+                ('{{literal}} {{ }}', {}),
+                ('{{0}} and {0}', {'{0}': 1}),
+                ('%(name)s is {age}', {'%(name)s': 1, '{age}': 1})]
+
+
+class PlaceholdersTest(unittest.TestCase):
+
+    def test_placeholders(self):
+        for text, expected in PLACEHOLDERS:
+            self.assertEqual(dict(placeholders(text)), expected, text)
+
+    def test_malformed_braces(self):
+        for text in ('{0', 'a } b', '{0!}', '{:{}'):
+            self.assertEqual(dict(placeholders(text)), {'{?}': 1}, text)
+
+
+class PlaceholderValidatorTest(unittest.TestCase):
+
+    def check(self, msgid, msgstr):
+        return PlaceholderValidator().check('es_ES', [(msgid, msgstr)])
+
+    def test_valid(self):
+        for msgid, msgstr in [('Hello %(name)s', 'Hola %(name)s'),
+                              ('%-5d files', '%-5d archivos'),
+                              ('100%% of {0}', '{0} al 100%%'),
+                              ('{name!r:>10}', 'Nombre {name!r:>10}'),
+                              ('{{literal}} {0}', '{0} {{literal}}'),
+                              ('Untranslated {0}', '')]:
+            self.assertEqual(self.check(msgid, msgstr), [], msgid)
+
+    def test_dropped_placeholder(self):
+        errors = self.check('%(count)d files in {folder}', '%(count)d archivos')
+        self.assertEqual(len(errors), 1)
+        error = errors[0]
+        self.assertEqual((error.locale, error.msgid, error.msgstr, error.missing, error.extra),
+                         ('es_ES', '%(count)d files in {folder}', '%(count)d archivos', ['{folder}'], []))
+
+    def test_changed_placeholder(self):
+        errors = self.check('%-5d files', '%5d archivos')
+        self.assertEqual((errors[0].missing, errors[0].extra), (['%-5d'], ['%5d']))
+        errors = self.check('{name}', '{nombre}')
+        self.assertEqual((errors[0].missing, errors[0].extra), (['{name}'], ['{nombre}']))
+        # An escaped brace is not a placeholder
+        errors = self.check('{0} items', '{{0}} elementos')
+        self.assertEqual((errors[0].missing, errors[0].extra), (['{0}'], []))
+
+    def test_reordered_placeholders(self):
+        # Positional fields and named conversions may be reordered by the translation
+        self.assertEqual(self.check('{0} of {1}', '{1} de {0}'), [])
+        self.assertEqual(self.check('%(done)d of %(total)d', '%(total)d: %(done)d'), [])
+        # Automatic numbering can not be reordered, the fields have to be numbered
+        errors = self.check('{} of {}', '{1} de {0}')
+        self.assertEqual((errors[0].missing, errors[0].extra), (['{}', '{}'], ['{0}', '{1}']))
+
+    def test_malformed_translation(self):
+        # A translation str.format would fail on is reported instead of raising
+        errors = self.check('{0} files', '{0 archivos')
+        self.assertEqual((errors[0].missing, errors[0].extra), (['{0}'], ['{?}']))
+        errors = self.check('Close }', 'Cerrar }')
+        self.assertEqual(errors, [])
+
+    def test_validate(self):
+        validator = PlaceholderValidator()
+        validator.prime(['%s file', '{0} of {1}'])
+        # The placeholders of the phrases are cached and travel with the validator to the locale workers
+        validator = pickle.loads(pickle.dumps(validator))
+        self.assertEqual(sorted(validator.signatures), ['%s file', '{0} of {1}'])
+        report = validator.validate({'es_ES': [('%s file', '%s archivo'), ('{0} of {1}', '{0} de')],
+                                     'fr_FR': [('%s file', 'fichier')]})
+        self.assertFalse(report)
+        self.assertEqual(len(report), 2)
+        self.assertEqual([(e.locale, e.missing) for e in report.errors], [('es_ES', ['{1}']), ('fr_FR', ['%s'])])
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with open(report.write_json(os.path.join(tmp_dir, 'placeholder_errors.json'))) as _f:
+                written = json.load(_f)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(written['fr_FR'], [{'locale': 'fr_FR', 'msgid': '%s file', 'msgstr': 'fichier',
+                                             'missing': ['%s'], 'extra': []}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+"""
+Parsing of PO files: contexts, plurals, escapes, obsolete entries and strings continued over several lines.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from translation_factory import pofile
+from translation_factory.pofile import iter_entries, parse, escape, unescape, write_po
+
+PO = r'''# Translation of the sample application
+msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\n"
+"Plural-Forms: nplurals=2; plural=(n != 1);\n"
+
+#. Shown at the start
+#: app.py:5 widgets/panel.py:5
+msgid "Hello"
+msgstr "Hola"
+
+#: app.py:6
+#, fuzzy, python-format
+msgctxt "menu"
+msgid "Open %s"
+msgstr "Abrir %s"
+
+msgctxt "file"
+msgid "Open %s"
+msgstr "Abierto %s"
+
+#: app.py:8
+msgid ""
+"Line one\n"
+"Line two"
+msgstr ""
+"L\xc3\xadnea uno\n"
+"L\xc3\xadnea dos"
+
+msgid "Tab\tand \"quotes\" and a \\ backslash"
+msgstr "Tab\ty \"comillas\" y una \\ barra"
+
+#: app.py:10
+msgid "%d file"
+msgid_plural "%d files"
+msgstr[0] "%d archivo"
+msgstr[1] "%d archivos"
+
+# Not translated yet
+msgid "Untranslated"
+msgstr ""
+
+#| msgid "Old phrase"
+msgid "New phrase"
+msgstr "Frase nueva"
+
+#~ msgid "Removed"
+#~ msgstr "Eliminado"
+
+#~ msgctxt "old"
+#~ msgid ""
+#~ "Removed over "
+#~ "two lines"
+#~ msgstr "Eliminado en dos l\xc3\xadneas"
+msgid "No blank line before"
+msgstr "Sin l\xc3\xadnea en blanco"
+'''.replace(r'\xc3\xad', '\xc3\xad')
+
+
+def attributes(entry):
+    return dict((name, getattr(entry, name)) for name in pofile.POEntry.__slots__)
+
+
+class POParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.po_path = os.path.join(self.tmp_dir, 'messages.po')
+        with open(self.po_path, 'w') as _f:
+            _f.write(PO)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def entries(self, decode=False):
+        return list(iter_entries(self.po_path, decode=decode))
+
+    def test_header(self):
+        header = self.entries(decode=True)[0]
+        self.assertTrue(header.is_header)
+        self.assertEqual(header.msgstr, 'Content-Type: text/plain; charset=UTF-8\n'
+                                        'Plural-Forms: nplurals=2; plural=(n != 1);\n')
+        self.assertEqual((header.comments, header.lineno), (['Translation of the sample application'], 2))
+
+    def test_entries(self):
+        entries = self.entries()
+        self.assertEqual([(e.msgctxt, e.msgid) for e in entries],
+                         [(None, ''), (None, 'Hello'), ('menu', 'Open %s'), ('file', 'Open %s'),
+                          (None, r'Line one\nLine two'),
+                          (None, r'Tab\tand \"quotes\" and a \\ backslash'), (None, '%d file'),
+                          (None, 'Untranslated'), (None, 'New phrase'), (None, 'Removed'),
+                          ('old', 'Removed over two lines'), (None, 'No blank line before')])
+        hello = entries[1]
+        self.assertEqual((hello.msgstr, hello.references, hello.comments, hello.flags, hello.lineno),
+                         ('Hola', ['app.py:5', 'widgets/panel.py:5'], ['. Shown at the start'], [], 9))
+        menu = entries[2]
+        self.assertEqual((menu.flags, menu.fuzzy, menu.references, menu.lineno),
+                         (['fuzzy', 'python-format'], True, ['app.py:6'], 14))
+        self.assertFalse(entries[3].fuzzy)
+        self.assertEqual(entries[3].msgstr, 'Abierto %s')
+        self.assertEqual(entries[7].comments, ['Not translated yet'])
+        self.assertEqual(entries[7].msgstr, '')
+        # Previous strings (#|) are skipped
+        self.assertEqual((entries[8].comments, entries[8].msgstr), ([], 'Frase nueva'))
+
+    def test_continuation_lines(self):
+        entry = self.entries()[4]
+        self.assertEqual(entry.msgid, r'Line one\nLine two')
+        self.assertEqual(entry.msgstr, 'L\xc3\xadnea uno\\nL\xc3\xadnea dos')
+        self.assertEqual(entry.lineno, 23)
+
+    def test_escapes(self):
+        entry = self.entries(decode=True)[5]
+        self.assertEqual(entry.msgid, 'Tab\tand "quotes" and a \\ backslash')
+        self.assertEqual(entry.msgstr, 'Tab\ty "comillas" y una \\ barra')
+        self.assertEqual(self.entries(decode=True)[4].msgid, 'Line one\nLine two')
+        for s in ('Tab\tand "quotes" and a \\ backslash', 'Line one\nLine two\r', ''):
+            self.assertEqual(unescape(escape(s)), s)
+
+    def test_plurals(self):
+        entry = self.entries()[6]
+        self.assertEqual((entry.msgid, entry.msgid_plural), ('%d file', '%d files'))
+        self.assertEqual((entry.msgstr, entry.msgstr_plural), ('%d archivo', ['%d archivo', '%d archivos']))
+
+    def test_obsolete(self):
+        entries = self.entries(decode=True)
+        self.assertEqual([e.msgid for e in entries if e.obsolete], ['Removed', 'Removed over two lines'])
+        removed = entries[10]
+        self.assertEqual((removed.msgctxt, removed.msgstr, removed.lineno),
+                         ('old', 'Eliminado en dos l\xc3\xadneas', 50))
+        # An entry that follows an obsolete entry without a blank line
+        last = entries[11]
+        self.assertEqual((last.msgid, last.obsolete, last.lineno), ('No blank line before', False, 55))
+
+    def test_blocks_and_lines(self):
+        # Entries matched a block at a time must be the same as parsed line by line, whatever the size of the reads
+        for read_size in (16, 100, pofile.READ_SIZE):
+            original, pofile.READ_SIZE = pofile.READ_SIZE, read_size
+            try:
+                for decode in (False, True):
+                    expected = [attributes(e) for e in parse(PO.splitlines(True), decode=decode)]
+                    self.assertEqual([attributes(e) for e in self.entries(decode=decode)], expected)
+            finally:
+                pofile.READ_SIZE = original
+
+    def test_line_endings(self):
+        # \r\n line endings and entries that run into the lines of the next block
+        text = PO.replace('\n', '\r\n')
+        with open(self.po_path, 'wb') as _f:
+            _f.write(text)
+        expected = [attributes(e) for e in parse(text.splitlines(True))]
+        for read_size in (16, pofile.READ_SIZE):
+            original, pofile.READ_SIZE = pofile.READ_SIZE, read_size
+            try:
+                self.assertEqual([attributes(e) for e in self.entries()], expected)
+            finally:
+                pofile.READ_SIZE = original
+        text = 'msgid "a"\nmsgstr "b"\n\n#~ msgstr "c"\n\nmsgid "d"\nmsgstr "e"\n'
+        with open(self.po_path, 'w') as _f:
+            _f.write(text)
+        self.assertEqual([(e.msgid, e.msgstr) for e in self.entries()], [('a', 'c'), ('d', 'e')])
+
+    def test_write_po(self):
+        entries = self.entries()
+        out_path = os.path.join(self.tmp_dir, 'out.po')
+        write_po(entries, out_path)
+        self.assertEqual([(e.msgctxt, e.msgid, e.msgid_plural, e.msgstr, e.msgstr_plural, e.references, e.flags,
+                           e.obsolete) for e in iter_entries(out_path)],
+                         [(e.msgctxt, e.msgid, e.msgid_plural, e.msgstr, e.msgstr_plural, e.references, e.flags,
+                           e.obsolete) for e in entries])
+
+
+if __name__ == '__main__':
+    unittest.main()
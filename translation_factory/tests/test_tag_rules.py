@@ -0,0 +1,65 @@
+"""
+Tag quality rules: user rules with groups, backreferences and inline flags, and the JSON report of the findings.
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from translation_factory.tag_rules import TagChecker, DEFAULT_RULES
+
+
+class TagCheckerTest(unittest.TestCase):
+
+    def names(self, checker, text):
+        return [finding.rule for finding in checker.check(text, ('app.py:1', ))]
+
+    def test_default_rules(self):
+        checker = TagChecker()
+        self.assertEqual(self.names(checker, 'Hello {}'), ['empty_placeholder'])
+        self.assertEqual(self.names(checker, r'Hello\n'), ['trailing_newline'])
+        self.assertEqual(self.names(checker, r'{} and\n'), ['empty_placeholder', 'trailing_newline'])
+        self.assertEqual(self.names(checker, 'Hello {0}'), [])
+        self.assertEqual(checker.counts(), {'empty_placeholder': 2, 'trailing_newline': 2})
+        self.assertEqual(TagChecker(()).check('Hello {}'), [])
+
+    def test_user_rules(self):
+        rules = list(DEFAULT_RULES) + [('repeated_word', r'\b(\w+) \1\b', 'Repeated word'),
+                                       ('named_repeat', r'(?P<c>[!?])(?P=c)', 'Repeated punctuation'),
+                                       ('todo', r'(?i)todo', 'TODO left in the phrase'),
+                                       ('double_space', r'  ', 'Double space')]
+        checker = TagChecker(rules)
+        self.assertEqual(self.names(checker, 'the the end'), ['repeated_word'])
+        self.assertEqual(self.names(checker, 'the then'), [])
+        self.assertEqual(self.names(checker, 'Really!!'), ['named_repeat'])
+        self.assertEqual(self.names(checker, 'Really!?'), [])
+        self.assertEqual(self.names(checker, 'Todo: later'), ['todo'])
+        # The inline flag of one rule does not make the other rules ignore case
+        self.assertEqual(self.names(TagChecker([('a', '(?i)todo', 'a'), ('b', 'ABC', 'b')]), 'abc'), [])
+        self.assertEqual(self.names(checker, 'Two  spaces {}'), ['empty_placeholder', 'double_space'])
+        self.assertEqual(self.names(checker, 'Nothing wrong'), [])
+
+    def test_invalid_rule(self):
+        with self.assertRaises(ValueError) as context:
+            TagChecker([('broken', r'(\w+', 'Broken rule')])
+        self.assertIn('broken', str(context.exception))
+
+    def test_write_json(self):
+        checker = TagChecker()
+        checker.check('Caf\xc3\xa9 {}', ('app.py:5', ))
+        # A phrase of a table that is not UTF-8
+        checker.check('Caf\xe9 {}', ('app.py:6', ))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with open(checker.write_json(os.path.join(tmp_dir, 'tag_quality.json'))) as _f:
+                written = json.load(_f)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(written['counts'], {'empty_placeholder': 2, 'trailing_newline': 0})
+        self.assertEqual([(f['text'], f['references']) for f in written['findings']],
+                         [(u'Caf\xe9 {}', [u'app.py:5']), (u'Caf\ufffd {}', [u'app.py:6'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+__author__ = 'clobo'
+
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+
+from factory import build
+from fuzzy import SuggestionCache
+from discovery import iter_source_files, DEFAULT_EXCLUDE_GLOBS
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+class Watcher(object):
+    """
+    Rebuilds the translations of an application whenever its source files or translation tables change.
+
+    The template of the last build and the translation suggestions of each locale are kept in memory. When only
+    tables changed the locales are built from the template without extracting the tags again, the build manifest
+    skips the locales whose tables did not change and the translation memory only imports the tables that changed.
+    The suggestions of the untranslated phrases are updated by comparing them with the translations that changed
+    only, rather than with every translation of the memory.
+    Changes are found by comparing the mtime and size of the files, after waiting on inotify events when
+    pyinotify is installed and polling otherwise.
+    """
+
+    def __init__(self, config, interval=1.0, debounce=0.5):
+        """
+        :param config: keyword arguments of factory.build
+        :param interval: seconds between checks for changes when polling
+        :param debounce: seconds without further changes to wait for before rebuilding, so that a burst of saves
+                         causes a single rebuild
+        """
+        self.config = dict(config, incremental=True)
+        self.interval = interval
+        self.debounce = debounce
+        self.template = None
+        self.suggestions = SuggestionCache()
+        self.sources = {}
+        self.tables = {}
+        self.builds = 0
+        self._notifier = None
+        if pyinotify is not None:
+            watch_manager = pyinotify.WatchManager()
+            mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | pyinotify.IN_DELETE | pyinotify.IN_MOVED_TO | \
+                pyinotify.IN_MOVED_FROM
+            for directory in self._directories() + [config['build_dir']]:
+                if os.path.isdir(directory):
+                    watch_manager.add_watch(directory, mask, rec=True, auto_add=True)
+            self._notifier = pyinotify.Notifier(watch_manager, timeout=0)
+
+    def _directories(self):
+        directories = self.config['directory']
+        return [directories] if isinstance(directories, basestring) else list(directories)
+
+    def _snapshot(self, paths):
+        snapshot = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime, st.st_size)
+        return snapshot
+
+    def scan_sources(self):
+        return self._snapshot(iter_source_files(self.config['directory'], self.config.get('include_patterns'),
+                                                self.config.get('exclude_patterns'),
+                                                self.config.get('exclude_globs', DEFAULT_EXCLUDE_GLOBS)))
+
+    def scan_tables(self):
+        return self._snapshot(glob.glob(os.path.join(self.config['build_dir'], '*', '*.csv')))
+
+    def wait(self, timeout):
+        """
+        Wait for file system events (or sleep when polling) for at most timeout seconds.
+        """
+        if self._notifier is None:
+            time.sleep(timeout)
+        elif self._notifier.check_events(timeout=int(timeout * 1000)):
+            self._notifier.read_events()
+            self._notifier.process_events()
+
+    def changes(self):
+        """
+        :return: (source files changed, tables changed) since the last build
+        """
+        return self.scan_sources() != self.sources, self.scan_tables() != self.tables
+
+    def rebuild(self, sources_changed):
+        """
+        Build the translations, extracting the tags again only if the source files changed.
+        :param sources_changed: True if source files were added, modified or removed
+        :return: BuildResult
+        """
+        start = time.time()
+        self.sources = self.scan_sources()
+        template = None if sources_changed or self.template is None else self.template
+        try:
+            result = build(template=template, suggestion_cache=self.suggestions, **self.config)
+        except Exception as e:
+            logging.exception(e)
+            result = None
+        # The build rewrites the tables of the locales it builds, those writes are not changes to react to
+        self.tables = self.scan_tables()
+        self.builds += 1
+        rebuilt = []
+        # build returns False (or raised) if the tags could not be extracted
+        if result is not None and result is not False:
+            self.template = result.template
+            rebuilt = [r.code for r in result.locales.itervalues() if not r.skipped]
+            for locale_result in result.failed:
+                logging.error('{} - {} failed: {}'.format(locale_result.locale, locale_result.code,
+                                                          locale_result.error))
+        logging.info('Rebuilt {} in {:.2f}s ({}, locales rebuilt: {})'.format(
+            self.config['application_name'], time.time() - start,
+            'sources changed' if template is None else 'tables changed', ', '.join(rebuilt) or 'none'))
+        return result
+
+    def run(self, max_builds=None):
+        """
+        Build, then watch for changes and rebuild until interrupted.
+        :param max_builds: stop after this many builds
+        """
+        self.rebuild(True)
+        while max_builds is None or self.builds < max_builds:
+            self.wait(self.interval)
+            sources_changed, tables_changed = self.changes()
+            if not (sources_changed or tables_changed):
+                continue
+            # Debounce: wait until the files stop changing
+            while True:
+                sources, tables = self.scan_sources(), self.scan_tables()
+                self.wait(self.debounce)
+                if self.scan_sources() == sources and self.scan_tables() == tables:
+                    break
+            self.rebuild(self.scan_sources() != self.sources)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the translations of an application whenever its source '
+                                                 'files or translation tables change.')
+    parser.add_argument('config', help='build configuration file (see build.py)')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between checks for changes')
+    parser.add_argument('--debounce', type=float, default=0.5,
+                        help='seconds without changes to wait for before rebuilding')
+    args = parser.parse_args()
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    with open(args.config) as _f:
+        config = json.load(_f)
+    try:
+        Watcher(config, interval=args.interval, debounce=args.debounce).run()
+    except KeyboardInterrupt:
+        sys.exit(0)